@@ -87,6 +87,7 @@ setup(
 	
 	packages = (  # Define namaespace package contributions.
 			'web.app',  # Application code namaespace.
+			'web.cache',  # Cache storage backends.
 			'web.core',  # Framework core.
 			'web.ext',  # Default extension set.
 			'web.server',  # Default WSGI server adapters / bridges.
@@ -151,6 +152,7 @@ setup(
 			'gevent': ['gevent'],
 			'diesel': ['diesel'],
 			'bjoern': ['bjoern'],
+			'uvicorn': ['uvicorn'],
 		},
 	
 	entry_points = {
@@ -178,13 +180,17 @@ setup(
 					'response = web.ext.base:BaseExtension',
 					
 					# Miscelaneous Builtin Extensions
+					'admission = web.ext.admission:AdmissionExtension',  # Concurrency limiting and load shedding.
 					'analytics = web.ext.analytics:AnalyticsExtension',
 					'annotation = web.ext.annotation:AnnotationExtension',  # Preferred use/needs reference.
+					'cache = web.ext.cache:CacheExtension',  # Rendered response caching.
 					'cast = web.ext.annotation:AnnotationExtension',  # Legacy reference.
+					'compression = web.ext.compress:CompressionExtension',  # Content-Encoding negotiation.
+					'coalesce = web.ext.coalesce:CoalesceExtension',  # Single-flight execution of identical requests.
 					'typecast = web.ext.annotation:AnnotationExtension',  # Legacy reference.
 					'local = web.ext.local:ThreadLocalExtension',  # Preferred use/needs reference.
 					'threadlocal = web.ext.local:ThreadLocalExtension',  # Legacy reference.
-					'assets = web.ext.assets:WebAssetsExtension',  # WebAssets integration.
+					'assets = web.ext.assets:WebAssetsExtension',  # Content-hashed static asset URLs.
 				],
 			
 			# WSGI Server Adapters
@@ -195,6 +201,7 @@ setup(
 					'wsgiref = web.server.stdlib:simple',
 					'cgiref = web.server.stdlib:cgi',
 					'iiscgiref = web.server.stdlib:iiscgi',  # Python 3 only!
+					'prefork = web.server.prefork:serve',  # Multi-process; wraps another adapter in each worker.
 					
 					# These have additional third-party dependencies.
 					# For even more, see the WSGI reference site listing of servers:
@@ -209,6 +216,14 @@ setup(
 					'gevent = web.server.gevent_:serve[gevent]',  # http://s.webcore.io/aIpU
 					'diesel = web.server.diesel_:serve[diesel]',  # http://s.webcore.io/aIg2
 					'bjoern = web.server.bjoern_:serve[bjoern]',  # http://s.webcore.io/aIne
+					'uvicorn = web.server.uvicorn_:serve[uvicorn]',  # https://www.uvicorn.org/
+				],
+			
+			# Cache Storage Backends
+			'web.cache': [
+					'memory = web.cache.memory:MemoryCache',  # In-process; least recently used eviction.
+					'mmap = web.cache.mmap_:MappedCache',  # Memory-mapped file shared between processes on a host.
+					'sqlite = web.cache.sqlite:SQLiteCache',  # SQLite database shared between processes on a host.
 				],
 			
 			'web.serialize': [
@@ -2,10 +2,13 @@
 
 from __future__ import unicode_literals
 
+import gzip
 import os.path
 import pytest
 
+from webob import Request
 from webob.exc import HTTPForbidden, HTTPNotFound
+from web.core import Application
 from web.core.context import Context
 from web.app.static import static
 
@@ -62,3 +65,207 @@ def test_far_future_expires():
 	assert context.response.cache_expires == 60*60*24*365
 
 
+
+
+class TestPrecompressed(object):
+	SCRIPT = "function hello() { return 'Hello world.'; }\n" * 64
+	
+	def application(self, tmpdir, **kw):
+		class Root(object):
+			public = static(str(tmpdir.join('public')), **kw)
+			
+			def __init__(self, context):
+				pass
+		
+		self.Root = Root
+		return Application(Root)
+	
+	def request(self, app, path, encoding=None):
+		request = Request.blank(path)
+		if encoding: request.headers['Accept-Encoding'] = encoding
+		
+		return request.get_response(app)
+	
+	def test_sibling(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('app.js').write(self.SCRIPT)
+		public.join('app.js.gz').write_binary(gzip.compress(self.SCRIPT.encode('ascii')))
+		
+		app = self.application(tmpdir)
+		
+		response = self.request(app, '/public/app.js', 'gzip, deflate')
+		assert response.content_encoding == 'gzip'
+		assert 'javascript' in response.content_type
+		assert 'Accept-Encoding' in response.vary
+		assert gzip.decompress(response.body).decode('ascii') == self.SCRIPT
+		
+		response = self.request(app, '/public/app.js')
+		assert response.content_encoding is None
+		assert 'Accept-Encoding' in response.vary
+		assert response.text == self.SCRIPT
+	
+	def test_stale_sibling(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('app.js').write(self.SCRIPT)
+		public.join('app.js.gz').write_binary(b'stale')
+		public.join('app.js.gz').setmtime(public.join('app.js').mtime() - 60)
+		
+		response = self.request(self.application(tmpdir), '/public/app.js', 'gzip')
+		
+		assert response.content_encoding is None
+		assert response.vary is None
+	
+	def test_generated(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.mkdir('js').join('app.js').write(self.SCRIPT)
+		public.join('small.js').write("var x;")
+		public.join('image.png').write(self.SCRIPT)
+		
+		app = self.application(tmpdir, cache=str(tmpdir.join('cache')))
+		
+		assert tmpdir.join('cache', 'js', 'app.js.gz').check()
+		assert not tmpdir.join('cache', 'small.js.gz').check()
+		assert not tmpdir.join('cache', 'image.png.gz').check()
+		
+		response = self.request(app, '/public/js/app.js', 'gzip')
+		assert response.content_encoding == 'gzip'
+		assert gzip.decompress(response.body).decode('ascii') == self.SCRIPT
+		
+		identity = self.request(app, '/public/js/app.js')
+		assert identity.last_modified == response.last_modified
+		assert identity.etag != response.etag
+
+
+class TestIndexed(TestPrecompressed):
+	def application(self, tmpdir, **kw):
+		kw.setdefault('index', True)
+		return super(TestIndexed, self).application(tmpdir, **kw)
+	
+	def test_no_filesystem_access(self, tmpdir, monkeypatch):
+		public = tmpdir.mkdir('public')
+		public.join('app.js').write(self.SCRIPT)
+		
+		app = self.application(tmpdir)
+		
+		def forbidden(*args):
+			raise AssertionError("Filesystem accessed.")
+		
+		for name in ('exists', 'isfile', 'getmtime', 'normpath'):
+			monkeypatch.setattr('web.app.static.' + name, forbidden)
+		
+		assert self.request(app, '/public/app.js').text == self.SCRIPT
+		assert self.request(app, '/public/missing.js').status_int == 404
+		assert self.request(app, '/public/../public/app.js').status_int == 404
+	
+	def test_refresh(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('app.js').write(self.SCRIPT)
+		
+		app = self.application(tmpdir)
+		index = self.Root.public.index
+		
+		assert len(index) == 1
+		entry = index.get(('app.js', ))
+		assert entry.size == len(self.SCRIPT)
+		assert 'javascript' in entry.content_type
+		
+		public.mkdir('css').join('site.css').write("body { color: red; }")
+		assert self.request(app, '/public/css/site.css').status_int == 404
+		
+		index.refresh()
+		assert 'css/site.css' in index
+		assert self.request(app, '/public/css/site.css').text == "body { color: red; }"
+	
+	def test_poll(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		app = self.application(tmpdir, poll=60)
+		index = self.Root.public.index
+		
+		public.join('app.js').write(self.SCRIPT)
+		assert self.request(app, '/public/app.js').status_int == 404
+		
+		index.refreshed -= 120
+		assert self.request(app, '/public/app.js').text == self.SCRIPT
+
+
+class TestResident(TestPrecompressed):
+	def application(self, tmpdir, **kw):
+		kw.setdefault('memory', 1024 * 1024)
+		return super(TestResident, self).application(tmpdir, **kw)
+	
+	def forbid(self, monkeypatch):
+		def forbidden(*args):
+			raise AssertionError("File opened.")
+		
+		monkeypatch.setattr('web.app.static.open', forbidden, raising=False)
+	
+	def test_retained(self, tmpdir, monkeypatch):
+		public = tmpdir.mkdir('public')
+		public.join('icon.svg').write("<svg/>")
+		
+		app = self.application(tmpdir)
+		first = self.request(app, '/public/icon.svg')
+		
+		self.forbid(monkeypatch)
+		
+		response = self.request(app, '/public/icon.svg')
+		assert response.body == b"<svg/>"
+		assert response.content_type == 'image/svg+xml'
+		assert response.etag == first.etag
+		assert response.last_modified == first.last_modified
+		
+		request = Request.blank('/public/icon.svg', if_none_match=first.etag)
+		assert request.get_response(app).status_int == 304
+	
+	def test_modified(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('data.json').write('{"a": 1}')
+		
+		app = self.application(tmpdir)
+		first = self.request(app, '/public/data.json')
+		
+		public.join('data.json').write('{"a": 2}')
+		public.join('data.json').setmtime(public.join('data.json').mtime() + 60)
+		
+		response = self.request(app, '/public/data.json')
+		assert response.text == '{"a": 2}'
+		assert response.etag != first.etag
+	
+	def test_large(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('large.txt').write("x" * 100)
+		
+		app = self.application(tmpdir, small=10)
+		assert self.request(app, '/public/large.txt').text == "x" * 100
+		assert not len(self.Root.public.resident)
+	
+	def test_budget(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.join('a.txt').write("a" * 60)
+		public.join('b.txt').write("b" * 60)
+		
+		app = self.application(tmpdir, memory=100)
+		
+		assert self.request(app, '/public/a.txt').text == "a" * 60
+		assert self.request(app, '/public/b.txt').text == "b" * 60
+		assert len(self.Root.public.resident) == 1
+		assert self.request(app, '/public/a.txt').text == "a" * 60  # Read again, having been evicted.
+		assert self.Root.public.resident.used == 60
+	
+	def test_indexed(self, tmpdir, monkeypatch):
+		public = tmpdir.mkdir('public')
+		public.join('app.js').write(self.SCRIPT)
+		public.join('app.js.gz').write_binary(gzip.compress(self.SCRIPT.encode('ascii')))
+		
+		app = self.application(tmpdir, index=True, small=64 * 1024)
+		self.request(app, '/public/app.js', 'gzip')
+		
+		def forbidden(*args):
+			raise AssertionError("Filesystem accessed.")
+		
+		monkeypatch.setattr('os.stat', forbidden)
+		self.forbid(monkeypatch)
+		
+		response = self.request(app, '/public/app.js', 'gzip')
+		assert response.content_encoding == 'gzip'
+		assert gzip.decompress(response.body).decode('ascii') == self.SCRIPT
@@ -0,0 +1,139 @@
+# encoding: utf-8
+
+import os
+
+from shutil import rmtree
+from tempfile import mkdtemp
+from time import sleep
+from unittest import TestCase
+
+from web.cache.memory import MemoryCache
+from web.cache.mmap_ import MappedCache
+from web.cache.sqlite import SQLiteCache
+
+
+class Storage(object):
+	"""Behaviour common to all cache storage backends."""
+	
+	def storage(self, capacity=1024 * 1024):
+		raise NotImplementedError()
+	
+	def setUp(self):
+		self.directory = mkdtemp()
+		self.cache = self.storage()
+	
+	def tearDown(self):
+		rmtree(self.directory)
+	
+	def test_roundtrip(self):
+		value = ('200 OK', (('Content-Type', 'text/plain'), ), b'Hello.', 27.0)
+		
+		assert self.cache.get('key') is None
+		
+		self.cache.set('key', value, 60)
+		assert self.cache.get('key') == value
+		
+		self.cache.set('key', 'replaced', 60)
+		assert self.cache.get('key') == 'replaced'
+	
+	def test_expiry(self):
+		self.cache.set('key', 'value', 0.01)
+		
+		assert self.cache.get('key') == 'value'
+		sleep(0.02)
+		assert self.cache.get('key') is None
+	
+	def test_invalidation(self):
+		cache = self.cache
+		cache.set('a', 1, 60, ('x', 'y'))
+		cache.set('b', 2, 60, ('y', ))
+		cache.set('c', 3, 60)
+		
+		cache.invalidate('x')
+		
+		assert cache.get('a') is None
+		assert cache.get('b') == 2
+		
+		cache.invalidate('y')
+		cache.set('d', 4, 60, ('y', ))  # Recorded after invalidation.
+		
+		assert cache.get('b') is None
+		assert cache.get('c') == 3
+		assert cache.get('d') == 4
+	
+	def test_clear(self):
+		self.cache.set('key', 'value', 60)
+		self.cache.clear()
+		
+		assert self.cache.get('key') is None
+	
+	def test_capacity(self):
+		cache = self.storage(64 * 1024)
+		
+		for i in range(64):
+			cache.set('key-' + str(i), os.urandom(4096), 60, size=4096)
+		
+		assert cache.get('key-0') is None  # Evicted.
+		assert cache.get('key-63') is not None
+
+
+class TestMemoryCache(Storage, TestCase):
+	def storage(self, capacity=1024 * 1024):
+		return MemoryCache(capacity)
+
+
+class TestMappedCache(Storage, TestCase):
+	def storage(self, capacity=1024 * 1024):
+		return MappedCache(os.path.join(self.directory, 'cache-' + str(capacity)), capacity)
+	
+	def test_shared(self):
+		other = self.storage()  # As another process would.
+		self.cache.set('key', 'value', 60, ('tag', ))
+		
+		assert other.get('key') == 'value'
+		
+		other.invalidate('tag')
+		
+		assert self.cache.get('key') is None
+	
+	def test_incompatible(self):
+		with self.assertRaises(ValueError):
+			MappedCache(os.path.join(self.directory, 'cache-' + str(1024 * 1024)), 2048 * 1024)
+	
+	def test_forked(self):
+		pid = os.fork()
+		
+		if not pid:  # pragma: no cover
+			self.cache.set('child', os.getpid(), 60)
+			os._exit(0)
+		
+		os.waitpid(pid, 0)
+		
+		assert self.cache.get('child') == pid
+
+
+class TestSQLiteCache(Storage, TestCase):
+	def storage(self, capacity=1024 * 1024):
+		return SQLiteCache(os.path.join(self.directory, 'cache-' + str(capacity) + '.sqlite'), capacity)
+	
+	def test_shared(self):
+		other = self.storage()
+		self.cache.set('key', 'value', 60, ('tag', ))
+		
+		assert other.get('key') == 'value'
+		
+		other.invalidate('tag')
+		
+		assert self.cache.get('key') is None
+	
+	def test_forked(self):
+		self.cache.get('key')  # Establish a connection in the parent.
+		pid = os.fork()
+		
+		if not pid:  # pragma: no cover
+			self.cache.set('child', os.getpid(), 60)
+			os._exit(0)
+		
+		os.waitpid(pid, 0)
+		
+		assert self.cache.get('child') == pid
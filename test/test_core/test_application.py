@@ -3,9 +3,27 @@
 from __future__ import unicode_literals
 
 from unittest import TestCase
-from inspect import isclass
+from inspect import isclass, isgenerator
+from threading import Thread
+from webob import Request, Response
 
-from web.core.application import Application
+from web.core.application import Application, _chain, _fold
+
+
+class DoneExtension(object):
+	def __init__(self):
+		self.finished = []
+	
+	def done(self, context):
+		self.finished.append(context)
+
+
+class GracefulExtension(object):
+	def __init__(self):
+		self.reloaded = []
+	
+	def graceful(self, context, **config):
+		self.reloaded.append((context, config))
 
 
 class TestApplicationParts(TestCase):
@@ -14,4 +32,131 @@ class TestApplicationParts(TestCase):
 	
 	def test_application_attributes(self):
 		assert isclass(self.app.RequestContext), "Non-class prepared request context."
+	
+	def test_compiled_handler(self):
+		assert callable(self.app.application)
+		assert self.app.__call__ is self.app.application  # No middleware in use.
+
+
+class TestCallbackCompilation(TestCase):
+	def test_chain_empty(self):
+		assert _chain(()) is None
+	
+	def test_chain_single(self):
+		def callback(context): pass
+		assert _chain((callback, )) is callback
+	
+	def test_chain_multiple(self):
+		calls = []
+		chain = _chain((lambda v: calls.append(('a', v)), lambda v: calls.append(('b', v))))
+		chain(27)
+		assert calls == [('a', 27), ('b', 27)]
+	
+	def test_fold_empty(self):
+		assert _fold(()) is None
+	
+	def test_fold_multiple(self):
+		fold = _fold((lambda c, h, r: r + 1, lambda c, h, r: r * 2))
+		assert fold(None, None, 1) == 4
+
+
+class TestDoneSignal(TestCase):
+	def do(self, app):
+		environ = Request.blank('/').environ
+		return environ, app(environ, lambda status, headers: None)
+	
+	def test_unwrapped_without_listeners(self):
+		environ, body = self.do(Application("Hi."))
+		assert not isgenerator(body)
+		assert b''.join(body) == b"Hi."
+	
+	def test_wrapped_with_listeners(self):
+		ext = DoneExtension()
+		environ, body = self.do(Application("Hi.", extensions=[ext]))
+		
+		assert not isinstance(body, (list, tuple))
+		assert not ext.finished
+		assert b''.join(body) == b"Hi."
+		assert ext.finished == [environ['wc.context']]
+		
+		body.close()  # Closing after exhaustion, as servers must, does not notify again.
+		assert len(ext.finished) == 1
+	
+	def test_notified_on_close(self):
+		ext = DoneExtension()
+		closed = []
+		
+		class Body(list):
+			def close(self):
+				closed.append(True)
+		
+		environ, body = self.do(Application(lambda context: Response(app_iter=Body([b"Hi."])), extensions=[ext]))
+		
+		body.close()  # As if the client disconnected prior to delivery.
+		
+		assert ext.finished == [environ['wc.context']]
+		assert closed
+
+
+class TestGracefulSignal(TestCase):
+	def test_reload(self):
+		ext = GracefulExtension()
+		app = Application("Hi.", extensions=[ext])
+		
+		app.reload(pool=4)
+		
+		(context, config), = ext.reloaded
+		assert context.app is app
+		assert config == {'pool': 4}
+
+
+class TestDrain(TestCase):
+	def test_untracked(self):
+		app = Application("Hi.")
+		
+		assert app.inflight is None
+		assert app.drain(0)
+	
+	def test_tracked(self):
+		app = Application("Hi.", drain=5)
+		environ = Request.blank('/').environ
+		body = app(environ, lambda status, headers: None)
+		
+		assert len(app.inflight) == 1
+		assert not app.drain(0)
+		
+		Thread(target=lambda: b''.join(body)).start()
+		
+		assert app.drain()
+		assert len(app.inflight) == 0
+	
+	def test_tracked_failure(self):
+		def endpoint(context):
+			raise SystemExit()
+		
+		app = Application(endpoint, drain=1)
+		
+		with self.assertRaises(SystemExit):
+			app(Request.blank('/').environ, lambda status, headers: None)
+		
+		assert len(app.inflight) == 0
+
 
+class TestPrepareShortCircuit(TestCase):
+	def test_http_exception(self):
+		from webob.exc import HTTPException, HTTPForbidden
+		
+		class Refusal(object):
+			def prepare(self, context):
+				raise HTTPException("Forbidden.", HTTPForbidden())
+		
+		ext = DoneExtension()
+		called = []
+		
+		app = Application(lambda context: called.append(context), extensions=[Refusal(), ext])
+		resp = Request.blank('/').get_response(app)
+		
+		assert resp.status_int == 403
+		resp.body  # Complete the response.
+		assert not called
+		assert len(ext.finished) == 1
@@ -0,0 +1,186 @@
+# encoding: utf-8
+
+from __future__ import unicode_literals
+
+import asyncio
+
+from time import sleep
+from unittest import TestCase
+
+from web.core import local
+from web.core.application import Application
+from web.core.asgi import environ
+from web.ext.local import ThreadLocalExtension
+
+
+class AsyncController(object):
+	def __init__(self, context):
+		self._ctx = context
+	
+	async def coroutine(self, name="world"):
+		await asyncio.sleep(0)
+		return "Hello " + name + "."
+	
+	def blocking(self):
+		return "Blocking."
+	
+	def stream(self):
+		yield b'foo'
+		yield b'bar'
+	
+	def local(self):
+		sleep(0.05)  # Permit concurrent requests to overlap.
+		return "Local." if getattr(local, 'context', None) is self._ctx else "Missing."
+
+
+class AsyncExtension(object):
+	def __init__(self):
+		self.events = []
+	
+	async def prepare(self, context):
+		await asyncio.sleep(0)
+		self.events.append('prepare')
+	
+	def after(self, context):
+		self.events.append('after')
+	
+	async def done(self, context):
+		self.events.append('done')
+	
+	def stop(self, context):
+		self.events.append('stop')
+
+
+def scope(path, query=b'', method='GET', headers=()):
+	return {
+			'type': 'http',
+			'asgi': {'version': '3.0'},
+			'http_version': '1.1',
+			'method': method,
+			'scheme': 'http',
+			'path': path,
+			'root_path': '',
+			'query_string': query,
+			'headers': list(headers),
+			'server': ('127.0.0.1', 8080),
+			'client': ('127.0.0.1', 54321),
+		}
+
+
+def call(app, scope, messages=({'type': 'http.request', 'body': b'', 'more_body': False}, )):
+	incoming = list(messages)
+	sent = []
+	
+	async def receive():
+		return incoming.pop(0)
+	
+	async def send(message):
+		sent.append(message)
+	
+	asyncio.run(app.asgi(scope, receive, send))
+	return sent
+
+
+def body(sent):
+	return b''.join(i.get('body', b'') for i in sent if i['type'] == 'http.response.body')
+
+
+class TestASGIEnviron(TestCase):
+	def test_basic(self):
+		env = environ(scope('/foo/bar', b'a=1', headers=[(b'content-type', b'text/plain'), (b'x-foo', b'bar')]))
+		
+		assert env['REQUEST_METHOD'] == 'GET'
+		assert env['PATH_INFO'] == '/foo/bar'
+		assert env['QUERY_STRING'] == 'a=1'
+		assert env['CONTENT_TYPE'] == 'text/plain'
+		assert env['HTTP_X_FOO'] == 'bar'
+		assert env['SERVER_PORT'] == '8080'
+	
+	def test_root_path(self):
+		env = environ(dict(scope('/app/foo'), root_path='/app'))
+		
+		assert env['SCRIPT_NAME'] == '/app'
+		assert env['PATH_INFO'] == '/foo'
+	
+	def test_repeated_headers(self):
+		env = environ(scope('/', headers=[(b'x-foo', b'a'), (b'x-foo', b'b')]))
+		assert env['HTTP_X_FOO'] == 'a,b'
+
+
+class TestASGIApplication(TestCase):
+	def setUp(self):
+		self.ext = AsyncExtension()
+		self.app = Application(AsyncController, extensions=[self.ext])
+	
+	def test_coroutine_endpoint(self):
+		sent = call(self.app, scope('/coroutine', b'name=Alice'))
+		
+		assert sent[0]['type'] == 'http.response.start'
+		assert sent[0]['status'] == 200
+		assert body(sent) == b"Hello Alice."
+		assert sent[-1]['more_body'] is False
+	
+	def test_synchronous_endpoint(self):
+		assert body(call(self.app, scope('/blocking'))) == b"Blocking."
+	
+	def test_streaming_endpoint(self):
+		assert body(call(self.app, scope('/stream'))) == b"foobar"
+	
+	def test_not_found(self):
+		assert call(self.app, scope('/missing'))[0]['status'] == 404
+	
+	def test_callbacks(self):
+		call(self.app, scope('/coroutine'))
+		assert self.ext.events == ['prepare', 'after', 'done']
+	
+	def test_form_body(self):
+		sent = call(self.app, scope('/coroutine', method='POST', headers=[
+				(b'content-type', b'application/x-www-form-urlencoded'),
+				(b'content-length', b'8'),
+			]), [
+				{'type': 'http.request', 'body': b'name', 'more_body': True},
+				{'type': 'http.request', 'body': b'=Bob', 'more_body': False},
+			])
+		
+		assert body(sent) == b"Hello Bob."
+	
+	def test_thread_local(self):
+		app = Application(AsyncController, extensions=[ThreadLocalExtension()])
+		
+		async def request():
+			sent = []
+			
+			async def receive():
+				return {'type': 'http.request', 'body': b'', 'more_body': False}
+			
+			async def send(message):
+				sent.append(message)
+			
+			await app.asgi(scope('/local'), receive, send)
+			return body(sent)
+		
+		async def main():
+			return await asyncio.gather(*(request() for i in range(4)))
+		
+		try:
+			assert asyncio.run(main()) == [b"Local."] * 4
+		finally:
+			del local.context  # Assigned the application context on startup.
+	
+	def test_lifespan(self):
+		sent = call(self.app, {'type': 'lifespan'}, [
+				{'type': 'lifespan.startup'},
+				{'type': 'lifespan.shutdown'},
+			])
+		
+		assert [i['type'] for i in sent] == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+		assert self.ext.events == ['stop']
+	
+	def test_drain(self):
+		app = Application(AsyncController, extensions=[self.ext], drain=1)
+		
+		assert body(call(app, scope('/stream'))) == b"foobar"
+		assert len(app.inflight) == 0
+		
+		call(app, {'type': 'lifespan'}, [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+		assert self.ext.events[-1] == 'stop'
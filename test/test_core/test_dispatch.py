@@ -162,3 +162,108 @@ class TestDispatchPlugins(DispatchBase):
 		assert 'object' in self.dispatch.named
 		assert self.dispatch.named['object'] is dispatcher
 
+
+
+class Held(object):
+	def __init__(self, context):
+		self._ctx = context
+	
+	def endpoint(self):
+		return "held"
+
+
+class CacheableController(object):
+	__dispatch_cache__ = True
+	
+	instances = 0
+	
+	def __init__(self, context=None):
+		CacheableController.instances += 1
+		self.request = context.request
+		self.held = Held(context)  # Constructed by the controller, not by dispatch.
+	
+	def endpoint(self, *args):
+		return "endpoint"
+	
+	class child(object):
+		__dispatch_cache__ = False
+		
+		def __init__(self, context=None):
+			pass
+		
+		def endpoint(self):
+			return "child"
+
+
+class TestDispatchCache(TestCase):
+	def setUp(self):
+		self.events = []
+		self._ctx = Context(
+				request = Request.blank('/endpoint'),
+				extension = Context(signal=Context(dispatch=[self.callback])),
+			)
+		self._ctx.environ = self._ctx.request.environ
+		self.dispatch = self._ctx.dispatch = WebDispatchers(self._ctx, cache=2)
+		
+		if 'object' not in self.dispatch.named:
+			pytest.skip("missing web.dispatch.object")
+		
+		CacheableController.instances = 0
+	
+	def callback(self, context, consumed, handler, is_endpoint):
+		self.events.append((consumed, is_endpoint))
+	
+	def do(self, path):
+		self._ctx.request = Request.blank(path)
+		self._ctx.environ = self._ctx.request.environ
+		return self.dispatch(self._ctx, CacheableController, path)
+	
+	def test_disabled_by_default(self):
+		assert WebDispatchers(self._ctx).cache is None
+	
+	def test_replay(self):
+		first = self.do('/endpoint')
+		events = list(self.events)
+		
+		assert first[0]
+		assert len(self.dispatch.cache) == 1
+		
+		del self.events[:]
+		second = self.do('/endpoint')
+		
+		assert second[0]
+		assert self.events == events  # Callbacks are issued identically.
+		
+		# The controller was constructed again, for the current request, and the endpoint bound to it.
+		assert CacheableController.instances == 2
+		assert second[1].__func__ is first[1].__func__
+		assert second[1].__self__ is not first[1].__self__
+		assert second[1].__self__.request is self._ctx.request
+	
+	def test_unreconstructible(self):
+		is_endpoint, handler = self.do('/held/endpoint')
+		
+		assert handler() == "held"
+		assert not len(self.dispatch.cache)
+	
+	def test_opt_out(self):
+		is_endpoint, handler = self.do('/child/endpoint')
+		
+		assert is_endpoint
+		assert handler() == "child"
+		assert not len(self.dispatch.cache)
+	
+	def test_uncacheable_root(self):
+		self._ctx.request = Request.blank('/endpoint')
+		self._ctx.environ = self._ctx.request.environ
+		self.dispatch(self._ctx, MockController, '/endpoint')
+		
+		assert not len(self.dispatch.cache)
+	
+	def test_eviction(self):
+		self.do('/endpoint')
+		self.do('/endpoint/a')
+		self.do('/endpoint/b')
+		
+		assert len(self.dispatch.cache) == 2
+		assert (CacheableController, 'GET', '/endpoint') not in self.dispatch.cache
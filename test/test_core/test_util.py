@@ -1,7 +1,7 @@
 # encoding: utf-8
 
 from web.core.context import Context
-from web.core.util import lazy
+from web.core.util import InFlight, LRUCache, lazy
 
 def mock_lazy_value(context):
 	context.ran = True
@@ -22,3 +22,66 @@ def test_lazy_context_value():
 	assert ctx.sample == 42
 	assert ctx.count == 1
 
+
+
+def test_lru_cache_eviction():
+	cache = LRUCache(2)
+	cache['a'] = 1
+	cache['b'] = 2
+	
+	assert cache.get('a') == 1  # Marks "a" as recently used.
+	
+	cache['c'] = 3
+	
+	assert 'a' in cache
+	assert 'b' not in cache
+	assert len(cache) == 2
+	assert repr(cache) == "LRUCache(2/2)"
+
+
+def test_lru_cache_disabled():
+	cache = LRUCache(0)
+	cache['a'] = 1
+	
+	assert cache.get('a', 27) == 27
+
+
+def test_lru_cache_weighed():
+	cache = LRUCache(10, weight=len)
+	cache['a'] = b'1234'
+	cache['b'] = b'5678'
+	cache['a'] = b'12'  # Replacement adjusts the total.
+	
+	assert cache.used == 6
+	
+	cache['c'] = b'12345'
+	
+	assert 'b' not in cache  # Least recently used.
+	assert cache.used == 7
+	assert repr(cache) == "LRUCache(7/10)"
+	
+	cache['d'] = b'12345678901'  # Larger than the entire cache.
+	
+	assert 'd' not in cache
+	assert cache.used == 7
+	
+	del cache['a']
+	assert cache.used == 5
+
+
+def test_inflight_tracking():
+	inflight = InFlight()
+	
+	assert inflight.wait(0)
+	
+	inflight.enter()
+	inflight.enter()
+	inflight.leave()
+	
+	assert len(inflight) == 1
+	assert repr(inflight) == "InFlight(1)"
+	assert not inflight.wait(0.01)
+	
+	inflight.leave(None)  # As a `done` callback.
+	
+	assert inflight.wait(0)
@@ -3,6 +3,7 @@
 from __future__ import unicode_literals
 
 from unittest import TestCase
+from collections.abc import Mapping
 from webob import Request
 from web.core.context import Context
 from web.core.compat import unicode
@@ -42,4 +43,34 @@ class TestWebViews(TestCase):
 		assert repr(self.view) == "WebViews(0)"
 		self.view.register(dict, self.mock_view)
 		assert repr(self.view) == "WebViews(1)"
-
+	
+	
+	def test_mro_ordering(self):
+		def general(context, result): pass
+		def specific(context, result): pass
+		
+		self.view.register(Exception, general)
+		self.view.register(ValueError, specific)
+		
+		assert self.view(UnicodeError("hi")) == (specific, general)
+	
+	def test_abstract_and_fallback_ordering(self):
+		def fallback(context, result): pass
+		def abstract(context, result): pass
+		def concrete(context, result): pass
+		
+		self.view.register(object, fallback)
+		self.view.register(Mapping, abstract)
+		self.view.register(dict, concrete)
+		
+		assert self.view({}) == (concrete, abstract, fallback)
+	
+	def test_candidate_cache(self):
+		cb = self.mock_view
+		self.view.register(unicode, cb)
+		
+		assert self.view("hi") is self.view("there")
+		assert unicode in self.view._cache
+		
+		self.view.register(int, cb)  # Registration invalidates the cache.
+		assert unicode not in self.view._cache
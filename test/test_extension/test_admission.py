@@ -0,0 +1,163 @@
+# encoding: utf-8
+
+import asyncio
+
+from threading import Event, Thread
+from unittest import TestCase
+
+from webob import Request
+
+from web.core import Application
+from web.ext.admission import AdmissionExtension, Gate
+from web.ext.analytics import AnalyticsExtension
+
+
+class TestGate(TestCase):
+	def test_uncontended(self):
+		gate = Gate(1, 0)
+		
+		assert gate.acquire(0)
+		assert not gate.acquire(0)
+		assert not gate.acquire(1)  # No room to queue.
+		
+		gate.release()
+		assert gate.acquire(0)
+	
+	def test_queue_deadline(self):
+		gate = Gate(1, 1)
+		
+		assert gate.acquire(0)
+		assert not gate.acquire(0.01)
+		assert gate.waiting == 0
+
+
+class Blocking(object):
+	"""Endpoints for exercising concurrency; `slow` blocks until released."""
+	
+	started = None
+	release = None
+	
+	def __init__(self, context):
+		pass
+	
+	def slow(self):
+		self.started.set()
+		self.release.wait(5)
+		return "Slow."
+	
+	def fast(self):
+		return "Fast."
+	
+	async def pause(self):
+		await asyncio.sleep(0.05)
+		return "Paused."
+
+
+class TestAdmission(TestCase):
+	def setUp(self):
+		Blocking.started, Blocking.release = Event(), Event()
+	
+	def request(self, app, path):
+		"""Issue a request, consuming the response body as a server would, completing the response."""
+		
+		response = Request.blank(path).get_response(app)
+		response.body
+		
+		return response
+	
+	def occupy(self, app, path='/slow'):
+		"""Issue a request in the background which remains in progress until released."""
+		
+		responses = []
+		thread = Thread(target=lambda: responses.append(self.request(app, path)))
+		thread.start()
+		Blocking.started.wait(5)
+		
+		return thread, responses
+	
+	def test_refusal(self):
+		app = Application(Blocking, extensions=[AdmissionExtension(1, queue=0, retry=7)])
+		thread, responses = self.occupy(app)
+		
+		try:
+			resp = Request.blank('/fast').get_response(app)
+		finally:
+			Blocking.release.set()
+			thread.join()
+		
+		assert resp.status_int == 503
+		assert resp.headers['Retry-After'] == '7'
+		assert b"temporarily unable" in resp.body
+		assert responses[0].body == b"Slow."
+		
+		assert Request.blank('/fast').get_response(app).body == b"Fast."  # Admission was released.
+	
+	def test_refusal_with_analytics(self):
+		app = Application(Blocking, extensions=[AdmissionExtension(1, queue=0), AnalyticsExtension()])
+		thread, responses = self.occupy(app)
+		
+		try:
+			resp = self.request(app, '/fast')
+		finally:
+			Blocking.release.set()
+			thread.join()
+		
+		assert resp.status_int == 503
+		assert 'X-Generation-Time' in resp.headers
+		assert 'prepare' in resp.headers['Server-Timing']
+	
+	def test_endpoint_class(self):
+		app = Application(Blocking, extensions=[AdmissionExtension(4, queue=0, classes={'/slow': 1})])
+		thread, responses = self.occupy(app)
+		
+		try:
+			assert Request.blank('/slow').get_response(app).status_int == 503
+			assert Request.blank('/fast').get_response(app).status_int == 200
+		finally:
+			Blocking.release.set()
+			thread.join()
+	
+	def test_queued(self):
+		ext = AdmissionExtension(1, queue=1, deadline=5)
+		app = Application(Blocking, extensions=[ext])
+		thread, responses = self.occupy(app)
+		
+		waiter = Thread(target=lambda: responses.append(self.request(app, '/fast')))
+		waiter.start()
+		
+		while not ext.gate.waiting: pass  # Wait for the second request to be queued.
+		
+		Blocking.release.set()
+		thread.join()
+		waiter.join()
+		
+		assert sorted(i.body for i in responses) == [b"Fast.", b"Slow."]
+	
+	def test_asgi_queued(self):
+		app = Application(Blocking, extensions=[AdmissionExtension(1, queue=4, deadline=1.0)])
+		
+		async def request():
+			sent = []
+			
+			async def receive():
+				return {'type': 'http.request', 'body': b'', 'more_body': False}
+			
+			async def send(message):
+				sent.append(message)
+			
+			await app.asgi({'type': 'http', 'method': 'GET', 'path': '/pause', 'query_string': b'', 'headers': []},
+					receive, send)
+			
+			return sent[0]['status']
+		
+		async def main():
+			return await asyncio.gather(*(request() for i in range(3)))
+		
+		loop = asyncio.new_event_loop()
+		
+		try:
+			started = loop.time()
+			assert loop.run_until_complete(main()) == [200] * 3  # Each waited its turn without stalling the others.
+			assert loop.time() - started < 0.5
+		finally:
+			loop.close()
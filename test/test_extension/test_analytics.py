@@ -1,12 +1,13 @@
 # encoding: utf-8
 
+import os
 import time
 import pytest
 
 from webob import Request
 from web.core import Application
 from web.core.context import Context
-from web.ext.analytics import AnalyticsExtension
+from web.ext.analytics import AnalyticsExtension, Metrics, SharedMetrics
 
 
 def endpoint(context):
@@ -41,3 +42,154 @@ def test_analytics_extension_in_context():
 	resp = Request.blank('/').get_response(sample)
 	assert 100 <= float(resp.headers['X-Generation-Time']) <= 200
 
+
+
+def test_analytics_phases():
+	timing = {'prepare': 0, 'dispatch': 1000000, 'view': 4000000}
+	
+	assert AnalyticsExtension.phases(timing, 4500000) == {'prepare': 1.0, 'dispatch': 3.0, 'view': 0.5}
+
+
+def test_analytics_server_timing():
+	try:
+		__import__('web.dispatch.object')
+	except ImportError:
+		pytest.skip("web.dispatch.object not installed")
+	
+	resp = Request.blank('/').get_response(sample)
+	metrics = [i.strip().partition(';') for i in resp.headers['Server-Timing'].split(',')]
+	
+	assert [name for name, _, _ in metrics] == ['prepare', 'dispatch', 'mutate', 'endpoint', 'transform', 'view', 'after']
+	assert all(value.startswith('dur=') for _, _, value in metrics)
+	assert 100 <= float(dict((name, value[4:]) for name, _, value in metrics)['endpoint']) <= 200
+
+
+def test_analytics_logging(caplog):
+	app = Application(endpoint, extensions=[AnalyticsExtension(header=None, timing=None, level='info')])
+	
+	with caplog.at_level('INFO', 'web.ext.analytics'):
+		resp = Request.blank('/').get_response(app)
+		assert resp.body == b'Hi.'  # Consume the body, completing the response.
+	
+	assert 'X-Generation-Time' not in resp.headers
+	assert 'Server-Timing' not in resp.headers
+	
+	record, = [i for i in caplog.records if i.name == 'web.ext.analytics']
+	
+	assert 'milliseconds' in record.getMessage()
+	assert set(record.phases) == {'prepare', 'dispatch', 'mutate', 'endpoint', 'transform', 'view', 'after'}
+	assert record.duration >= 100
+	assert record.ttlb >= 100
+
+
+class TestMetrics(object):
+	def test_record(self):
+		metrics = Metrics(buckets=(0.001, 0.01))
+		metrics.record('a', 500000, 200, 10)
+		metrics.record('a', 5000000, 404)
+		metrics.record('a', 50000000, 200, 5)
+		
+		assert metrics.series['a'] == [[1, 1, 1], 55500000, [0, 2, 0, 1, 0], 15]
+		
+		metrics.clear()
+		assert not metrics.series
+	
+	def test_exposition(self):
+		metrics = Metrics(buckets=(0.001, 0.01))
+		metrics.record('mod:"quoted"', 5000000, 200, 10)
+		
+		text = metrics.exposition()
+		
+		assert 'webcore_request_duration_seconds_bucket{endpoint="mod:\\"quoted\\"",le="0.001"} 0' in text
+		assert 'webcore_request_duration_seconds_bucket{endpoint="mod:\\"quoted\\"",le="0.01"} 1' in text
+		assert 'webcore_request_duration_seconds_bucket{endpoint="mod:\\"quoted\\"",le="+Inf"} 1' in text
+		assert 'webcore_request_duration_seconds_count{endpoint="mod:\\"quoted\\""} 1' in text
+		assert 'webcore_responses_total{endpoint="mod:\\"quoted\\"",status="2xx"} 1' in text
+		assert 'webcore_response_bytes_total{endpoint="mod:\\"quoted\\""} 10' in text
+		assert text.endswith('\n')
+	
+	def test_endpoint(self):
+		analytics = AnalyticsExtension(metrics=True)
+		
+		class Root(object):
+			metrics = analytics.metrics
+			
+			def __init__(self, context):
+				pass
+			
+			def hello(self):
+				return "Hello."
+		
+		app = Application(Root, extensions=[analytics])
+		
+		assert Request.blank('/hello').get_response(app).body == b"Hello."
+		assert Request.blank('/missing').get_response(app).status_int == 404
+		
+		resp = Request.blank('/metrics').get_response(app)
+		
+		assert resp.content_type == 'text/plain'
+		assert resp.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+		assert '<locals>.Root.hello",status="2xx"} 1' in resp.text
+		assert '<locals>.Root.hello"} 6' in resp.text
+		assert 'webcore_responses_total{endpoint="-",status="4xx"} 1' in resp.text
+
+
+class TestSharedMetrics(object):
+	def test_shared_between_instances(self, tmp_path):
+		path = str(tmp_path / 'metrics')
+		first, second = SharedMetrics(path, slots=8), SharedMetrics(path, slots=8)
+		
+		first.record('a', 5000000, 200, 10)
+		second.record('a', 5000000, 500, 5)
+		second.record('b', 1000, 404)
+		
+		(name, counts, total, statuses, size), other = first.snapshot()
+		
+		assert name == 'a'
+		assert sum(counts) == 2
+		assert total == 10000000
+		assert statuses == [0, 1, 0, 0, 1]
+		assert size == 15
+		assert other[0] == 'b'
+		
+		assert 'webcore_responses_total{endpoint="b",status="4xx"} 1' in second.exposition()
+		
+		first.clear()
+		assert second.snapshot() == []
+		
+		first.close()
+		second.close()
+	
+	def test_overflow(self, tmp_path):
+		metrics = SharedMetrics(str(tmp_path / 'metrics'), slots=2)
+		
+		metrics.record('a', 1, 200)
+		metrics.record('b', 1, 200)
+		metrics.record('c', 1, 200)
+		
+		assert [(name, sum(counts)) for name, counts, _, _, _ in metrics.snapshot()] == [('a', 1), ('~other', 2)]
+	
+	def test_incompatible(self, tmp_path):
+		path = str(tmp_path / 'metrics')
+		SharedMetrics(path, slots=2).close()
+		
+		with pytest.raises(ValueError):
+			SharedMetrics(path, slots=4)
+		
+		with pytest.raises(ValueError):
+			SharedMetrics(path, slots=2, buckets=(1, 2))
+	
+	@pytest.mark.skipif(not hasattr(os, 'fork'), reason="Requires fork().")
+	def test_forked_workers(self, tmp_path):
+		metrics = SharedMetrics(str(tmp_path / 'metrics'), slots=4)
+		pid = os.fork()
+		
+		for i in range(500):
+			metrics.record('a', 1, 200)
+		
+		if not pid:  # pragma: no cover
+			os._exit(0)
+		
+		os.waitpid(pid, 0)
+		
+		assert metrics.snapshot()[0][3] == [0, 1000, 0, 0, 0]
@@ -9,14 +9,17 @@ from web.core.context import Context
 pytestmark = pytest.mark.skipif(not py3, reason="Python 3 required for annotation support.")
 endpoint = None  # Correct mistaken linter.
 Endpoint = None  # Correct mistaken linter.
+generic = None  # Correct mistaken linter.
 
 
 if py3:
+	from typing import List, Optional
 	from web.ext.annotation import AnnotationExtension
 	
 	# This trick hides the syntax error from Python 2.
 	exec("def endpoint(a: int, b: int) -> 'int': return a * b")
 	exec("class Endpoint:\n\tdef endpoint(a: int, b: int): return a * b")
+	exec("def generic(tags: List[int], limit: Optional[int] = None, *rest: int): return tags, limit, rest")
 
 
 def bare_endpoint(a, b): return a * b
@@ -94,3 +97,74 @@ def test_annotation_failure():
 		
 		assert 'xyzzy' in s
 		assert "argument 'a'" in s
+
+
+def test_annotation_caster_reused():
+	from web.ext.annotation import casters
+	
+	assert casters(endpoint) is casters(endpoint)
+	assert casters(bare_endpoint) == ((), {}, None)
+
+
+class TestGenericAnnotations(object):
+	def test_optional(self):
+		from web.ext.annotation import caster
+		
+		cast = caster(Optional[int])
+		
+		assert cast('') is None
+		assert cast(None) is None
+		assert cast('27') == 27
+	
+	def test_sequence(self):
+		from typing import Tuple, FrozenSet
+		from web.ext.annotation import caster
+		
+		assert caster(List[int])('27') == [27]
+		assert caster(List[int])(['27', '42']) == [27, 42]
+		assert caster(Tuple[int, ...])(['1', '2']) == (1, 2)
+		assert caster(Tuple[int, str])(['1', '2']) == (1, '2')
+		assert caster(FrozenSet[int])(['1', '1']) == frozenset({1})
+		assert caster(list)('a') == ['a']  # Plain callables remain callbacks.
+		
+		with pytest.raises(ValueError):
+			caster(Tuple[int, str])(['1'])
+	
+	def test_union(self):
+		from typing import Any, Dict, Union
+		from web.ext.annotation import caster
+		
+		cast = caster(Union[int, float])
+		
+		assert cast('1') == 1
+		assert cast('1.5') == 1.5
+		
+		with pytest.raises(ValueError):
+			cast('xyzzy')
+		
+		assert caster(Any) is None
+		assert caster(Dict[str, int]) is None
+	
+	def test_endpoint(self):
+		ext = AnnotationExtension()
+		args = ['27', '', '1', '2']
+		kwargs = {}
+		
+		ext.mutate(Context(), generic, args, kwargs)
+		
+		assert args == [[27], None, '1', '2']  # Variadic positional values beyond the signature are untouched.
+		
+		args = []
+		kwargs = {'tags': ['1', '2'], 'limit': '10'}
+		
+		ext.mutate(Context(), generic, args, kwargs)
+		
+		assert kwargs == {'tags': [1, 2], 'limit': 10}
+	
+	def test_failure_message(self):
+		from web.ext.annotation import apply, caster
+		
+		with pytest.raises(ValueError) as excinfo:
+			apply('tags', caster(List[int]), ['1', 'xyzzy'])
+		
+		assert "argument 'tags'" in str(excinfo.value)
@@ -3,11 +3,13 @@
 from __future__ import unicode_literals
 
 import json
+import pytest
 from unittest import TestCase
 from webob import Request
 from webob.exc import HTTPNotModified
 
 from web.core.application import Application
+from web.ext.args import plan
 
 
 class MockController(object):
@@ -84,3 +86,53 @@ class TestArgumentAndExceptionHandling(TestCase):
 		res = self.do('/endpoint///2//4/')
 		assert res.status_int == 200
 		assert res.text == "8"
+
+
+class CallableEndpoint(object):
+	def __call__(self, a, *args, **kw):
+		pass
+
+
+def function_endpoint(context, a, b=None, *, c):
+	pass
+
+
+class TestArgumentPlan(TestCase):
+	def test_method(self):
+		result = plan(MockController(None).endpoint)
+		
+		assert result.positional == ('a', 'b')
+		assert result.names == {'a', 'b'}
+		assert result.named
+		assert not result.variadic
+		assert not result.keywords
+	
+	def test_function(self):
+		result = plan(function_endpoint)
+		
+		assert result.positional == ('context', 'a', 'b')
+		assert result.names == {'context', 'a', 'b', 'c'}
+	
+	def test_callable_instance(self):
+		result = plan(CallableEndpoint())
+		
+		assert result.positional == ('a', )
+		assert result.variadic
+		assert result.keywords
+	
+	def test_cached(self):
+		assert plan(MockController(None).endpoint) is plan(MockController(None).endpoint)
+	
+	def test_validate(self):
+		result = plan(MockController(None).endpoint)
+		result.validate(['1'], {'b': '2'})
+		
+		with pytest.raises(TypeError):
+			result.validate(['1', '2', '3'], {})
+	
+	def test_unnamed(self):
+		assert not plan(MockController(None).notmod).named
+	
+	def test_ignored_keywords(self):
+		app = Application(MockController)
+		assert Request.blank('/notmod?foo=bar').get_response(app).status_int == 304
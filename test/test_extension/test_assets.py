@@ -0,0 +1,100 @@
+# encoding: utf-8
+
+import os
+
+from webob import Request
+
+from web.app.static import static
+from web.core import Application
+from web.ext.assets import WebAssetsExtension
+
+
+class TestAssets(object):
+	def application(self, tmpdir, **kw):
+		path = str(tmpdir.join('public'))
+		extension = self.extension = WebAssetsExtension({'/public': path}, **kw)
+		
+		class Root(object):
+			def __init__(self, context):
+				self._ctx = context
+			
+			public = static(path)
+			
+			def page(self, url):
+				return self._ctx.asset(url)
+		
+		return Application(Root, extensions=[extension])
+	
+	def request(self, app, path, **kw):
+		return Request.blank(path, **kw).get_response(app)
+	
+	def populate(self, tmpdir):
+		public = tmpdir.mkdir('public')
+		public.mkdir('css').join('site.min.css').write("body { color: red; }")
+		public.join('LICENSE').write("Public domain.")
+		return public
+	
+	def test_url(self, tmpdir):
+		self.populate(tmpdir)
+		app = self.application(tmpdir)
+		
+		url = self.request(app, '/page?url=/public/css/site.min.css').text
+		assert url.startswith('/public/css/site.min.') and url.endswith('.css')
+		assert len(url) == len('/public/css/site.min.css') + 13
+		
+		url = self.request(app, '/page?url=/public/LICENSE').text
+		assert url.startswith('/public/LICENSE.') and len(url) == len('/public/LICENSE') + 13
+		
+		assert self.request(app, '/page?url=/public/missing.js').text == '/public/missing.js'
+		assert self.extension.url('/public/LICENSE?v=1').startswith(url + '?v=1')
+	
+	def test_immutable(self, tmpdir):
+		self.populate(tmpdir)
+		app = self.application(tmpdir)
+		
+		response = self.request(app, self.extension.url('/public/css/site.min.css'))
+		assert response.status_int == 200
+		assert response.text == "body { color: red; }"
+		assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+		
+		response = self.request(app, '/public/css/site.min.css')  # The original remains available.
+		assert response.status_int == 200
+		assert 'immutable' not in response.headers.get('Cache-Control', '')
+	
+	def test_outdated(self, tmpdir):
+		self.populate(tmpdir)
+		app = self.application(tmpdir)
+		
+		response = self.request(app, '/public/css/site.min.000000000000.css')
+		assert response.text == "body { color: red; }"
+		assert response.headers['Cache-Control'] == 'no-cache'
+		assert 'immutable' not in response.headers.get('Cache-Control', '')
+		
+		assert self.request(app, '/public/css/other.000000000000.css').status_int == 404
+	
+	def test_refresh(self, tmpdir, monkeypatch):
+		public = self.populate(tmpdir)
+		self.application(tmpdir)
+		
+		before = self.extension.url('/public/css/site.min.css')
+		public.join('css', 'site.min.css').write("body { color: blue; }")
+		public.join('css', 'site.min.css').setmtime(public.join('css', 'site.min.css').mtime() + 60)
+		
+		hashed = []
+		original = WebAssetsExtension._hash
+		monkeypatch.setattr(WebAssetsExtension, '_hash', lambda self, path: hashed.append(path) or original(self, path))
+		
+		self.extension.refresh()
+		
+		assert self.extension.url('/public/css/site.min.css') != before
+		assert hashed == [os.path.join(str(public), 'css', 'site.min.css')]  # Unmodified files are not hashed again.
+	
+	def test_poll(self, tmpdir):
+		public = self.populate(tmpdir)
+		app = self.application(tmpdir, poll=60)
+		
+		public.join('app.js').write("var x;")
+		assert self.request(app, '/page?url=/public/app.js').text == '/public/app.js'
+		
+		self.extension.refreshed -= 120
+		assert self.request(app, '/page?url=/public/app.js').text != '/public/app.js'
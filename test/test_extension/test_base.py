@@ -2,9 +2,15 @@
 
 from __future__ import unicode_literals
 
+import os.path
+
+from io import BytesIO
+
 from webob import Request, Response
+from wsgiref.util import FileWrapper
 
 from web.core.application import Application
+from web.ext.base import FileBody
 from web.core.util import safe_name
 
 
@@ -18,6 +24,8 @@ def response_endpoint(ctx): return Response(text="Yo.")
 
 def binary_file_endpoint(ctx): return open('LICENSE.txt', 'rb')
 
+def memory_file_endpoint(ctx): return BytesIO(open('LICENSE.txt', 'rb').read())
+
 def generator_endpoint(ctx):
 	yield b'foo'
 	yield b'bar'
@@ -54,6 +62,86 @@ class TestBreadcrumbPath(object):
 		assert response == "test_base:MockController, test_base:MockController.handlers"
 
 
+class TestLazyConstruction(object):
+	def do(self, path):
+		app = Application(MockController)
+		request = Request.blank(path)
+		response = request.get_response(app)
+		return request.environ['wc.context'], response
+	
+	def test_request_deferred(self):
+		context, response = self.do('/here')
+		
+		assert response.text == '/here'
+		assert 'request' not in context.__dict__
+	
+	def test_request_remainder(self):
+		app = Application(MockController)
+		context = app.RequestContext(environ=Request.blank('/foo/bar').environ)
+		
+		assert context.request.remainder == ['foo', 'bar']
+		assert context.request is context.request  # Constructed once.
+	
+	def test_query_string_ignored(self):  # The endpoint accepts no keyword arguments.
+		context, response = self.do('/here?foo=bar')
+		
+		assert response.text == '/here'
+		assert 'request' not in context.__dict__
+
+
+class HeaderExtension(object):
+	def after(self, context):
+		context.response.headers['X-Foo'] = 'bar'
+
+
+class TestRawResponse(object):
+	def do(self, endpoint, method='GET', **kw):
+		app = Application(endpoint, **kw)
+		request = Request.blank('/', method=method)
+		response = request.get_response(app)
+		return request.environ['wc.context'], response
+	
+	def test_binary(self):
+		context, response = self.do(binary_endpoint)
+		
+		assert 'response' not in context.__dict__
+		assert response.body == b"Word."
+		assert response.content_length == 5
+		assert response.content_type == 'text/html'
+	
+	def test_text(self):
+		context, response = self.do(lambda ctx: "Hé.")
+		
+		assert 'response' not in context.__dict__
+		assert response.body == "Hé.".encode('utf8')
+		assert response.charset == 'UTF-8'
+	
+	def test_memoryview(self):
+		context, response = self.do(lambda ctx: memoryview(b"Word."))
+		assert response.body == b"Word."
+	
+	def test_head(self):
+		context, response = self.do(binary_endpoint, 'HEAD')
+		
+		assert response.body == b""
+		assert response.content_length == 5
+	
+	def test_response_touched(self):
+		context, response = self.do(binary_endpoint, extensions=[HeaderExtension()])
+		
+		assert 'response' in context.__dict__
+		assert response.headers['X-Foo'] == 'bar'
+		assert response.body == b"Word."
+	
+	def test_range(self):
+		app = Application(binary_endpoint)
+		request = Request.blank('/', range=(1, 3))
+		response = request.get_response(app)
+		
+		assert response.status_int == 206
+		assert response.body == b"or"
+
+
 class TestDefaultViews(object):
 	def do(self, endpoint):
 		app = Application(endpoint)
@@ -79,3 +167,136 @@ class TestDefaultViews(object):
 	def test_generator(self):
 		assert 'foobar' in self.do(generator_endpoint).text
 
+
+
+class DoneExtension(object):
+	def __init__(self):
+		self.completed = []
+	
+	def done(self, context):
+		self.completed.append(context)
+
+
+class TestFileDelivery(object):
+	def call(self, app, **environ):
+		request = Request.blank('/', environ=environ)
+		captured = []
+		body = app(request.environ, lambda status, headers, exc_info=None: captured.append((status, headers)))
+		return captured[0], body
+	
+	def test_fallback(self):
+		(status, headers), body = self.call(Application(binary_file_endpoint))
+		
+		assert isinstance(body, FileBody)
+		assert dict(headers)['Content-Length'] == str(os.path.getsize('LICENSE.txt'))
+		assert b''.join(body) == open('LICENSE.txt', 'rb').read()
+		
+		body.close()
+		assert body.file.closed
+	
+	def test_file_wrapper(self):
+		(status, headers), body = self.call(Application(binary_file_endpoint), **{'wsgi.file_wrapper': FileWrapper})
+		
+		assert isinstance(body, FileWrapper)  # Unwrapped, permitting the server to use sendfile.
+		assert dict(headers)['Content-Length'] == str(os.path.getsize('LICENSE.txt'))
+		body.close()
+	
+	def test_file_wrapper_done(self):
+		extension = DoneExtension()
+		app = Application(binary_file_endpoint, extensions=[extension])
+		(status, headers), body = self.call(app, **{'wsgi.file_wrapper': FileWrapper})
+		
+		assert isinstance(body, FileWrapper)
+		assert not extension.completed
+		
+		body.close()
+		assert len(extension.completed) == 1
+		assert body.filelike.closed
+
+
+class TestFileRanges(object):
+	LICENSE = open('LICENSE.txt', 'rb').read()
+	
+	def do(self, **headers):
+		return Request.blank('/', headers=headers).get_response(Application(binary_file_endpoint))
+	
+	def test_whole(self):
+		response = self.do()
+		
+		assert response.status_int == 200
+		assert response.accept_ranges == 'bytes'
+		assert response.body == self.LICENSE
+	
+	def test_single(self):
+		response = self.do(Range='bytes=10-19')
+		
+		assert response.status_int == 206
+		assert response.headers['Content-Range'] == 'bytes 10-19/{}'.format(len(self.LICENSE))
+		assert response.body == self.LICENSE[10:20]
+	
+	def test_suffix(self):
+		response = self.do(Range='bytes=-5')
+		
+		assert response.status_int == 206
+		assert response.body == self.LICENSE[-5:]
+	
+	def test_open_ended(self):
+		response = self.do(Range='bytes=100-')
+		
+		assert response.status_int == 206
+		assert response.body == self.LICENSE[100:]
+	
+	def test_multiple(self):
+		response = self.do(Range='bytes=0-4, 20-29, 25-34')
+		
+		assert response.status_int == 206
+		assert response.content_type == 'multipart/byteranges'
+		assert response.content_length == len(response.body)
+		
+		boundary = response.headers['Content-Type'].partition('boundary=')[2].encode('ascii')
+		parts = response.body.split(b'--' + boundary)
+		
+		assert len(parts) == 4 and parts[0] == b'' and parts[-1] == b'--\r\n'
+		assert parts[1].endswith(b'\r\n\r\n' + self.LICENSE[0:5] + b'\r\n')
+		assert b'Content-Range: bytes 20-34/' in parts[2]  # Overlapping ranges are merged.
+		assert parts[2].endswith(b'\r\n\r\n' + self.LICENSE[20:35] + b'\r\n')
+	
+	def test_unsatisfiable(self):
+		response = self.do(Range='bytes={}-'.format(len(self.LICENSE)))
+		
+		assert response.status_int == 416
+		assert response.headers['Content-Range'] == 'bytes */{}'.format(len(self.LICENSE))
+	
+	def test_malformed(self):
+		response = self.do(Range='bytes=5-1')
+		
+		assert response.status_int == 200
+		assert response.body == self.LICENSE
+	
+	def test_if_range(self):
+		etag = self.do().etag
+		
+		assert self.do(Range='bytes=0-4', If_Range='"{}"'.format(etag)).status_int == 206
+		assert self.do(Range='bytes=0-4', If_Range='"stale"').status_int == 200
+	
+	def test_memory(self):
+		endpoint = Application(memory_file_endpoint)
+		response = Request.blank('/', headers={'Range': 'bytes=10-19'}).get_response(endpoint)
+		
+		assert response.status_int == 206
+		assert response.content_type == 'application/octet-stream'
+		assert response.etag is None and response.last_modified is None
+		assert response.headers['Content-Range'] == 'bytes 10-19/{}'.format(len(self.LICENSE))
+		assert response.body == self.LICENSE[10:20]
+		
+		assert Request.blank('/').get_response(endpoint).body == self.LICENSE
+	
+	def test_file_wrapper(self):
+		request = Request.blank('/', headers={'Range': 'bytes=10-19'}, environ={'wsgi.file_wrapper': FileWrapper})
+		captured = []
+		body = Application(binary_file_endpoint)(request.environ, lambda *args: captured.append(args))
+		
+		assert captured[0][0].startswith('206')
+		assert isinstance(body, FileWrapper)
+		assert b''.join(body) == self.LICENSE[10:20]  # Bounded, even if the server can not use sendfile.
+		body.close()
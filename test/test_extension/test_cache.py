@@ -0,0 +1,165 @@
+# encoding: utf-8
+
+import os
+
+from shutil import rmtree
+from tempfile import mkdtemp
+from unittest import TestCase
+
+from webob import Request
+
+from web.core import Application
+from web.ext.analytics import AnalyticsExtension
+from web.ext.cache import CacheExtension
+
+
+class Counted(object):
+	"""Endpoints for exercising caching, each recording the number of times it is executed."""
+	
+	calls = None
+	
+	def __init__(self, context):
+		self._ctx = context
+	
+	def __call__(self, value=None, other=None):
+		self.calls.append(value)
+		return "Value: " + repr(value)
+	
+	def article(self, id):
+		self.calls.append(id)
+		self._ctx.response.headers['Cache-Tag'] = 'article, article:' + id
+		return "Article " + id + "."
+	
+	def negotiated(self):
+		self.calls.append(None)
+		self._ctx.response.vary = ('Accept-Language', )
+		return self._ctx.request.headers.get('Accept-Language', 'en')
+	
+	def private(self):
+		self.calls.append(None)
+		self._ctx.response.cache_control = 'private'
+		return "Private."
+	
+	def personal(self):
+		self.calls.append(None)
+		self._ctx.response.set_cookie('session', 'secret')
+		return "Personal."
+	
+	def greeting(self):
+		self.calls.append(None)
+		return "Hello " + self._ctx.request.cookies.get('user', 'stranger') + "."
+	
+	def stream(self):
+		self.calls.append(None)
+		
+		for i in range(3):
+			yield "Chunk {}.".format(i)
+	
+	def versioned(self):
+		self.calls.append(None)
+		self._ctx.response.etag = 'v1'
+		return "Versioned."
+	
+	def brief(self):
+		self.calls.append(None)
+		self._ctx.response.cache_control.max_age = 0
+		return "Brief."
+
+
+class TestCache(TestCase):
+	def extension(self):
+		return CacheExtension()
+	
+	def setUp(self):
+		Counted.calls = []
+		self.app = Application(Counted, extensions=[self.extension()])
+	
+	def request(self, path, **kw):
+		response = Request.blank(path, **kw).get_response(self.app)
+		response.body
+		return response
+	
+	def test_hit(self):
+		first = self.request('/?value=27&other=1')
+		second = self.request('/?other=1&value=27')  # Argument order is immaterial.
+		
+		assert first.headers['X-Cache'] == 'MISS'
+		assert second.headers['X-Cache'] == 'HIT'
+		assert 'Age' in second.headers
+		assert second.headers.getall('X-Cache') == ['HIT']
+		assert first.body == second.body == b"Value: '27'"
+		assert Counted.calls == ['27']
+		
+		assert self.request('/?value=42').body == b"Value: '42'"
+		assert self.request('/', method='HEAD').body == b''
+		assert len(Counted.calls) == 3
+	
+	def test_unsafe_and_authorized(self):
+		self.request('/', method='POST')
+		self.request('/', method='POST')
+		self.request('/', headers={'Authorization': 'Bearer 27'})
+		self.request('/', headers={'Authorization': 'Bearer 27'})
+		
+		assert len(Counted.calls) == 4
+	
+	def test_cookie(self):
+		assert self.request('/greeting', headers={'Cookie': 'user=alice'}).body == b"Hello alice."
+		assert self.request('/greeting').body == b"Hello stranger."
+		assert self.request('/greeting', headers={'Cookie': 'user=bob'}).body == b"Hello bob."
+		assert self.request('/greeting').headers['X-Cache'] == 'HIT'
+		assert len(Counted.calls) == 3
+	
+	def test_uncacheable(self):
+		for path in ('/private', '/personal', '/brief', '/stream'):
+			self.request(path)
+			self.request(path)
+		
+		assert len(Counted.calls) == 8
+	
+	def test_vary(self):
+		assert self.request('/negotiated', headers={'Accept-Language': 'fr'}).body == b'fr'
+		assert self.request('/negotiated', headers={'Accept-Language': 'de'}).body == b'de'
+		assert self.request('/negotiated', headers={'Accept-Language': 'fr'}).body == b'fr'
+		assert self.request('/negotiated', headers={'Accept-Language': 'de'}).headers['X-Cache'] == 'HIT'
+		assert len(Counted.calls) == 2
+	
+	def test_tag_invalidation(self):
+		response = self.request('/article/27')
+		self.request('/article/42')
+		
+		assert 'Cache-Tag' not in response.headers
+		
+		self.app._Application__context.cache.invalidate('article:27')
+		
+		assert self.request('/article/27').headers['X-Cache'] == 'MISS'
+		assert self.request('/article/42').headers['X-Cache'] == 'HIT'
+		assert Counted.calls == ['27', '42', '27']
+	
+	def test_conditional(self):
+		etag = self.request('/versioned').headers['ETag']
+		response = self.request('/versioned', headers={'If-None-Match': etag})
+		
+		assert response.status_int == 304
+		assert response.headers['X-Cache'] == 'HIT'
+		assert len(Counted.calls) == 1
+	
+	
+	def test_analytics(self):
+		self.app = Application(Counted, extensions=[self.extension(), AnalyticsExtension()])
+		
+		assert self.request('/?value=27').headers['X-Cache'] == 'MISS'
+		
+		response = self.request('/?value=27')
+		assert response.headers['X-Cache'] == 'HIT'
+		assert 'X-Generation-Time' in response.headers
+
+
+class TestSharedCache(TestCache):
+	"""As per the in-process cache, with storage shared between processes, referenced by name."""
+	
+	def extension(self):
+		self.directory = mkdtemp()
+		return CacheExtension('web.cache.sqlite:SQLiteCache', path=os.path.join(self.directory, 'cache.sqlite'))
+	
+	def tearDown(self):
+		rmtree(self.directory)
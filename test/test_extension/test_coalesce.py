@@ -0,0 +1,202 @@
+# encoding: utf-8
+
+import asyncio
+
+from threading import Event, Thread
+from time import monotonic
+from unittest import TestCase
+
+from webob import Request
+
+from web.core import Application
+from web.ext.coalesce import CoalesceExtension
+
+
+class Hot(object):
+	"""Endpoints for exercising coalescing; each blocks until released, counting executions."""
+	
+	calls = None
+	started = None
+	release = None
+	
+	def __init__(self, context):
+		self._ctx = context
+	
+	def expensive(self, value=None):
+		self.calls.append(value)
+		self.started.set()
+		self.release.wait(5)
+		return "Value: " + repr(value)
+	
+	def tags(self, tag=None):
+		self.calls.append(tag)
+		self.started.set()
+		self.release.wait(5)
+		return "Tags: " + repr(tag)
+	
+	def private(self):
+		self.calls.append(None)
+		self.started.set()
+		self.release.wait(5)
+		self._ctx.response.set_cookie('session', 'secret')
+		return "Private."
+	
+	def failing(self):
+		self.calls.append(None)
+		self.started.set()
+		self.release.wait(5)
+		
+		if len(self.calls) == 1:
+			raise ValueError("Failure.")
+		
+		return "Recovered."
+	
+	def stream(self):
+		for i in range(3):
+			self.calls.append(i)
+			yield "Chunk {}.".format(i)
+
+
+def hot(context, value=None):
+	"""A function endpoint, passed the context as its first argument."""
+	
+	Hot.calls.append(value)
+	Hot.started.set()
+	Hot.release.wait(5)
+	return "Function: " + repr(value)
+
+
+class Asynchronous(object):
+	calls = []
+	
+	def __init__(self, context):
+		pass
+	
+	async def __call__(self):
+		self.calls.append(None)
+		await asyncio.sleep(0.1)
+		return "Asynchronous."
+
+
+class TestCoalesce(TestCase):
+	def setUp(self):
+		Hot.calls, Hot.started, Hot.release = [], Event(), Event()
+		self.ext = CoalesceExtension()
+		self.app = Application(Hot, extensions=[self.ext])
+	
+	def request(self, path, method='GET'):
+		"""Issue a request, consuming the response body as a server would, completing the response."""
+		
+		response = Request.blank(path, method=method).get_response(self.app)
+		response.body
+		
+		return response
+	
+	def concurrently(self, path, count=4, method='GET'):
+		"""Issue one request, then more identical ones while it is in progress, returning all responses."""
+		
+		responses = []
+		threads = [Thread(target=lambda: responses.append(self.request(path, method))) for i in range(count)]
+		
+		threads[0].start()
+		Hot.started.wait(5)
+		
+		for thread in threads[1:]: thread.start()
+		
+		if method in self.ext.methods:
+			deadline = monotonic() + 5
+			
+			while not self.ext.flights or next(iter(self.ext.flights.values())).waiting < count - 1:
+				if monotonic() > deadline:  # Release the requests in progress prior to failing.
+					Hot.release.set()
+					for thread in threads: thread.join()
+					raise AssertionError("Identical requests did not join the flight.")
+		
+		Hot.release.set()
+		for thread in threads: thread.join()
+		
+		return responses
+	
+	def test_coalesced(self):
+		responses = self.concurrently('/expensive?value=27')
+		
+		assert Hot.calls == ['27']
+		assert [i.body for i in responses] == [b"Value: '27'"] * 4
+		assert all(i.status_int == 200 for i in responses)
+		assert not self.ext.flights
+		
+		assert self.request('/expensive?value=27').body == b"Value: '27'"  # Nothing is retained.
+		assert len(Hot.calls) == 2
+	
+	def test_distinct_arguments(self):
+		Hot.release.set()
+		
+		assert self.request('/expensive?value=1').body == b"Value: '1'"
+		assert self.request('/expensive?value=2').body == b"Value: '2'"
+		assert Hot.calls == ['1', '2']
+	
+	def test_repeated_arguments(self):
+		responses = self.concurrently('/tags?tag=a&tag=b')
+		
+		assert Hot.calls == [['a', 'b']]
+		assert [i.body for i in responses] == [b"Tags: ['a', 'b']"] * 4
+	
+	def test_function_endpoint(self):
+		self.app = Application(hot, extensions=[self.ext])
+		responses = self.concurrently('/?value=27')
+		
+		assert Hot.calls == ['27']
+		assert [i.body for i in responses] == [b"Function: '27'"] * 4
+	
+	def test_unsafe_method(self):
+		responses = self.concurrently('/expensive', method='POST')
+		
+		assert len(Hot.calls) == 4
+		assert len(responses) == 4
+	
+	def test_cookies_not_shared(self):
+		responses = self.concurrently('/private')
+		
+		assert len(Hot.calls) == 4
+		assert all(i.body == b"Private." for i in responses)
+	
+	def test_failure(self):
+		responses = self.concurrently('/failing', count=2)
+		
+		assert len(Hot.calls) == 2
+		assert sorted(i.status_int for i in responses) == [200, 500]
+	
+	def test_uncontended_stream(self):
+		events = []
+		
+		def start_response(status, headers, exc_info=None):
+			events.append(status)
+		
+		body = self.app(Request.blank('/stream').environ, start_response)
+		assert events == ['200 OK']
+		assert Hot.calls == []  # Nothing waits; the body is not read in order to copy it.
+		
+		assert b''.join(body) == b"Chunk 0.Chunk 1.Chunk 2."
+		body.close()
+		assert Hot.calls == [0, 1, 2]
+	
+	def test_asgi(self):
+		app = Application(Asynchronous, extensions=[CoalesceExtension()])
+		
+		async def request():
+			sent = []
+			
+			async def receive():
+				return {'type': 'http.request', 'body': b'', 'more_body': False}
+			
+			async def send(message):
+				sent.append(message)
+			
+			await app.asgi({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'headers': []}, receive, send)
+			return b''.join(i.get('body', b'') for i in sent if i['type'] == 'http.response.body')
+		
+		async def main():
+			return await asyncio.gather(*(request() for i in range(4)))
+		
+		assert asyncio.run(main()) == [b"Asynchronous."] * 4
+		assert len(Asynchronous.calls) == 1
@@ -0,0 +1,98 @@
+# encoding: utf-8
+
+import gzip
+import zlib
+
+from unittest import TestCase
+
+from webob import Request
+
+from web.core import Application
+from web.ext.compress import CompressionExtension
+
+
+TEXT = "All work and no play makes Jack a dull boy. " * 64
+
+
+class Compressible(object):
+	def __init__(self, context):
+		self._ctx = context
+	
+	def text(self):
+		return TEXT
+	
+	def small(self):
+		return "Tiny."
+	
+	def image(self):
+		self._ctx.response.content_type = 'image/png'
+		return TEXT.encode('ascii')
+	
+	def tagged(self):
+		self._ctx.response.etag = 'v1'
+		return TEXT
+	
+	def stream(self):
+		for i in range(3):
+			yield "Chunk {}: {}\n".format(i, TEXT[:200])
+
+
+class TestCompression(TestCase):
+	def setUp(self):
+		self.app = Application(Compressible, extensions=[CompressionExtension()])
+	
+	def request(self, path, encoding='gzip', **kw):
+		if encoding is not None:
+			kw.setdefault('headers', {})['Accept-Encoding'] = encoding
+		
+		return Request.blank(path, **kw).get_response(self.app)
+	
+	def test_gzip(self):
+		response = self.request('/text')
+		
+		assert response.content_encoding == 'gzip'
+		assert response.content_length == len(response.body) < len(TEXT)
+		assert 'Accept-Encoding' in response.vary
+		assert gzip.decompress(response.body).decode('ascii') == TEXT
+	
+	def test_negotiation(self):
+		assert self.request('/text', 'gzip;q=0, deflate').content_encoding == 'deflate'
+		assert self.request('/text', 'deflate;q=0.5, gzip;q=0.8').content_encoding == 'gzip'
+		assert self.request('/text', 'identity').content_encoding is None
+		assert self.request('/text', '*;q=0').content_encoding is None
+		
+		response = self.request('/text', 'deflate')
+		assert zlib.decompress(response.body).decode('ascii') == TEXT
+	
+	def test_uncompressed(self):
+		assert self.request('/text', None).content_encoding is None
+		assert self.request('/small').content_encoding is None
+		assert self.request('/image').content_encoding is None
+		assert self.request('/text', headers={'Range': 'bytes=0-9'}).content_encoding is None
+	
+	def test_weak_etag(self):
+		response = self.request('/tagged')
+		
+		assert response.headers['ETag'] == 'W/"v1"'
+		assert self.request('/tagged', headers={'If-None-Match': 'W/"v1"'}).status_int == 304
+	
+	def test_streaming(self):
+		environ = Request.blank('/stream', headers={'Accept-Encoding': 'gzip'}).environ
+		captured = []
+		body = self.app(environ, lambda status, headers: captured.extend(headers))
+		decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+		headers = dict(captured)
+		
+		assert headers['Content-Encoding'] == 'gzip'
+		assert 'Content-Length' not in headers
+		
+		chunks = iter(body)
+		
+		# Each chunk is flushed as produced; the first is available without awaiting the remainder of the stream.
+		assert decompressor.decompress(next(chunks)).decode('ascii').startswith("Chunk 0: ")
+		
+		remainder = b''.join(decompressor.decompress(chunk) for chunk in chunks)
+		body.close()
+		
+		assert remainder.decode('ascii').startswith("Chunk 1: ")
+		assert decompressor.eof
@@ -6,19 +6,199 @@
 
 from __future__ import unicode_literals
 
-from os.path import abspath, normpath, exists, isfile, join as pathjoin, basename
+import os
+
+from collections import namedtuple
+from datetime import datetime
+from mimetypes import guess_type
+from stat import S_ISREG
+from threading import Lock
+from time import gmtime, mktime, time
+from os.path import abspath, normpath, exists, isfile, join as pathjoin, basename, dirname, getmtime, relpath
 from webob.exc import HTTPForbidden, HTTPNotFound
 
+from web.core.util import LRUCache
+from web.ext.base import file_etag
+from web.ext.compress import ENCODERS, compressible, negotiate
+
 
 # ## Module Globals
 
 # A standard logging object.
 log = __import__('logging').getLogger(__name__)
 
+# The filename suffixes of precompressed variants, by content coding.
+SUFFIXES = {'zstd': '.zst', 'gzip': '.gz'}
+
+# The compression levels used to generate precompressed variants; as this is done once, spare no effort.
+LEVELS = {'zstd': 19, 'gzip': 9}
+
+
+# The metadata of an indexed file: its path, size in bytes, modification time, the entity tag and content type the
+# file view will assign, and the entries of any current precompressed variants, by content coding.
+Entry = namedtuple('Entry', ('path', 'size', 'modified', 'etag', 'content_type', 'variants'))
+
+# A file retained in memory: its entity tag, content, content type and coding, and modification time.
+Resident = namedtuple('Resident', ('etag', 'body', 'content_type', 'encoding', 'modified'))
+
+
+# ## Precompression
+
+def precompress(base, cache, encodings=('zstd', 'gzip'), minimum=512):
+	"""Generate compressed variants of the compressible files beneath `base` within the `cache` directory.
+	
+	The directory structure of `base` is mirrored. Variants are only regenerated if older than their source file, and
+	are assigned the modification time of their source. Those which would not be smaller than their source are not
+	retained. Encodings the interpreter can not produce are skipped.
+	"""
+	
+	encodings = [i for i in encodings if i in ENCODERS]
+	
+	for root, directories, files in os.walk(base):
+		for name in files:
+			source = pathjoin(root, name)
+			content_type, coding = guess_type(name)
+			stat = os.stat(source)
+			
+			if coding or not compressible(content_type) or stat.st_size < minimum:
+				continue
+			
+			data = None
+			
+			for encoding in encodings:
+				target = pathjoin(cache, relpath(source, base)) + SUFFIXES[encoding]
+				
+				if exists(target) and getmtime(target) >= stat.st_mtime:
+					continue
+				
+				if data is None:
+					with open(source, 'rb') as fh:
+						data = fh.read()
+				
+				compress, flush, finish = ENCODERS[encoding](LEVELS[encoding])
+				compressed = compress(data) + finish()
+				
+				if len(compressed) >= len(data):
+					continue
+				
+				if __debug__:
+					log.debug("Precompressing static file.", extra=dict(path=source, encoding=encoding,
+							ratio=round(len(compressed) / len(data), 3)))
+				
+				os.makedirs(dirname(target), exist_ok=True)
+				
+				with open(target + '.tmp', 'wb') as fh:  # Write then atomically rename, as others may be reading.
+					fh.write(compressed)
+				
+				os.utime(target + '.tmp', ns=(stat.st_atime_ns, stat.st_mtime_ns))
+				os.replace(target + '.tmp', target)
+
+
+# ## Static File Index
+
+class Index(object):
+	"""An in-memory index of the files beneath a base path, permitting their lookup without filesystem access.
+	
+	Files are identified by their path relative to the base, using forward slashes. Only regular files are indexed.
+	The index is populated on construction and again on each call to `refresh`; if `poll` is given, lookups made more
+	than that many seconds after the last refresh trigger another, within the requesting thread. Lookups made in other
+	threads during a refresh are answered from the prior index.
+	"""
+	
+	__slots__ = ('base', 'cache', 'encodings', 'poll', 'entries', 'refreshed', 'lock')
+	
+	def __init__(self, base, cache=None, encodings=(), poll=None):
+		self.base = base
+		self.cache = cache
+		self.encodings = encodings
+		self.poll = poll
+		self.entries = {}
+		self.refreshed = 0
+		self.lock = Lock()
+		
+		self.refresh()
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({0.base!r}, files={1})".format(self, len(self.entries))
+	
+	def __len__(self):
+		return len(self.entries)
+	
+	def __contains__(self, path):
+		return path in self.entries
+	
+	def get(self, parts):
+		"""Retrieve the entry for the given path elements, or `None` if no such file was present."""
+		
+		if self.poll and time() - self.refreshed > self.poll and self.lock.acquire(False):
+			try:
+				self.refresh()
+			finally:
+				self.lock.release()
+		
+		return self.entries.get('/'.join(parts))
+	
+	def refresh(self):
+		"""Scan the filesystem, replacing the index."""
+		
+		files = self._scan(self.base)
+		cached = self._scan(self.cache) if self.cache else {}
+		entries = {}
+		
+		for key, (path, stat) in files.items():
+			found = {}
+			
+			for encoding in self.encodings:
+				suffix = SUFFIXES.get(encoding)
+				
+				if not suffix:
+					continue
+				
+				for candidate in (cached.get(key + suffix), files.get(key + suffix)):
+					if candidate and candidate[1].st_mtime >= stat.st_mtime:
+						found[encoding] = self._entry(*candidate)
+						break
+			
+			entries[key] = self._entry(path, stat, found)
+		
+		self.entries = entries  # Replaced as a whole; concurrent lookups see either the old index or the new.
+		self.refreshed = time()
+		
+		if __debug__:
+			log.debug("Indexed static files.", extra=dict(base=self.base, files=len(entries)))
+	
+	@staticmethod
+	def _entry(path, stat, variants=None):
+		content_type, coding = guess_type(path)
+		
+		return Entry(path, stat.st_size, mktime(gmtime(stat.st_mtime)), file_etag(stat, coding),
+				content_type or 'application/octet-stream', variants or {})
+	
+	@staticmethod
+	def _scan(base):
+		"""Identify the regular files beneath a path, returning a mapping of relative path to a `(path, stat)` tuple."""
+		
+		found = {}
+		
+		for root, directories, files in os.walk(base):
+			for name in files:
+				path = pathjoin(root, name)
+				
+				try:
+					stat = os.stat(path)
+				except OSError:  # Removed during the scan, or a dangling symbolic link.
+					continue
+				
+				if S_ISREG(stat.st_mode):
+					found[relpath(path, base).replace(os.sep, '/')] = path, stat
+		
+		return found
+
 
 # ## Static File Endpoint
 
-def static(base, mapping=None, far=('js', 'css', 'gif', 'jpg', 'jpeg', 'png', 'ttf', 'woff')):
+def static(base, mapping=None, far=('js', 'css', 'gif', 'jpg', 'jpeg', 'png', 'ttf', 'woff'),
+		encodings=('zstd', 'gzip'), cache=None, index=False, poll=None, memory=None, small=16 * 1024):
 	"""Serve files from disk.
 	
 	This utility endpoint factory is meant primarily for use in development environments; in production environments
@@ -39,13 +219,103 @@ def static(base, mapping=None, far=('js', 'css', 'gif', 'jpg', 'jpeg', 'png', 't
 	
 	By default the "usual culprits" are served with far-futures cache expiry headers. If you wish to change the
 	extensions searched just assign a new `far` iterable.  To disable, assign any falsy value.
+	
+	Precompressed variants of files are served to clients accepting their content coding, in the order of preference
+	given by `encodings`. Variants are located alongside the original file, named with an additional `.zst` or `.gz`
+	suffix, or within the `cache` directory, if given, which is populated with variants of all compressible files on
+	construction (see `precompress`). Variants older than the original file are ignored. To disable, assign a falsy
+	value to `encodings`.
+	
+	If `index` is enabled, the files present, along with their metadata and precompressed variants, are recorded on
+	construction (see `Index`) and requests are resolved against this record without filesystem access until the file
+	is opened; files absent from the index are not found, even if present on disk. The index is available as the
+	`index` attribute of the endpoint, whose `refresh` method may be called to account for changes. Alternatively, give
+	a number of seconds to `poll` to refresh it automatically, no more frequently than that.
+	
+		class Root:
+			public = static('/path/to/public', index=True)
+		
+		Root.public.index.refresh()
+	
+	If a `memory` budget is given, in bytes, the content of files no larger than `small` bytes is retained in memory,
+	discarding the least recently used once the budget is exhausted. Retained files are delivered without being
+	opened, conditional requests being answered before any file access. They are read again once modified, as
+	determined by a single `stat` per request, or if indexed, by the index. The retained files are available as the
+	`resident` attribute of the endpoint.
 	"""
 	
 	base = abspath(base)
 	
-	@staticmethod
+	if cache and encodings:
+		cache = abspath(cache)
+		precompress(base, cache, encodings)
+	
+	index = Index(base, cache if encodings else None, encodings or (), poll) if index else None
+	resident = LRUCache(memory, weight=lambda retained: len(retained.body)) if memory else None
+	
+	def variants(path):
+		"""Identify the current precompressed variants of a file, by content coding."""
+		
+		found = {}
+		modified = getmtime(path)
+		
+		for encoding in encodings:
+			suffix = SUFFIXES.get(encoding)
+			
+			if not suffix:
+				continue
+			
+			for candidate in ((pathjoin(cache, relpath(path, base)) + suffix) if cache else None, path + suffix):
+				if candidate and isfile(candidate) and getmtime(candidate) >= modified:
+					found[encoding] = candidate
+					break
+		
+		return found
+	
+	def deliver(context, path, entry):
+		"""Deliver a small file from memory, reading it if not retained or modified, otherwise open the file."""
+		
+		if entry is not None and entry.size > small:
+			return open(path, 'rb')
+		
+		content_type, coding = guess_type(path)
+		etag = file_etag(os.stat(path), coding) if entry is None else entry.etag
+		retained = resident.get(path)
+		
+		if retained is None or retained.etag != etag:
+			fh = open(path, 'rb')
+			stat = os.fstat(fh.fileno())  # The content read must match the entity tag recorded.
+			
+			if stat.st_size > small:
+				return fh
+			
+			with fh:
+				retained = resident[path] = Resident(file_etag(stat, coding), fh.read(),
+						content_type or 'application/octet-stream', coding,
+						datetime.fromtimestamp(mktime(gmtime(stat.st_mtime))))
+		
+		response = context.response
+		response.conditional_response = True
+		response.last_modified = retained.modified
+		response.content_type, response.content_encoding = retained.content_type, retained.encoding
+		response.etag = retained.etag
+		response.accept_ranges = 'bytes'
+		response.body = retained.body
+		
+		return response
+	
 	def static_handler(context, *parts, **kw):
-		path = normpath(pathjoin(base, *parts))
+		if index is not None:  # Resolve without touching the filesystem; paths escaping the base are never indexed.
+			entry = index.get(parts)
+			
+			if entry is None:
+				raise HTTPNotFound()
+			
+			path = entry.path
+		
+		else:
+			entry = None
+			path = normpath(pathjoin(base, *parts))
 		
 		if __debug__:
 			log.debug("Attempting to serve static file.", extra=dict(
@@ -54,14 +324,15 @@ def static(base, mapping=None, far=('js', 'css', 'gif', 'jpg', 'jpeg', 'png', 't
 					path = path
 				))
 		
-		if not path.startswith(base):  # Ensure we only serve files from the allowed path.
-			raise HTTPForbidden("Cowardly refusing to violate base path policy." if __debug__ else None)
-		
-		if not exists(path):  # Do the right thing if the file doesn't actually exist.
-			raise HTTPNotFound()
-		
-		if not isfile(path):  # Only serve normal files; no UNIX domain sockets, FIFOs, etc., etc.
-			raise HTTPForbidden("Cowardly refusing to open a non-file." if __debug__ else None)
+		if index is None:
+			if not path.startswith(base):  # Ensure we only serve files from the allowed path.
+				raise HTTPForbidden("Cowardly refusing to violate base path policy." if __debug__ else None)
+			
+			if not exists(path):  # Do the right thing if the file doesn't actually exist.
+				raise HTTPNotFound()
+			
+			if not isfile(path):  # Only serve normal files; no UNIX domain sockets, FIFOs, etc., etc.
+				raise HTTPForbidden("Cowardly refusing to open a non-file." if __debug__ else None)
 		
 		if far and path.rpartition('.')[2] in far:
 			context.response.cache_expires = 60*60*24*365
@@ -71,6 +342,33 @@ def static(base, mapping=None, far=('js', 'css', 'gif', 'jpg', 'jpeg', 'png', 't
 			if extension in mapping:
 				return mapping[extension] + ':' + path, dict()
 		
+		if index is not None:
+			found = entry.variants
+		else:
+			found = variants(path) if encodings else None
+		
+		if found:  # The representation varies by the encodings the client accepts.
+			response = context.response
+			vary = response.vary or ()
+			
+			if 'Accept-Encoding' not in vary:
+				response.vary = tuple(vary) + ('Accept-Encoding', )
+			
+			encoding = negotiate(context.environ.get('HTTP_ACCEPT_ENCODING', ''), [i for i in encodings if i in found])
+			
+			if encoding:  # The content type and coding are determined from the filename by the file view.
+				if index is None:
+					path = found[encoding]
+				else:
+					entry = found[encoding]
+					path = entry.path
+		
+		if resident is not None:
+			return deliver(context, path, entry)
+		
 		return open(path, 'rb')
 	
-	return static_handler
+	static_handler.index = index
+	static_handler.resident = resident
+	
+	return staticmethod(static_handler)
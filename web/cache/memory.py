@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+"""In-process cache storage.
+
+This is the reference implementation of the cache storage interface shared by all `web.cache` backends:
+
+* `get(key)` returning the value recorded for the given string key, or `None` if absent, expired, or invalidated.
+* `set(key, value, ttl, tags=(), size=0)` recording a value for `ttl` seconds, optionally tagged, with a hint as to
+  its size in bytes. Values may be any picklable object.
+* `invalidate(*tags)` discarding all values recorded with any of the given tags.
+* `clear()` discarding all values.
+
+Backends are registered within the `web.cache` entry point namespace and may be referenced by name.
+"""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+from threading import Lock
+from time import time
+
+from web.core.util import LRUCache
+
+
+# ## Cache Storage
+
+class MemoryCache(object):
+	"""An in-process store of cached values, evicting the least recently used once beyond a `capacity` in bytes.
+	
+	Values expire after a time-to-live given in seconds, and may be tagged; invalidating a tag discards all values
+	recorded with that tag. Tags are versioned rather than indexed, so invalidation is constant-time and values are
+	discarded lazily, as they are next retrieved or as they are evicted.
+	"""
+	
+	__slots__ = ('entries', 'tags', 'lock')
+	
+	def __init__(self, capacity=64 * 1024 * 1024):
+		self.entries = LRUCache(capacity, weight=self._weight)
+		self.tags = {}  # Tag versions, incremented on invalidation.
+		self.lock = Lock()
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({1!r})".format(self, self.entries)
+	
+	@staticmethod
+	def _weight(record):
+		return record[3]
+	
+	def get(self, key):
+		"""Retrieve a value, or `None` if not present, expired, or invalidated."""
+		
+		record = self.entries.get(key)
+		
+		if record is None:
+			return None
+		
+		expires, value, versions, size = record
+		tags = self.tags
+		
+		if expires < time() or any(tags.get(tag, 0) != version for tag, version in versions):
+			try:
+				del self.entries[key]
+			except KeyError:  # Another thread beat us to it.
+				pass
+			
+			return None
+		
+		return value
+	
+	def set(self, key, value, ttl, tags=(), size=0):
+		"""Record a value for the given number of seconds, with optional tags, and approximate size in bytes."""
+		
+		versions = tuple((tag, self.tags.get(tag, 0)) for tag in tags)
+		self.entries[key] = (time() + ttl, value, versions, size + len(key) + 128)  # Approximate record overhead.
+	
+	def invalidate(self, *tags):
+		"""Discard all values recorded with any of the given tags."""
+		
+		with self.lock:
+			for tag in tags:
+				self.tags[tag] = self.tags.get(tag, 0) + 1
+	
+	def clear(self):
+		"""Discard all values."""
+		
+		self.entries.clear()
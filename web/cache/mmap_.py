@@ -0,0 +1,224 @@
+# encoding: utf-8
+
+"""Cache storage within a memory-mapped file, shared between processes on the same host.
+
+Implements the cache storage interface described by `web.cache.memory`.
+"""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import os
+
+from contextlib import contextmanager
+from hashlib import blake2b
+from mmap import mmap
+from pickle import HIGHEST_PROTOCOL, dumps, loads
+from struct import Struct
+from threading import Lock
+from time import time
+from zlib import crc32
+
+try:
+	from fcntl import lockf, LOCK_EX, LOCK_SH, LOCK_UN
+except ImportError:  # pragma: no cover
+	lockf = None  # Memory-mapped caching is unavailable on platforms lacking POSIX advisory locks.
+
+
+# ## Cache Storage
+
+class MappedCache(object):
+	"""A cache stored within a memory-mapped file, shared between any number of processes.
+	
+	The file contains a hash table indexing a circular log of records. New records are appended to the log, overwriting
+	the oldest once `capacity` bytes have been written; eviction is first-in, first-out rather than least recently
+	used, in exchange for never needing to allocate or compact. Keys are located by probing a small run of hash table
+	`slots`, the oldest record of the run being displaced if all are occupied. Records larger than a quarter of the
+	capacity are not stored.
+	
+		cache = MappedCache('/run/myapp/cache', capacity=256 * 1024 * 1024)
+	
+	Tag versions are held in a fixed table of `tags` counters, indexed by checksum. Distinct tags sharing a counter
+	invalidate each other's values; never the reverse.
+	
+	All processes sharing a file must agree on its capacity and table sizes. Access is serialized by a POSIX advisory
+	lock on the file, shared by readers, so this requires a POSIX platform.
+	"""
+	
+	__slots__ = ('path', 'capacity', 'slots', 'tags', 'fd', 'map', 'lock', 'index', 'data')
+	
+	HEADER = Struct('<8sIIQQ')  # Magic number, slot count, tag count, capacity, and position of the next write.
+	MAGIC = b'WCCACHE1'
+	COUNTER = Struct('<Q')  # Tag version.
+	SLOT = Struct('<QQId')  # Key hash, position of the record within the log, record length, and expiry time.
+	KEY = Struct('<HH')  # Record prefix: the lengths of the key and the list of tag versions which follow it.
+	VERSION = Struct('<IQ')  # Tag counter index and version.
+	PROBE = 8  # The number of hash table slots examined to locate a key.
+	
+	def __init__(self, path, capacity=64 * 1024 * 1024, slots=None, tags=4096):
+		if lockf is None:  # pragma: no cover
+			raise NotImplementedError("Memory-mapped caching requires a platform with POSIX advisory locking.")
+		
+		self.path = path
+		self.capacity = capacity
+		self.slots = slots = slots or max(capacity // 1024, self.PROBE)
+		self.tags = tags
+		self.lock = Lock()
+		
+		self.index = self.HEADER.size + tags * self.COUNTER.size
+		self.data = self.index + slots * self.SLOT.size
+		
+		length = self.data + capacity
+		header = self.HEADER.pack(self.MAGIC, slots, tags, capacity, 0)
+		
+		self.fd = fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+		
+		with self._locked():
+			if not os.fstat(fd).st_size:  # We are the first to use this file; initialize it.
+				os.ftruncate(fd, length)
+				os.pwrite(fd, header, 0)
+			
+			compatible = os.pread(fd, self.HEADER.size - 8, 0) == header[:-8] and os.fstat(fd).st_size == length
+		
+		if not compatible:
+			os.close(fd)
+			raise ValueError("Incompatible cache file: " + path)
+		
+		self.map = mmap(fd, length)
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({0.path!r})".format(self)
+	
+	def close(self):
+		self.map.close()
+		os.close(self.fd)
+	
+	def get(self, key):
+		"""Retrieve a value, or `None` if not present, expired, or invalidated."""
+		
+		key = key.encode('utf-8')
+		hashed = self._hash(key)
+		now = time()
+		
+		with self._locked(LOCK_SH):
+			head = self._head
+			
+			for offset in self._probe(hashed):
+				found, position, length, expires = self.SLOT.unpack_from(self.map, offset)
+				
+				if found != hashed or expires < now or head > position + self.capacity:
+					continue
+				
+				start = self.data + position % self.capacity
+				record = self.map[start:start + length]
+				size, count = self.KEY.unpack_from(record)
+				start = self.KEY.size + size
+				
+				if record[self.KEY.size:start] != key:  # A collision.
+					continue
+				
+				for i in range(count):
+					tag, version = self.VERSION.unpack_from(record, start + i * self.VERSION.size)
+					
+					if self._counter(tag) != version:
+						return None
+				
+				break
+			
+			else:
+				return None
+		
+		return loads(record[start + count * self.VERSION.size:])
+	
+	def set(self, key, value, ttl, tags=(), size=0):
+		"""Record a value for the given number of seconds, with optional tags.
+		
+		The size hint is unused; the size of the stored representation is known exactly.
+		"""
+		
+		key = key.encode('utf-8')
+		hashed = self._hash(key)
+		value = dumps(value, HIGHEST_PROTOCOL)
+		tags = [crc32(tag.encode('utf-8')) % self.tags for tag in tags]
+		length = self.KEY.size + len(key) + len(tags) * self.VERSION.size + len(value)
+		
+		if length > self.capacity // 4:
+			return
+		
+		with self._locked():
+			versions = b''.join(self.VERSION.pack(tag, self._counter(tag)) for tag in tags)
+			record = self.KEY.pack(len(key), len(tags)) + key + versions + value
+			
+			# Append the record to the log, wrapping to the start if it would not fit before the end.
+			head = position = self._head
+			
+			if position % self.capacity + length > self.capacity:
+				position += self.capacity - position % self.capacity
+			
+			start = self.data + position % self.capacity
+			self.map[start:start + length] = record
+			self.HEADER.pack_into(self.map, 0, self.MAGIC, self.slots, self.tags, self.capacity, position + length)
+			
+			# Claim a slot: that of the same key, else a vacant slot, else the slot of the oldest record.
+			now = time()
+			chosen = oldest = None
+			
+			for offset in self._probe(hashed):
+				found, existing, size, expires = self.SLOT.unpack_from(self.map, offset)
+				
+				if found == hashed or not found or expires < now or head > existing + self.capacity:
+					chosen = offset
+					break
+				
+				if oldest is None or existing < oldest[1]:
+					oldest = offset, existing
+			
+			self.SLOT.pack_into(self.map, oldest[0] if chosen is None else chosen, hashed, position, length, now + ttl)
+	
+	def invalidate(self, *tags):
+		"""Discard all values recorded with any of the given tags."""
+		
+		with self._locked():
+			for tag in tags:
+				tag = crc32(tag.encode('utf-8')) % self.tags
+				self.COUNTER.pack_into(self.map, self._offset(tag), self._counter(tag) + 1)
+	
+	def clear(self):
+		"""Discard all values."""
+		
+		with self._locked():
+			self.map[self.index:self.data] = bytes(self.data - self.index)
+	
+	# ### Table Management
+	
+	@property
+	def _head(self):
+		"""The position within the log of the next write, counting from the creation of the file."""
+		return self.HEADER.unpack_from(self.map)[-1]
+	
+	@staticmethod
+	def _hash(key):
+		return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little') or 1  # Zero identifies a vacant slot.
+	
+	def _probe(self, hashed):
+		"""Generate the offsets of the hash table slots which may hold the given key hash."""
+		
+		for i in range(self.PROBE):
+			yield self.index + (hashed + i) % self.slots * self.SLOT.size
+	
+	def _offset(self, tag):
+		return self.HEADER.size + tag * self.COUNTER.size
+	
+	def _counter(self, tag):
+		return self.COUNTER.unpack_from(self.map, self._offset(tag))[0]
+	
+	@contextmanager
+	def _locked(self, mode=None):
+		with self.lock:  # Advisory locks are held per-process, so threads within this one must exclude each other.
+			lockf(self.fd, mode or LOCK_EX, self.HEADER.size, 0)
+			
+			try:
+				yield
+			finally:
+				lockf(self.fd, LOCK_UN, self.HEADER.size, 0)
@@ -0,0 +1,174 @@
+# encoding: utf-8
+
+"""Cache storage within a local SQLite database, shared between processes.
+
+Implements the cache storage interface described by `web.cache.memory`.
+"""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import os
+import sqlite3
+
+from contextlib import contextmanager
+from json import dumps, loads
+from pickle import HIGHEST_PROTOCOL, dumps as pickle, loads as unpickle
+from threading import local
+from time import time
+
+
+# ## Cache Storage
+
+class SQLiteCache(object):
+	"""A cache stored within a SQLite database operating in write-ahead logging mode.
+	
+	Any number of processes on the same host, such as the workers of a pre-forking server, may share the database;
+	readers do not block writers, or each other. Once the values stored exceed a `capacity` in bytes the least recently
+	used are evicted. Recency is tracked to within `resolution` seconds to avoid a write on every retrieval.
+	
+		cache = SQLiteCache('/run/myapp/cache.sqlite')
+	
+	Each thread of each process uses its own connection, established on first use.
+	"""
+	
+	__slots__ = ('path', 'capacity', 'resolution', 'timeout', 'local')
+	
+	SCHEMA = (
+			"PRAGMA journal_mode = WAL",
+			"CREATE TABLE IF NOT EXISTS entry (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, "
+					"versions TEXT NOT NULL, size INTEGER NOT NULL, used REAL NOT NULL)",
+			"CREATE INDEX IF NOT EXISTS entry_used ON entry (used)",
+			"CREATE TABLE IF NOT EXISTS tag (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)",
+			
+			# The total size of all entries is maintained by triggers, to avoid scanning the table on each write.
+			"CREATE TABLE IF NOT EXISTS total (id INTEGER PRIMARY KEY CHECK (id = 0), size INTEGER NOT NULL)",
+			"INSERT OR IGNORE INTO total VALUES (0, 0)",
+			"CREATE TRIGGER IF NOT EXISTS entry_insert AFTER INSERT ON entry BEGIN "
+					"UPDATE total SET size = size + new.size; END",
+			"CREATE TRIGGER IF NOT EXISTS entry_update AFTER UPDATE OF size ON entry BEGIN "
+					"UPDATE total SET size = size - old.size + new.size; END",
+			"CREATE TRIGGER IF NOT EXISTS entry_delete AFTER DELETE ON entry BEGIN "
+					"UPDATE total SET size = size - old.size; END",
+		)
+	
+	def __init__(self, path, capacity=256 * 1024 * 1024, resolution=1, timeout=5):
+		self.path = path
+		self.capacity = capacity
+		self.resolution = resolution
+		self.timeout = timeout
+		self.local = local()
+		
+		connection = self._connect()
+		
+		try:
+			for statement in self.SCHEMA:
+				connection.execute(statement)
+		finally:
+			connection.close()  # Connections must not be inherited by forked processes.
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({0.path!r})".format(self)
+	
+	def get(self, key):
+		"""Retrieve a value, or `None` if not present, expired, or invalidated."""
+		
+		db = self._db
+		row = db.execute("SELECT value, expires, versions, used FROM entry WHERE key = ?", (key, )).fetchone()
+		
+		if row is None:
+			return None
+		
+		value, expires, versions, used = row
+		versions = loads(versions)
+		now = time()
+		
+		if expires < now or self._versions(db, versions) != versions:
+			db.execute("DELETE FROM entry WHERE key = ?", (key, ))
+			return None
+		
+		if now - used > self.resolution:
+			db.execute("UPDATE entry SET used = ? WHERE key = ?", (now, key))
+		
+		return unpickle(value)
+	
+	def set(self, key, value, ttl, tags=(), size=0):
+		"""Record a value for the given number of seconds, with optional tags.
+		
+		The size hint is unused; the size of the stored representation is known exactly.
+		"""
+		
+		value = pickle(value, HIGHEST_PROTOCOL)
+		size = len(value) + len(key)
+		
+		if size > self.capacity:
+			return
+		
+		with self._transaction() as db:
+			now = time()
+			versions = dumps(self._versions(db, [[tag, 0] for tag in tags]))
+			
+			db.execute("INSERT INTO entry VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+					"value = excluded.value, expires = excluded.expires, versions = excluded.versions, "
+					"size = excluded.size, used = excluded.used", (key, value, now + ttl, versions, size, now))
+			
+			while db.execute("SELECT size FROM total").fetchone()[0] > self.capacity:
+				db.execute("DELETE FROM entry WHERE key = "
+						"(SELECT key FROM entry WHERE key != ? ORDER BY used LIMIT 1)", (key, ))
+	
+	def invalidate(self, *tags):
+		"""Discard all values recorded with any of the given tags."""
+		
+		with self._transaction() as db:
+			db.executemany("INSERT INTO tag VALUES (?, 1) ON CONFLICT (tag) DO UPDATE SET version = version + 1",
+					[(tag, ) for tag in tags])
+	
+	def clear(self):
+		"""Discard all values."""
+		
+		with self._transaction() as db:
+			db.execute("DELETE FROM entry")
+	
+	# ### Connection Management
+	
+	def _connect(self):
+		connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+		connection.execute("PRAGMA synchronous = NORMAL")  # Durable enough for a cache, under write-ahead logging.
+		return connection
+	
+	@property
+	def _db(self):
+		"""The connection for the current thread, established on first use within each thread of each process."""
+		
+		local = self.local
+		
+		if getattr(local, 'pid', None) != os.getpid():
+			local.connection, local.pid = self._connect(), os.getpid()
+		
+		return local.connection
+	
+	@contextmanager
+	def _transaction(self):
+		db = self._db
+		db.execute("BEGIN IMMEDIATE")
+		
+		try:
+			yield db
+		except:
+			db.execute("ROLLBACK")
+			raise
+		
+		db.execute("COMMIT")
+	
+	@staticmethod
+	def _versions(db, versions):
+		"""Populate the current version of each tag within a list of `[tag, version]` pairs."""
+		
+		if not versions:
+			return versions
+		
+		current = dict(db.execute("SELECT tag, version FROM tag WHERE tag IN ({})".format(
+				', '.join('?' * len(versions))), [tag for tag, version in versions]).fetchall())
+		
+		return [[tag, current.get(tag, 0)] for tag, version in versions]
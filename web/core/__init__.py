@@ -2,12 +2,10 @@
 
 # ## Imports
 
-from threading import local as __local
-
 # Expose these as importable from the top-level `web.core` namespace.
 
 from .application import Application
-from .util import lazy
+from .util import lazy, ContextLocal as __local
 
 
 # ## Module Globals
@@ -8,15 +8,23 @@ from __future__ import unicode_literals
 
 import logging
 import logging.config
+import signal
 
-from inspect import isfunction
+from asyncio import get_running_loop
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from functools import partial
+from inspect import isawaitable, iscoroutinefunction, isfunction
+from threading import current_thread, main_thread
+from webob import Response
 from webob.exc import HTTPException, HTTPNotFound, HTTPInternalServerError
 from marrow.package.loader import load
 
+from . import asgi
 from .context import Context
 from .dispatch import WebDispatchers
 from .extension import WebExtensions
-from .util import addLoggingLevel
+from .util import InFlight, addLoggingLevel
 from .view import WebViews
 from ..ext.base import BaseExtension
 from ..ext import args as arguments
@@ -30,6 +38,177 @@ if __debug__:
 # A standard Python logger object.
 log = __import__('logging').getLogger(__name__)
 
+# The default content type header of a WebOb `Response`, used when responding without constructing one.
+RAW_CONTENT_TYPE = ('Content-Type', Response.default_content_type + '; charset=' + Response.default_charset)
+
+
+# ## Callback Compilation
+
+def _chain(callbacks):
+	"""Collapse a sequence of extension callbacks into a single callable, or `None` if there is nothing to call."""
+	
+	if not callbacks:
+		return None
+	
+	if len(callbacks) == 1:
+		return callbacks[0]
+	
+	def chain(*args):
+		for callback in callbacks: callback(*args)
+	
+	return chain
+
+
+def _fold(callbacks):
+	"""As per `_chain`, but passing the value returned by each callback as the final argument to the next."""
+	
+	if not callbacks:
+		return None
+	
+	if len(callbacks) == 1:
+		return callbacks[0]
+	
+	def fold(context, handler, result):
+		for callback in callbacks: result = callback(context, handler, result)
+		return result
+	
+	return fold
+
+
+def _achain(callbacks):
+	"""As per `_chain`, producing a coroutine function which awaits any awaitable values callbacks return."""
+	
+	if not callbacks:
+		return None
+	
+	async def chain(*args):
+		for callback in callbacks:
+			result = callback(*args)
+			if isawaitable(result): await result
+	
+	return chain
+
+
+def _afold(callbacks):
+	"""As per `_fold`, producing a coroutine function which awaits any awaitable values callbacks return."""
+	
+	if not callbacks:
+		return None
+	
+	async def fold(context, handler, result):
+		for callback in callbacks:
+			result = callback(context, handler, result)
+			if isawaitable(result): result = await result
+		
+		return result
+	
+	return fold
+
+
+def _render(context, result):
+	"""Identify a view capable of handling the given result and apply it to the response."""
+	
+	if __debug__:
+		log.debug("Result prepared, identifying view handler.", extra=dict(
+				request = id(context),
+				result = safe_name(type(result))
+			))
+	
+	for view in context.view(result):
+		if view(context, result): break
+	else:
+		# We've run off the bottom of the list of possible views.
+		raise TypeError("No view could be found to handle: " + repr(type(result)))
+	
+	if __debug__:
+		log.debug("View identified, populating response.", extra=dict(
+				request = id(context),
+				view = repr(view),
+			))
+
+
+def _respond(context, environ, start_response):
+	"""Begin the WSGI response for the given request context, returning the body iterable.
+	
+	Where a view has deferred a raw body (see `BaseExtension.render_binary`) and nothing else has required the
+	construction of a WebOb `Response` the body is delivered directly, with default headers. As no validators are
+	present on such a response, only range requests would be treated differently by the response; these, and all other
+	responses, are delivered through `Response.conditional_response_app`.
+	"""
+	
+	body = context.__dict__.get('_body')
+	
+	if body is None or 'response' in context.__dict__ or 'HTTP_RANGE' in environ:
+		return context.response.conditional_response_app(environ, start_response)
+	
+	start_response('200 OK', [RAW_CONTENT_TYPE, ('Content-Length', str(len(body)))])
+	
+	if environ['REQUEST_METHOD'] == 'HEAD':
+		return ()
+	
+	return (body, )
+
+
+class _Completion(object):
+	"""A WSGI response body notifying `done` callbacks once exhausted or closed, whichever happens first.
+	
+	Closing the body (as the server must, even should the client disconnect) also closes the wrapped body.
+	"""
+	
+	__slots__ = ('context', 'body', 'done')
+	
+	def __init__(self, context, body, done):
+		self.context = context
+		self.body = body
+		self.done = done
+	
+	def __iter__(self):
+		for chunk in self.body:
+			yield chunk
+		
+		self.close()
+	
+	def close(self):
+		done, self.done = self.done, None
+		
+		if done is None:  # Already notified.
+			return
+		
+		try:
+			if hasattr(self.body, 'close'):
+				self.body.close()
+		finally:
+			done(self.context)
+
+
+def _completing(context, body, done):
+	"""Arrange for `done` notification when the server closes a body it must receive unwrapped.
+	
+	Used for bodies produced by the server's `wsgi.file_wrapper`, which would otherwise be delivered by iteration.
+	"""
+	
+	close = body.close
+	
+	def completed():
+		try:
+			close()
+		finally:
+			done(context)
+	
+	body.close = completed
+	
+	return body
+
+
+def _interrupt(signum, frame):
+	"""Translate termination requests into the exception most servers expect to end service."""
+	raise KeyboardInterrupt()
+
+
+def _asynchronous(endpoint):
+	"""Determine if the given endpoint, or the `__call__` method of a callable instance, is a coroutine function."""
+	return iscoroutinefunction(endpoint) or iscoroutinefunction(getattr(endpoint, '__call__', None))
+
 
 # ## WSGI Application
 
@@ -43,6 +222,7 @@ class Application(object):
 	* Collection and execution of `web.extension` callbacks.
 	* WSGI middleware wrapping.
 	* The final WSGI application handling requests.
+	* An equivalent ASGI 3 application, as the `asgi` attribute, for use with asynchronous servers.
 	
 	The application object is treated as an extension allowing per-application customization utilizing extension
 	callbacks (such as rendering custom views on startup) through subclassing.
@@ -54,6 +234,9 @@ class Application(object):
 			
 			'__context',  # Application context instance.
 			'RequestContext',  # Per-request context class.
+			'application',  # Compiled WSGI request handler.  Dynamically assigned.
+			'asgi',  # Compiled ASGI 3 request handler.  Dynamically assigned.
+			'inflight',  # Tracking of requests in progress, if draining on shutdown.
 			'__call__',  # WSGI request handler.  Dynamically assigned.
 		)
 	
@@ -64,7 +247,7 @@ class Application(object):
 		
 		No actions other than configuration should happen during construction.
 		
-		Current configuration is limited to three arguments:
+		Current configuration includes:
 		
 		* `root` -- the object to use as the starting point of dispatch on each request
 		* `logging` -- either `None` to indicate WebCore should not manipulate the logging configuration (the
@@ -72,6 +255,12 @@ class Application(object):
 			dictionary configuration to pass to the Python standard `logging.dictConfig()` process.
 		* `extensions` -- a list of configured extension instances, ignoring `BaseExtension` which is automatically
 			added to the extension set.
+		* `dispatch_cache` -- the number of resolved endpoint paths to cache, if any; see `WebDispatchers`.
+		* `threads` -- when served via ASGI, the maximum number of worker threads used to execute synchronous
+			endpoints, defaulting to the `concurrent.futures.ThreadPoolExecutor` default for the host.
+		* `drain` -- if given, requests in progress (including the delivery of streaming bodies) are tracked, and on
+			shutdown up to this number of seconds are spent waiting for them to complete prior to executing `stop`
+			extension callbacks; see `drain()`.
 		"""
 		
 		self.config = self._configure(config)  # Prepare the configuration.
@@ -87,7 +276,7 @@ class Application(object):
 		
 		# These can't really be deferred to extensions themselves, for fairly obvious chicken/egg reasons.
 		exts = context.extension = WebExtensions(context)  # Load extension registry and prepare callbacks.
-		context.dispatch = WebDispatchers(context)  # Load dispatch registry.
+		context.dispatch = WebDispatchers(context, self.config.get('dispatch_cache'))  # Load dispatch registry.
 		context.view = WebViews(context)  # Load the view registry.
 		
 		# Execute extension startup callbacks; this is the appropriate time to attach descriptors to the context.
@@ -97,8 +286,15 @@ class Application(object):
 		# `ApplicationContext` instance to a `RequestContext` class for use during the request/response cycle.
 		self.RequestContext = context._promote('RequestContext', instantiate=False)
 		
-		# Handle WSGI middleware wrapping by extensions and point our __call__ at the result.
-		app = self.application
+		# Requests in progress are only tracked, at some small cost, if we are to wait for them on shutdown.
+		self.inflight = InFlight() if self.config.get('drain') else None
+		
+		# Specialize the request handler to the final set of extension callbacks.
+		app = self.application = self._compile(exts.signal)
+		self.asgi = self._compile_asgi(exts.signal)
+		
+		# Handle WSGI middleware wrapping by extensions and point our __call__ at the result. Middleware can not wrap
+		# the ASGI interface.
 		for ext in exts.signal.middleware: app = ext(context, app)
 		self.__call__ = app
 		
@@ -161,120 +357,333 @@ class Application(object):
 		
 		service = load(service, 'web.server')  # We don't bother with a full registry for these one-time lookups.
 		
+		# Reload upon `SIGHUP` and exit upon `SIGTERM`, where supported. Services managing their own processes may
+		# replace these handlers.
+		handlers = {}
+		
+		if current_thread() is main_thread():
+			if hasattr(signal, 'SIGHUP'):
+				handlers[signal.SIGHUP] = signal.signal(signal.SIGHUP, lambda signum, frame: self.reload())
+			
+			handlers[signal.SIGTERM] = signal.signal(signal.SIGTERM, _interrupt)
+		
 		try:
 			service(self, **options)
 		except KeyboardInterrupt:  # We catch this as SIG_TERM or ^C are basically the only ways to stop most servers.
 			pass
+		finally:
+			for signum, handler in handlers.items(): signal.signal(signum, handler)
+		
+		# No longer accepting requests, permit those in progress to complete.
+		if not self.drain():
+			log.warning("Shutdown deadline exceeded with requests in progress.", extra=dict(inflight=len(self.inflight)))
 		
 		# Notify extensions that the service has returned and we are exiting.
 		for ext in self.__context.extension.signal.stop: ext(self.__context)
 	
-	def _execute_endpoint(self, context, endpoint, signals):
-		if not callable(endpoint):
-			# Endpoints don't have to be functions.
-			# They can instead point to what a function would return for view lookup.
-			
-			if __debug__:
-				log.debug("Static endpoint located.", extra=dict(
-						request = id(context),
-						endpoint = repr(endpoint),
-					))
-			
-			# Use the result directly, as if it were the result of calling a function or method.
-			return endpoint
+	def drain(self, timeout=None):
+		"""Wait for requests in progress to complete, returning `True` if they did so within the timeout.
 		
-		# Populate any endpoint arguments and allow for chained mutation and validation.
-		args, kwargs = [], {}
+		The timeout defaults to the `drain` configuration option. If that option was not given requests are not
+		tracked and this returns immediately.
+		"""
 		
-		try:
-			for ext in signals.mutate: ext(context, endpoint, args, kwargs)
+		if self.inflight is None:
+			return True
 		
-		except HTTPException as e:
-			result = e
+		if __debug__:
+			log.debug("Draining requests in progress.", extra=dict(inflight=len(self.inflight)))
 		
-		else:
-			# If successful in accumulating arguments, finally call the endpoint.
+		return self.inflight.wait(self.config['drain'] if timeout is None else timeout)
+	
+	def reload(self, **config):
+		"""Instruct extensions to reload their configuration, re-opening any files, pools, or connections they manage.
+		
+		This executes the `graceful` extension callbacks, passing along any configuration given. It is invoked upon
+		receipt of `SIGHUP` while served via `serve()`. As requests may be in progress within other threads, callbacks
+		should replace shared resources atomically.
+		"""
+		
+		if __debug__:
+			log.debug("Reloading WebCore application.", extra=dict(config=config))
+		
+		context = self.__context
+		
+		for ext in context.extension.signal.graceful: ext(context, **config)
+	
+	def _compile(self, signals):
+		"""Construct the WSGI request handler specialized to the final set of extension callbacks.
+		
+		This is performed once, during construction, to avoid paying for unused extension points on every request.
+		Phases with no registered callbacks are elided entirely, phases with a single callback invoke it directly, and
+		the response body is only wrapped to issue `done` notifications if there is anything listening for them.
+		
+		Should a `prepare` or `before` callback raise an `HTTPException` it is treated as the result of the request;
+		dispatch and endpoint execution are skipped, though views and the `after` and `done` callbacks still apply.
+		"""
+		
+		pre, done = signals.pre, signals.done
+		
+		if self.inflight is not None:  # Requests are in progress from the start of preparation through completion.
+			pre, done = (self.inflight.enter, ) + pre, done + (self.inflight.leave, )
+		
+		pre = _chain(pre)
+		mutate = _chain(signals.mutate)
+		transform = _fold(signals.transform)
+		after = _chain(signals.after)
+		done = _chain(done)
+		
+		RequestContext = self.RequestContext
+		debugger = 'debugger' in self.__context.extension.feature
+		
+		def execute(context, endpoint):
+			if not callable(endpoint):
+				# Endpoints don't have to be functions.
+				# They can instead point to what a function would return for view lookup.
+				
+				if __debug__:
+					log.debug("Static endpoint located.", extra=dict(
+							request = id(context),
+							endpoint = repr(endpoint),
+						))
+				
+				# Use the result directly, as if it were the result of calling a function or method.
+				return endpoint
 			
-			if __debug__:
-				log.debug("Callable endpoint located and arguments prepared.", extra=dict(
-						request = id(context),
-						endpoint = safe_name(endpoint),
-						endpoint_args = args,
-						endpoint_kw = kwargs
-					))
+			# Populate any endpoint arguments and allow for chained mutation and validation.
+			args, kwargs = [], {}
 			
 			try:
-				result = endpoint(*args, **kwargs)
+				if mutate: mutate(context, endpoint, args, kwargs)
 			
 			except HTTPException as e:
 				result = e
+			
+			else:
+				# If successful in accumulating arguments, finally call the endpoint.
+				
+				if __debug__:
+					log.debug("Callable endpoint located and arguments prepared.", extra=dict(
+							request = id(context),
+							endpoint = safe_name(endpoint),
+							endpoint_args = args,
+							endpoint_kw = kwargs
+						))
+				
+				try:
+					result = endpoint(*args, **kwargs)
+				
+				except HTTPException as e:
+					result = e
+			
+			# Execute return value transformation callbacks.
+			if transform: result = transform(context, endpoint, result)
+			
+			return result
+		
+		def application(environ, start_response):
+			"""Process a single WSGI request/response cycle.
+			
+			This is the WSGI handler for WebCore.  Depending on the presence of extensions providing WSGI middleware,
+			the `__call__` attribute of the Application instance will either become this, or become the outermost
+			middleware callable.
+			
+			Most apps won't utilize middleware, the extension interface is preferred for most operations in WebCore.
+			They allow for code injection at various intermediary steps in the processing of a request and response.
+			"""
+			context = environ['wc.context'] = RequestContext(environ=environ)
+			
+			try:
+				# Announce the start of a request cycle. This executes `prepare` and `before` callbacks in order.
+				if pre: pre(context)
+			
+			except HTTPException as e:  # An extension has decided the outcome early, e.g. to refuse service.
+				result = e
+			
+			else:
+				# Identify the endpoint for this request.
+				is_endpoint, handler = context.dispatch(context, context.root, environ['PATH_INFO'])
+				
+				if is_endpoint:
+					try:
+						result = execute(context, handler)  # Process the endpoint.
+					except Exception as e:
+						log.exception("Caught exception attempting to execute the endpoint.")
+						result = HTTPInternalServerError(str(e) if __debug__ else "Please see the logs.")
+						
+						if debugger:
+							context.response = result
+							if after: after(context)  # Allow signals to clean up early.
+							raise
+				
+				else:  # If no endpoint could be resolved, that's a 404.
+					result = HTTPNotFound("Dispatch failed." if __debug__ else None)
+			
+			_render(context, result)
+			
+			if after: after(context)
+			
+			# This is really long due to the fact we don't want to capture the response too early.
+			# We need anything up to this point to be able to simply replace `context.response` if needed.
+			return _respond(context, environ, start_response)
 		
-		# Execute return value transformation callbacks.
-		for ext in signals.transform: result = ext(context, endpoint, result)
+		if not done:  # Nothing is interested in the completion of the response, so hand back the body directly.
+			return application
 		
-		return result
+		def completed(environ, start_response):
+			"""Issue `done` notifications once the response has been delivered, or should the request fail."""
+			
+			try:
+				body = application(environ, start_response)
+			
+			except BaseException:
+				if 'wc.context' in environ: done(environ['wc.context'])
+				raise
+			
+			context = environ['wc.context']
+			wrapper = environ.get('wsgi.file_wrapper')
+			
+			if isinstance(wrapper, type) and isinstance(body, wrapper):  # Servers only use `sendfile` on their own type.
+				try:
+					return _completing(context, body, done)
+				except AttributeError:  # The wrapper does not permit its close method to be replaced.
+					pass
+			
+			return _Completion(context, body, done)
+		
+		return completed
 	
-	def application(self, environ, start_response):
-		"""Process a single WSGI request/response cycle.
+	def _compile_asgi(self, signals):
+		"""Construct an ASGI 3 request handler specialized to the final set of extension callbacks.
 		
-		This is the WSGI handler for WebCore.  Depending on the presence of extensions providing WSGI middleware,
-		the `__call__` attribute of the Application instance will either become this, or become the outermost
-		middleware callable.
+		This drives the same extension callbacks, dispatch, and view lookup as the WSGI handler. Any extension callback
+		may be an `async def` coroutine function, as may endpoints. Synchronous endpoints are executed within a bounded
+		pool of worker threads so as to not block the event loop; see the `threads` configuration option. This pool is
+		constructed upon first use, and work executed within it does so within a copy of the request's `contextvars`
+		context, as used by `web.core.local`.
 		
-		Most apps won't utilize middleware, the extension interface is preferred for most operations in WebCore.
-		They allow for code injection at various intermediary steps in the processing of a request and response.
+		WSGI middleware is not applied, and the `lifespan` shutdown event is treated as the end of service, draining
+		requests in progress (see `drain()`) then executing `stop` callbacks.
 		"""
-		context = environ['wc.context'] = self.RequestContext(environ=environ)
-		signals = context.extension.signal
 		
-		# Announce the start of a request cycle. This executes `prepare` and `before` callbacks in the correct order.
-		for ext in signals.pre: ext(context)
+		pre, done = signals.pre, signals.done
 		
-		# Identify the endpoint for this request.
-		is_endpoint, handler = context.dispatch(context, context.root, context.environ['PATH_INFO'])
+		if self.inflight is not None:  # Requests are in progress from the start of preparation through completion.
+			pre, done = (self.inflight.enter, ) + pre, done + (self.inflight.leave, )
 		
-		if is_endpoint:
-			try:
-				result = self._execute_endpoint(context, handler, signals)  # Process the endpoint.
-			except Exception as e:
-				log.exception("Caught exception attempting to execute the endpoint.")
-				result = HTTPInternalServerError(str(e) if __debug__ else "Please see the logs.")
-				
-				if 'debugger' in context.extension.feature:
-					context.response = result
-					for ext in signals.after: ext(context)  # Allow signals to clean up early.
-					raise
+		pre = _achain(pre)
+		mutate = _achain(signals.mutate)
+		transform = _afold(signals.transform)
+		after = _achain(signals.after)
+		done = _achain(done)
+		stop = signals.stop
 		
-		else:  # If no endpoint could be resolved, that's a 404.
-			result = HTTPNotFound("Dispatch failed." if __debug__ else None)
+		RequestContext = self.RequestContext
+		ctx = self.__context
+		executor = None  # Applications served only via WSGI have no need of worker threads.
 		
-		if __debug__:
-			log.debug("Result prepared, identifying view handler.", extra=dict(
-					request = id(context),
-					result = safe_name(type(result))
-				))
-		
-		# Identify a view capable of handling this result.
-		for view in context.view(result):
-			if view(context, result): break
-		else:
-			# We've run off the bottom of the list of possible views.
-			raise TypeError("No view could be found to handle: " + repr(type(result)))
-		
-		if __debug__:
-			log.debug("View identified, populating response.", extra=dict(
-					request = id(context),
-					view = repr(view),
-				))
+		def pool():
+			nonlocal executor
+			
+			if executor is None:
+				executor = ThreadPoolExecutor(self.config.get('threads'), 'web.core')
+			
+			return executor
 		
-		for ext in signals.after: ext(context)
+		async def execute(context, endpoint):
+			if not callable(endpoint):  # Static endpoints are used directly, as per the WSGI handler.
+				return endpoint
+			
+			args, kwargs = [], {}
+			
+			try:
+				if mutate: await mutate(context, endpoint, args, kwargs)
+			
+			except HTTPException as e:
+				result = e
+			
+			else:
+				if __debug__:
+					log.debug("Callable endpoint located and arguments prepared.", extra=dict(
+							request = id(context),
+							endpoint = safe_name(endpoint),
+							endpoint_args = args,
+							endpoint_kw = kwargs
+						))
+				
+				try:
+					if _asynchronous(endpoint):
+						result = await endpoint(*args, **kwargs)
+					else:
+						result = await get_running_loop().run_in_executor(pool(), copy_context().run,
+								partial(endpoint, *args, **kwargs))
+				
+				except HTTPException as e:
+					result = e
+			
+			if transform: result = await transform(context, endpoint, result)
+			
+			return result
 		
-		def capture_done(response):
-			for chunk in response:
-				yield chunk
+		async def lifespan(receive, send):
+			while True:
+				message = await receive()
+				
+				if message['type'] == 'lifespan.startup':  # Extensions have already been started.
+					await send({'type': 'lifespan.startup.complete'})
+				
+				elif message['type'] == 'lifespan.shutdown':
+					if not await get_running_loop().run_in_executor(None, self.drain):
+						log.warning("Shutdown deadline exceeded with requests in progress.",
+								extra=dict(inflight=len(self.inflight)))
+					
+					for ext in stop: ext(ctx)
+					if executor is not None: executor.shutdown()
+					await send({'type': 'lifespan.shutdown.complete'})
+					return
+		
+		async def application(scope, receive, send):
+			"""Process a single ASGI 3 connection.
+			
+			Only `http` and `lifespan` connection scopes are supported.
+			"""
+			
+			if scope['type'] == 'lifespan':
+				return await lifespan(receive, send)
+			
+			if scope['type'] != 'http':
+				raise NotImplementedError("Unsupported ASGI connection type: " + scope['type'])
+			
+			environ = asgi.environ(scope, await asgi.read_body(receive))
+			context = environ['wc.context'] = RequestContext(environ=environ)
+			
+			try:
+				try:
+					if pre: await pre(context)
+				
+				except HTTPException as e:  # An extension has decided the outcome early, e.g. to refuse service.
+					result = e
+				
+				else:
+					is_endpoint, handler = context.dispatch(context, context.root, environ['PATH_INFO'])
+					
+					if is_endpoint:
+						try:
+							result = await execute(context, handler)
+						except Exception as e:
+							log.exception("Caught exception attempting to execute the endpoint.")
+							result = HTTPInternalServerError(str(e) if __debug__ else "Please see the logs.")
+					
+					else:
+						result = HTTPNotFound("Dispatch failed." if __debug__ else None)
+				
+				_render(context, result)
+				
+				if after: await after(context)
+				
+				await asgi.relay(send, partial(_respond, context), environ, pool())
 			
-			for ext in signals.done: ext(context)
+			finally:  # Even should the request fail, or the client have disconnected.
+				if done: await done(context)
 		
-		# This is really long due to the fact we don't want to capture the response too early.
-		# We need anything up to this point to be able to simply replace `context.response` if needed.
-		return capture_done(context.response.conditional_response_app(environ, start_response))
+		return application
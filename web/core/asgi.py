@@ -0,0 +1,150 @@
+# encoding: utf-8
+
+"""ASGI 3 protocol translation for WebCore applications.
+
+The WebCore request/response cycle is expressed in terms of a WSGI environment and WebOb objects; these utilities
+bridge the gap, translating an ASGI connection scope into an equivalent WSGI environment and relaying the result of a
+WSGI application (such as a WebOb `Response`) back as ASGI messages. The request processing itself lives with the
+rest of the pipeline on the `Application` class, see `Application._compile_asgi`.
+"""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import sys
+
+from asyncio import get_running_loop
+from contextvars import copy_context
+from io import BytesIO
+
+
+# ## Module Globals
+
+# A standard Python logger object.
+log = __import__('logging').getLogger(__name__)
+
+# Headers which are not prefixed with `HTTP_` within a WSGI environment.
+UNPREFIXED = {'CONTENT_TYPE', 'CONTENT_LENGTH'}
+
+
+# ## Request Translation
+
+async def read_body(receive):
+	"""Accumulate the complete request body from a series of `http.request` messages."""
+	
+	chunks = []
+	
+	while True:
+		message = await receive()
+		
+		if message['type'] == 'http.disconnect':
+			break
+		
+		chunks.append(message.get('body', b''))
+		
+		if not message.get('more_body', False):
+			break
+	
+	return b''.join(chunks)
+
+
+def environ(scope, body=b''):
+	"""Construct a WSGI environment equivalent to the given ASGI HTTP connection scope.
+	
+	The original scope remains available within the environment as `asgi.scope`.
+	"""
+	
+	script = scope.get('root_path', '')
+	path = scope['path']
+	
+	if script and path.startswith(script):
+		path = path[len(script):]
+	
+	server = scope.get('server') or ('localhost', 80)
+	client = scope.get('client') or ('', 0)
+	
+	result = {
+			'REQUEST_METHOD': scope['method'],
+			'SCRIPT_NAME': script.encode('utf8').decode('latin1'),
+			'PATH_INFO': path.encode('utf8').decode('latin1'),
+			'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+			'SERVER_NAME': server[0],
+			'SERVER_PORT': str(server[1]),
+			'SERVER_PROTOCOL': 'HTTP/' + scope.get('http_version', '1.1'),
+			'REMOTE_ADDR': client[0],
+			'REMOTE_PORT': str(client[1]),
+			'wsgi.version': (1, 0),
+			'wsgi.url_scheme': scope.get('scheme', 'http'),
+			'wsgi.input': BytesIO(body),
+			'wsgi.input_terminated': True,
+			'wsgi.errors': sys.stderr,
+			'wsgi.multithread': True,
+			'wsgi.multiprocess': False,
+			'wsgi.run_once': False,
+			'asgi.scope': scope,
+		}
+	
+	for name, value in scope.get('headers', ()):
+		name = name.decode('latin1').upper().replace('-', '_')
+		value = value.decode('latin1')
+		
+		if name not in UNPREFIXED:
+			name = 'HTTP_' + name
+		
+		if name in result:  # Repeated headers are folded into a single comma-separated value.
+			value = result[name] + ',' + value
+		
+		result[name] = value
+	
+	return result
+
+
+# ## Response Translation
+
+async def relay(send, application, environ, executor=None):
+	"""Execute a WSGI application and transmit the result as ASGI response messages.
+	
+	Bodies which are not simple lists or tuples of chunks (such as generators or open files) are iterated within the
+	given executor, as producing each chunk may block, within a copy of the current `contextvars` context.
+	"""
+	
+	captured = []
+	
+	def start_response(status, headers, exc_info=None):
+		captured[:] = [status, headers]
+	
+	body = application(environ, start_response)
+	
+	try:
+		if isinstance(body, (list, tuple)):
+			chunks = body
+		else:
+			chunks = None
+			iterator = iter(body)
+			loop = get_running_loop()
+			run = copy_context().run
+			chunk = await loop.run_in_executor(executor, run, next, iterator, None)  # Ensure start_response was called.
+		
+		status, headers = captured
+		
+		await send({
+				'type': 'http.response.start',
+				'status': int(status.partition(' ')[0]),
+				'headers': [(name.lower().encode('latin1'), value.encode('latin1')) for name, value in headers],
+			})
+		
+		if chunks is not None:
+			for chunk in chunks:
+				if chunk: await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+		
+		else:
+			while chunk is not None:
+				if chunk: await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+				chunk = await loop.run_in_executor(executor, run, next, iterator, None)
+	
+	finally:
+		if hasattr(body, 'close'):
+			body.close()
+	
+	await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
@@ -5,15 +5,75 @@
 from __future__ import unicode_literals
 
 from collections import deque
-from inspect import isclass
+from inspect import isclass, ismodule, isroutine
 from marrow.package.host import PluginManager
 
+from .compat import unicode
+from .util import LRUCache
+
 
 # ## Module Globals
 
 # A standard logger object.
 log = __import__('logging').getLogger(__name__)
 
+# Handlers which hold no request state, and so may be re-used across requests as-is.
+STATIC = (bytes, unicode, int, float, type(None))
+
+
+# ## Helper Functions
+
+def _recipe(root, events):
+	"""Determine how to reconstruct the handlers of the given dispatch events for a later request.
+	
+	Controller instances are constructed during dispatch using the context of the request being dispatched, and must be
+	constructed again for each request replaying the events; methods bound to them must be bound again. Classes,
+	functions, modules, and static values are re-used. Returns a tuple of `(path, kind, value, endpoint)` events, or
+	`None` if any handler can not be reconstructed.
+	"""
+	
+	recipe = []
+	prior = root
+	
+	for path, handler, endpoint in events:
+		bound = getattr(handler, '__self__', None) if isroutine(handler) else None
+		
+		if isclass(handler) or ismodule(handler) or isinstance(handler, STATIC) or \
+				(isroutine(handler) and (bound is None or isclass(bound) or ismodule(bound))):
+			step = 'value', handler
+		
+		elif recipe and bound is prior:  # A method of the controller instance preceding it.
+			step = 'bind', handler.__name__
+		
+		elif type(handler) is (prior if path is None else getattr(prior, path, None)):  # Instantiated by dispatch.
+			step = 'new', type(handler)
+		
+		else:
+			return None
+		
+		recipe.append((path, ) + step + (endpoint, ))
+		prior = handler
+	
+	return tuple(recipe)
+
+
+def _replay(context, recipe, callbacks):
+	"""Reconstruct the handlers of recorded dispatch events for the given request, issuing dispatch callbacks."""
+	
+	handler = None
+	
+	for path, kind, value, endpoint in recipe:
+		if kind == 'new':
+			handler = value(context)
+		elif kind == 'bind':
+			handler = getattr(handler, value)
+		else:
+			handler = value
+		
+		for ext in callbacks: ext(context, path, handler, endpoint)
+	
+	return handler
+
 
 # ## Dispatch Plugin Manager
 
@@ -32,11 +92,21 @@ class WebDispatchers(PluginManager):
 	
 	Others may exist, and dispatch middleware may be available to perform more complex behaviours. The default
 	dispatcher if not otherwise configured is object dispatch.
+	
+	Optionally, the resolution of paths to endpoints may be cached, replaying the recorded dispatch events on
+	subsequent requests for the same path rather than descending again. Caching is enabled by passing a non-zero
+	`dispatch_cache` size to the `Application`, and applies only to resolutions where a handler along the way declares
+	itself cacheable with a truthy `__dispatch_cache__` attribute. The declaration nearest the endpoint wins, allowing
+	portions of a cacheable tree to opt back out by declaring `__dispatch_cache__ = False`.
+	
+	Controller instances constructed during dispatch are constructed again, using the current context, when replaying,
+	and methods bound to them bound again; classes, functions, and static values are re-used. Resolutions involving
+	any other handler, such as an instance not constructed by dispatch itself, are not cached.
 	"""
 	
 	__isabstractmethod__ = False  # Work around an issue in modern (3.4+) Python due to our instances being callable.
 	
-	def __init__(self, ctx):
+	def __init__(self, ctx, cache=0):
 		"""Dispatch registry constructor.
 		
 		The dispatch registry is not meant to be instantiated by third-party software. Instead, access the registry as
@@ -44,6 +114,8 @@ class WebDispatchers(PluginManager):
 		"""
 		
 		super(WebDispatchers, self).__init__('web.dispatch')
+		
+		self.cache = LRUCache(cache) if cache else None  # Resolved dispatch events, by root, method, and path.
 	
 	def __call__(self, context, handler, path):
 		"""Having been bound to an appropriate context, find a handler for the request path.
@@ -59,11 +131,27 @@ class WebDispatchers(PluginManager):
 		# This technically doesn't help Pypy at all, but saves repeated deep lookup in CPython.(E)
 		callbacks = context.extension.signal.dispatch  # These extensions want to be notified.
 		self = context.dispatch  # Dispatch plugin registry.
+		cache = self.cache
+		
+		if cache is not None:
+			key = (handler, context.environ['REQUEST_METHOD'], path)
+			
+			try:
+				events = cache.get(key)
+			except TypeError:  # The root of dispatch is unhashable.
+				cache = None
+			
+			else:
+				if events:  # Replay the recorded dispatch events without descending.
+					return True, _replay(context, events, callbacks)
+				
+				events = []
+				cacheable = False
 		
 		if __debug__:
 			log.debug("Preparing dispatch.", extra=dict(
-					request = id(context.request),
-					path = context.request.path_info,
+					request = id(context),
+					path = context.environ['PATH_INFO'],
 					handler = repr(handler)
 				))
 		
@@ -86,9 +174,16 @@ class WebDispatchers(PluginManager):
 					if is_endpoint and not callable(handler) and hasattr(handler, '__dispatch__'):
 						crumb = crumb.replace(endpoint=False)
 					
+					event = (str(crumb.path) if crumb.path else None, crumb.handler, crumb.endpoint)
+					
+					if cache is not None:  # Record the event, and the nearest declared preference for caching.
+						events.append(event)
+						preference = getattr(crumb.handler, '__dispatch_cache__', None)
+						if isinstance(preference, bool): cacheable = preference
+					
 					#__import__('wdb').set_trace()
 					# DO NOT add production logging statements (ones not wrapped in `if __debug__`) to this callback!
-					for ext in callbacks: ext(context, str(crumb.path) if crumb.path else None, crumb.handler, crumb.endpoint)
+					for ext in callbacks: ext(context, *event)
 				
 				# Repeat of earlier, we do this after extensions in case anything above modifies the environ path.
 				path = context.environ['PATH_INFO'].strip('/')
@@ -101,6 +196,12 @@ class WebDispatchers(PluginManager):
 		except LookupError:
 			pass  # `is_endpoint` can only be `False` here.
 		
+		if is_endpoint and cache is not None and cacheable and events[-1][1] is handler:
+			recipe = _recipe(key[0], events)
+			
+			if recipe is not None:
+				cache[key] = recipe
+		
 		return is_endpoint, handler if is_endpoint else None
 	
 	def __getitem__(self, dispatcher):
@@ -8,7 +8,9 @@ from __future__ import unicode_literals
 
 import logging
 
-from threading import RLock
+from collections import OrderedDict
+from contextvars import ContextVar
+from threading import Condition, Lock, RLock
 
 from marrow.package.canonical import name
 
@@ -57,6 +59,176 @@ class lazy(object):
 		return value
 
 
+class LRUCache(object):
+	"""A bounded mapping which evicts the least recently used entries once full.
+	
+	Individual retrieval and assignment operations are thread safe. A `size` of zero or `None` produces a cache which
+	retains nothing.
+	
+	If a `weight` callable is given the `size` limits the total weight of the values retained, rather than their
+	number; values heavier than the entire limit are not retained at all. For example, to bound the bytes retained:
+	
+		cache = LRUCache(64 * 1024 * 1024, weight=len)
+	"""
+	
+	__slots__ = ('size', 'weight', 'used', 'lock', '_data')
+	
+	def __init__(self, size=128, weight=None):
+		self.size = size or 0
+		self.weight = weight
+		self.used = 0  # The total weight of retained values, if weighed.
+		self.lock = Lock()
+		self._data = OrderedDict()
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({1}/{0.size})".format(self, self.used if self.weight else len(self._data))
+	
+	def __len__(self):
+		return len(self._data)
+	
+	def __contains__(self, key):
+		return key in self._data
+	
+	def get(self, key, default=None):
+		"""Retrieve a value from the cache, marking it as recently used."""
+		
+		with self.lock:
+			value = self._data.get(key, sentinel)
+			
+			if value is sentinel:
+				return default
+			
+			self._data.move_to_end(key)
+		
+		return value
+	
+	def __setitem__(self, key, value):
+		"""Record a value, evicting the least recently used values if needed to remain within the size limit."""
+		
+		if not self.size:
+			return
+		
+		data = self._data
+		weight = self.weight
+		
+		if weight is None:
+			with self.lock:
+				data[key] = value
+				data.move_to_end(key)
+				
+				while len(data) > self.size:
+					data.popitem(last=False)
+			
+			return
+		
+		cost = weight(value)
+		
+		with self.lock:
+			previous = data.pop(key, sentinel)
+			
+			if previous is not sentinel:
+				self.used -= weight(previous)
+			
+			if cost > self.size:  # Would displace everything, and still not fit.
+				return
+			
+			data[key] = value
+			self.used += cost
+			
+			while self.used > self.size:
+				self.used -= weight(data.popitem(last=False)[1])
+	
+	def __delitem__(self, key):
+		with self.lock:
+			value = self._data.pop(key)
+			
+			if self.weight is not None:
+				self.used -= self.weight(value)
+	
+	def clear(self):
+		"""Discard all cached values."""
+		
+		with self.lock:
+			self._data.clear()
+			self.used = 0
+
+
+class InFlight(object):
+	"""A thread safe count of requests in progress, permitting one to wait for all of them to complete."""
+	
+	__slots__ = ('count', 'condition')
+	
+	def __init__(self):
+		self.count = 0
+		self.condition = Condition(Lock())
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({0.count})".format(self)
+	
+	def __len__(self):
+		return self.count
+	
+	def enter(self, context=None):
+		"""Record the start of a request. Suitable for use as a `prepare` callback."""
+		
+		with self.condition:
+			self.count += 1
+	
+	def leave(self, context=None):
+		"""Record the completion of a request. Suitable for use as a `done` callback."""
+		
+		with self.condition:
+			self.count -= 1
+			
+			if not self.count:
+				self.condition.notify_all()
+	
+	def wait(self, timeout=None):
+		"""Wait until no requests are in progress, returning `False` if the timeout elapsed first."""
+		
+		with self.condition:
+			return self.condition.wait_for(lambda: not self.count, timeout)
+
+
+class ContextLocal(object):
+	"""A `threading.local` work-alike whose attributes are local to the current execution context.
+	
+	Attributes are held within a `contextvars.ContextVar`. As such they are isolated between threads, as they would be
+	using `threading.local`, and additionally between concurrently executing `asyncio` tasks. They are also visible to
+	work executed within a copy of the context, such as synchronous endpoints served via ASGI.
+	
+	Assignment replaces the namespace of the current context rather than altering it in place, thus is not visible to
+	contexts previously copied from it.
+	"""
+	
+	__slots__ = ('_namespace', )
+	
+	def __init__(self):
+		object.__setattr__(self, '_namespace', ContextVar('local', default={}))
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}({1})".format(self, ', '.join(sorted(self._namespace.get())))
+	
+	def __getattr__(self, name):
+		try:
+			return self._namespace.get()[name]
+		except KeyError:
+			raise AttributeError(name) from None
+	
+	def __setattr__(self, name, value):
+		namespace = dict(self._namespace.get())
+		namespace[name] = value
+		self._namespace.set(namespace)
+	
+	def __delattr__(self, name):
+		namespace = dict(self._namespace.get())
+		
+		if namespace.pop(name, sentinel) is sentinel:
+			raise AttributeError(name)
+		
+		self._namespace.set(namespace)
+
+
 def addLoggingLevel(levelName, levelNum, methodName=None):
 	"""Comprehensively add a new logging level to the `logging` module and the current logging class.
 	
@@ -68,7 +68,7 @@ class WebViews(PluginManager):
 	
 	This extends plugin naming to support multiple candidates per name, overrides manual registration to log some
 	useful messages, and makes instances callable. Executing a `WebViews` instance passing in an object will
-	produce a generator yielding candidate views registered to handle that type of object.
+	produce an ordered sequence of candidate views registered to handle that type of object.
 	"""
 	
 	__isabstractmethod__ = False  # Work around a Python 3.4+ issue, since our instances are callable.
@@ -83,6 +83,7 @@ class WebViews(PluginManager):
 		"""
 		super(WebViews, self).__init__('web.view')
 		self.__dict__['_map'] = MultiDict()
+		self.__dict__['_cache'] = dict()  # Ordered candidates by result type; see `_resolve`.
 	
 	def __repr__(self):
 		"""Programmers' representation for development-time diagnostics."""
@@ -91,21 +92,45 @@ class WebViews(PluginManager):
 	def __call__(self, result):
 		"""Identify view to use based on the type of result when our instance is called as a function.
 		
-		This generates a stream of candidates which should be called in turn until one returns a truthy value.
+		This returns an ordered sequence of candidates which should be called in turn until one returns a truthy value.
+		The candidates for any given type are determined once and remembered until another view is registered.
 		"""
 		
 		rtype = type(result)
 		
-		# Short-circuit on exact matches.
-		for candidate in self._map.getall(rtype):
-			yield candidate
+		try:
+			return self._cache[rtype]
+		except KeyError:
+			pass
+		
+		candidates = self._cache[rtype] = self._resolve(rtype)
+		
+		return candidates
+	
+	def _resolve(self, rtype):
+		"""Determine the ordered candidate views for results of the given type.
+		
+		Views registered against classes in the method resolution order of the type come first, most specific first.
+		More exhaustive matches, for potentially more crafty use such as ABC, zope.interface, marrow.interface, etc.,
+		follow in registration order, with any views registered against `object` itself considered last.
+		"""
+		
+		candidates = []
+		mro = rtype.__mro__
+		
+		for kind in mro:
+			if kind is object: continue
+			candidates.extend(self._map.getall(kind))
 		
-		# More exhaustive search for potentially more crafty use such as ABC, zope.interface, marrow.interface, etc.
 		for kind, candidate in self._map.iteritems():
-			if kind is rtype: continue  # We've already seen these.
+			if kind in mro: continue  # We've already seen these.
 			
-			if isinstance(result, kind):
-				yield candidate
+			if issubclass(rtype, kind):
+				candidates.append(candidate)
+		
+		candidates.extend(self._map.getall(object))
+		
+		return tuple(candidates)
 	
 	# ### Plugin Registration
 	
@@ -140,6 +165,7 @@ class WebViews(PluginManager):
 		
 		# Add the handler to the pool of candidates. This adds to a list instead of replacing the "dictionary item".
 		self._map.add(kind, handler)
+		self._cache.clear()  # Previously determined candidates may now be incomplete.
 		
 		return handler
 
@@ -0,0 +1,181 @@
+# encoding: utf-8
+
+"""Admission control: bounded request concurrency, shedding excess load early and cheaply."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+from asyncio import CancelledError, get_running_loop, shield
+from threading import Lock, Semaphore
+from time import monotonic
+
+from webob import Response
+from webob.exc import HTTPException
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+
+# ## Helper Classes
+
+class Gate(object):
+	"""A counting semaphore permitting a bounded number of callers to wait, each for a limited time, to pass."""
+	
+	__slots__ = ('limit', 'queue', 'waiting', 'semaphore', 'lock')
+	
+	def __init__(self, limit, queue):
+		self.limit = limit
+		self.queue = queue
+		self.waiting = 0
+		self.semaphore = Semaphore(limit)
+		self.lock = Lock()
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}(limit={0.limit}, queue={0.queue}, waiting={0.waiting})".format(self)
+	
+	def acquire(self, timeout):
+		"""Attempt to pass the gate, returning `False` if the queue is full or the timeout elapses."""
+		
+		if self.semaphore.acquire(False):  # The uncontended case.
+			return True
+		
+		if timeout <= 0:
+			return False
+		
+		with self.lock:
+			if self.waiting >= self.queue:
+				return False
+			
+			self.waiting += 1
+		
+		try:
+			return self.semaphore.acquire(timeout=timeout)
+		finally:
+			with self.lock:
+				self.waiting -= 1
+	
+	def release(self):
+		self.semaphore.release()
+
+
+# ## Extension
+
+class AdmissionExtension(object):
+	"""Limit the number of requests processed concurrently, rejecting those which can not be served promptly.
+	
+	At most `limit` requests are admitted at once. Others wait, up to `queue` of them at a time, for no more than
+	`deadline` seconds before being refused with a `503 Service Unavailable` response carrying a `Retry-After` header
+	of `retry` seconds. This decision is made during `prepare`, before dispatch or the construction of `Request` and
+	`Response` objects, and the refusal is assembled from a pre-rendered body and headers.
+	
+	Classes of endpoint may additionally be limited by path prefix through the `classes` mapping of prefix to limit;
+	the longest matching prefix applies. A request must be admitted to its class prior to being admitted to the
+	application as a whole, so a saturated class does not consume capacity needed by others.
+	
+		app = Application(Root, extensions=[AdmissionExtension(64, classes={'/report': 4})])
+	
+	Admission ends once the response has been delivered, as signalled by the `done` callback.
+	
+	Waiting blocks the current thread; under ASGI waiting is performed off the event loop, as admission is released by
+	requests completing upon it.
+	"""
+	
+	__slots__ = ('deadline', 'gate', 'classes', 'status', 'headers', 'body')
+	
+	first = True  # Refusing requests is the cheapest thing we can do; do so prior to anything else.
+	uses = {'analytics'}  # Permit timing to include time spent waiting for admission.
+	provides = {'admission'}
+	
+	def __init__(self, limit=None, queue=None, deadline=0.1, retry=1, classes=None):
+		"""Configure the extension.
+		
+		The `limit` defaults to 16 concurrent requests, and the `queue` to the same number of waiting requests per gate.
+		"""
+		
+		limit = int(limit or 16)
+		queue = limit if queue is None else int(queue)
+		
+		self.deadline = deadline
+		self.gate = Gate(limit, queue)
+		
+		# Ordered longest to shortest to select the most specific prefix first.
+		self.classes = tuple((prefix, Gate(int(count), queue)) for prefix, count in
+				sorted((classes or {}).items(), key=lambda item: len(item[0]), reverse=True))
+		
+		self.status = '503 Service Unavailable'
+		self.body = b"The service is temporarily unable to handle this request; please try again shortly.\n"
+		self.headers = (
+				('Content-Type', 'text/plain; charset=utf-8'),
+				('Content-Length', str(len(self.body))),
+				('Retry-After', str(int(retry))),
+			)
+	
+	# ### Request-Local Callbacks
+	
+	def prepare(self, context):
+		"""Admit the request, or refuse it."""
+		
+		path = context.environ.get('SCRIPT_NAME', '') + context.environ.get('PATH_INFO', '')
+		
+		for prefix, gate in self.classes:
+			if path.startswith(prefix):
+				gates = (gate, self.gate)
+				break
+		else:
+			gates = (self.gate, )
+		
+		expires = monotonic() + self.deadline
+		context._admitted = []
+		
+		if 'asgi.scope' in context.environ:  # Don't block the event loop.
+			return self._await(context, gates, expires)
+		
+		for gate in gates:
+			self._admit(context, gate, gate.acquire(expires - monotonic()))
+	
+	def done(self, context):
+		"""Executed after the response has been delivered to the client, releasing admission."""
+		
+		for gate in context.__dict__.pop('_admitted', ()):
+			gate.release()
+	
+	# ### Utility Methods
+	
+	async def _await(self, context, gates, expires):
+		loop = get_running_loop()
+		
+		for gate in gates:
+			if gate.acquire(0):  # Uncontended; there is no need to involve a worker thread.
+				self._admit(context, gate, True)
+				continue
+			
+			waiting = loop.run_in_executor(None, gate.acquire, expires - monotonic())
+			
+			try:
+				admitted = await shield(waiting)
+			
+			except CancelledError:  # The client went away; should the wait succeed regardless, pass the gate back.
+				waiting.add_done_callback(lambda waited, gate=gate: waited.result() and gate.release())
+				raise
+			
+			self._admit(context, gate, admitted)
+	
+	def _admit(self, context, gate, admitted):
+		"""Record passage through the given gate, or refuse the request."""
+		
+		if not admitted:
+			if __debug__:
+				log.debug("Request refused admission.", extra=dict(request=id(context), gate=repr(gate)))
+			
+			raise self.refuse()
+		
+		context._admitted.append(gate)
+	
+	def refuse(self):
+		"""Produce the exception used to refuse service."""
+		
+		response = Response(status=self.status, headerlist=list(self.headers), app_iter=(self.body, ))
+		return HTTPException(self.status, response)
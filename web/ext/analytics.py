@@ -6,15 +6,315 @@
 
 from __future__ import unicode_literals
 
-import time
+import os
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from mmap import mmap
+from struct import Struct
+from threading import Lock
+from time import perf_counter_ns
+from zlib import crc32
+
+try:
+	from fcntl import lockf, LOCK_EX, LOCK_SH, LOCK_UN
+except ImportError:  # pragma: no cover
+	lockf = None  # Shared metrics are unavailable on platforms lacking POSIX advisory locks.
+
+from webob import Response
 
 from web.core.compat import unicode
+from web.core.util import LRUCache, safe_name
 
 
 # ## Module Globals
 
 log = __import__('logging').getLogger(__name__)
 
+# The request processing phases timed, in the order they occur.
+PHASES = ('prepare', 'dispatch', 'mutate', 'endpoint', 'transform', 'view', 'after')
+
+# Canonical endpoint names, keyed by the underlying function so bound methods of new instances may share an entry.
+_names = LRUCache(1024)
+
+
+# ## Aggregation
+
+class Metrics(object):
+	"""In-process aggregation of request statistics, keyed by the canonical name of the resolved endpoint.
+	
+	For each endpoint a log-bucketed histogram of generation time is maintained, alongside counts of responses by
+	status class (`2xx`, `4xx`, etc.) and the total number of body bytes declared by responses. Requests which could
+	not be resolved to an endpoint are recorded under the name `-`.
+	
+	An instance is a valid endpoint: mount it within your application to serve the collected statistics using the
+	Prometheus text exposition format.
+	
+		analytics = AnalyticsExtension(metrics=True)
+		
+		class Root:
+			metrics = analytics.metrics
+	"""
+	
+	__slots__ = ('buckets', 'lock', 'series')
+	
+	# Upper bounds, in seconds, of the histogram buckets; each decade is split at 1, 2.5, and 5.
+	BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+	CONTENT_TYPE = 'text/plain; version=0.0.4'
+	
+	def __init__(self, buckets=None):
+		self.buckets = tuple(int(i * 1000000000) for i in (buckets or self.BUCKETS))  # In nanoseconds.
+		self.lock = Lock()
+		self.series = {}
+	
+	def record(self, endpoint, duration, status, size=0):
+		"""Record a single request against the named endpoint, given its duration in nanoseconds."""
+		
+		bucket = bisect_left(self.buckets, duration)
+		status = int(status) // 100 - 1
+		
+		with self.lock:
+			series = self.series.get(endpoint)
+			
+			if series is None:
+				# Bucket counts (and overflow), duration sum, status class counts (1xx through 5xx), and bytes out.
+				series = self.series[endpoint] = [[0] * (len(self.buckets) + 1), 0, [0] * 5, 0]
+			
+			series[0][bucket] += 1
+			series[1] += duration
+			
+			if 0 <= status < 5:
+				series[2][status] += 1
+			
+			series[3] += size or 0
+	
+	def clear(self):
+		with self.lock:
+			self.series.clear()
+	
+	def snapshot(self):
+		"""Retrieve a consistent copy of the collected statistics, ordered by endpoint name.
+		
+		Each element is a 5-tuple of the endpoint name, bucket counts, duration sum, status class counts, and size.
+		"""
+		
+		with self.lock:
+			return [(name, list(counts), total, list(statuses), size)
+					for name, (counts, total, statuses, size) in sorted(self.series.items())]
+	
+	def exposition(self, prefix='webcore'):
+		"""Render the collected statistics in the Prometheus text exposition format."""
+		
+		series = self.snapshot()
+		
+		bounds = ['{:g}'.format(i / 1000000000) for i in self.buckets] + ['+Inf']
+		
+		duration = prefix + '_request_duration_seconds'
+		responses = prefix + '_responses_total'
+		sent = prefix + '_response_bytes_total'
+		
+		lines = ['# HELP ' + duration + ' Time taken to generate a response.', '# TYPE ' + duration + ' histogram']
+		
+		for name, counts, total, statuses, size in series:
+			label = 'endpoint="' + _escape(name) + '"'
+			cumulative = 0
+			
+			for bound, count in zip(bounds, counts):
+				cumulative += count
+				lines.append('{}_bucket{{{},le="{}"}} {}'.format(duration, label, bound, cumulative))
+			
+			lines.append('{}_sum{{{}}} {:.9f}'.format(duration, label, total / 1000000000))
+			lines.append('{}_count{{{}}} {}'.format(duration, label, cumulative))
+		
+		lines.extend(('# HELP ' + responses + ' Responses issued, by status class.', '# TYPE ' + responses + ' counter'))
+		
+		for name, counts, total, statuses, size in series:
+			label = 'endpoint="' + _escape(name) + '"'
+			
+			for i, count in enumerate(statuses):
+				if count:
+					lines.append('{}{{{},status="{}xx"}} {}'.format(responses, label, i + 1, count))
+		
+		lines.extend(('# HELP ' + sent + ' Response body bytes declared.', '# TYPE ' + sent + ' counter'))
+		
+		for name, counts, total, statuses, size in series:
+			lines.append('{}{{endpoint="{}"}} {}'.format(sent, _escape(name), size))
+		
+		return '\n'.join(lines) + '\n'
+	
+	def __call__(self, *args, **kw):
+		"""Serve the collected statistics as an endpoint."""
+		
+		return Response(text=self.exposition(), content_type=self.CONTENT_TYPE, charset='utf-8')
+
+
+class SharedMetrics(Metrics):
+	"""Request statistics aggregated across processes within a memory-mapped file.
+	
+	The file is divided into a fixed number of slots, one per endpoint, each containing a fixed layout of 64-bit
+	counters. Any number of processes, such as the workers of a pre-forking server, may record into the same file
+	concurrently; each update holds a POSIX advisory lock on only the byte range of the affected slot. Any process may
+	render the whole-node view, e.g. by mounting the instance as an endpoint.
+	
+		analytics = AnalyticsExtension(metrics=SharedMetrics('/run/myapp/metrics'))
+	
+	All processes sharing a file must agree on the number of slots and the histogram buckets. Endpoints beyond the
+	capacity of the file are recorded against the final slot, named `~other`. Requires a POSIX platform.
+	"""
+	
+	__slots__ = ('path', 'slots', 'counters', 'size', 'fd', 'map', 'index')
+	
+	HEADER = Struct('<8sIII')  # Magic number, slot count, bucket count, and checksum of the bucket boundaries.
+	MAGIC = b'WCSTATS1'
+	NAME = Struct('<H190s')  # Length-prefixed UTF-8 endpoint name.
+	OVERFLOW = '~other'
+	
+	def __init__(self, path, slots=256, buckets=None):
+		if lockf is None:  # pragma: no cover
+			raise NotImplementedError("Shared metrics require a platform with POSIX advisory locking.")
+		
+		super(SharedMetrics, self).__init__(buckets)
+		
+		self.path = path
+		self.slots = slots
+		self.index = {}  # Per-process cache of endpoint name to slot number.
+		
+		# Bucket counts (and overflow), duration sum, status class counts (1xx through 5xx), and bytes out.
+		self.counters = Struct('<{}q'.format(len(self.buckets) + 8))
+		self.size = self.NAME.size + self.counters.size
+		
+		length = self.HEADER.size + slots * self.size
+		header = self.HEADER.pack(self.MAGIC, slots, len(self.buckets),
+				crc32(Struct('<{}q'.format(len(self.buckets))).pack(*self.buckets)))
+		
+		self.fd = fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+		
+		with self._locked(0, self.HEADER.size):
+			if not os.fstat(fd).st_size:  # We are the first to use this file; initialize it.
+				os.ftruncate(fd, length)
+				os.pwrite(fd, header, 0)
+				os.pwrite(fd, self._name(self.OVERFLOW), self._offset(slots - 1))
+			
+			compatible = os.pread(fd, self.HEADER.size, 0) == header and os.fstat(fd).st_size == length
+		
+		if not compatible:
+			os.close(fd)
+			raise ValueError("Incompatible shared metrics file: " + path)
+		
+		self.map = mmap(fd, length)
+	
+	def close(self):
+		self.map.close()
+		os.close(self.fd)
+	
+	def record(self, endpoint, duration, status, size=0):
+		bucket = bisect_left(self.buckets, duration)
+		status = int(status) // 100 - 1
+		total = len(self.buckets) + 1  # The position of the duration sum within the counters.
+		
+		with self.lock:  # Advisory locks are held per-process, so threads within this one must exclude each other.
+			offset = self._offset(self._slot(endpoint)) + self.NAME.size
+			
+			with self._locked(offset, self.counters.size):
+				counters = list(self.counters.unpack_from(self.map, offset))
+				counters[bucket] += 1
+				counters[total] += duration
+				
+				if 0 <= status < 5:
+					counters[total + 1 + status] += 1
+				
+				counters[-1] += size or 0
+				
+				self.counters.pack_into(self.map, offset, *counters)
+	
+	def clear(self):
+		empty = bytes(self.counters.size)
+		
+		with self.lock:
+			for slot in range(self.slots):
+				offset = self._offset(slot) + self.NAME.size
+				
+				with self._locked(offset, self.counters.size):
+					self.map[offset:offset + self.counters.size] = empty
+	
+	def snapshot(self):
+		result = []
+		buckets = len(self.buckets) + 1
+		
+		with self.lock:
+			for slot in range(self.slots):
+				offset = self._offset(slot)
+				length, name = self.NAME.unpack_from(self.map, offset)
+				
+				if not length:
+					continue
+				
+				with self._locked(offset + self.NAME.size, self.counters.size, LOCK_SH):
+					counters = self.counters.unpack_from(self.map, offset + self.NAME.size)
+				
+				if not any(counters):
+					continue
+				
+				result.append((name[:length].decode('utf-8', 'replace'), list(counters[:buckets]), counters[buckets],
+						list(counters[buckets + 1:-1]), counters[-1]))
+		
+		result.sort(key=lambda series: series[0])
+		
+		return result
+	
+	# #### Slot Management
+	
+	def _offset(self, slot):
+		return self.HEADER.size + slot * self.size
+	
+	def _name(self, name):
+		encoded = name.encode('utf-8')[:self.NAME.size - 2]
+		return self.NAME.pack(len(encoded), encoded)
+	
+	def _slot(self, name):
+		"""Identify the slot assigned to the given endpoint name, allocating one if required."""
+		
+		slot = self.index.get(name)
+		
+		if slot is not None:
+			return slot
+		
+		packed = self._name(name)
+		slot = self.slots - 1  # Overflow, if no free slot is found.
+		
+		with self._locked(0, self.HEADER.size):  # Allocation is serialized on the header.
+			for i in range(self.slots - 1):
+				offset = self._offset(i)
+				existing = self.map[offset:offset + self.NAME.size]
+				
+				if existing == packed:
+					slot = i
+					break
+				
+				if not self.NAME.unpack_from(existing)[0]:  # An unallocated slot; claim it.
+					self.map[offset:offset + self.NAME.size] = packed
+					slot = i
+					break
+		
+		self.index[name] = slot
+		
+		return slot
+	
+	@contextmanager
+	def _locked(self, offset, length, mode=None):
+		lockf(self.fd, mode or LOCK_EX, length, offset)
+		
+		try:
+			yield
+		finally:
+			lockf(self.fd, LOCK_UN, length, offset)
+
+
+def _escape(value):
+	"""Escape a Prometheus label value."""
+	
+	return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
 
 # ## Extension
 
@@ -24,21 +324,58 @@ class AnalyticsExtension(object):
 	By default this extension adds a `X-Generation-Time` header to all responses and logs the generation time at the
 	`debug` level.  You can disable either by passing `header=None` or `level=None`, or specify an alternate logging
 	level by passing in the name of the level.
+	
+	The time spent within each phase of request processing is also measured, and emitted as a `Server-Timing` header
+	(disabled by passing `timing=None`) and as the `phases` field of the log record, in fractional milliseconds. The
+	phases are:
+	
+	* `prepare` -- the `prepare` callbacks of all extensions
+	* `dispatch` -- the `before` callbacks of all extensions, and resolution of the endpoint
+	* `mutate` -- collection and processing of endpoint arguments
+	* `endpoint` -- execution of the endpoint itself
+	* `transform` -- transformation of the value returned by the endpoint
+	* `view` -- rendering of the result into the response
+	* `after` -- the `after` callbacks of all other extensions
+	
+	Phases which did not occur, such as argument processing for a static endpoint, are omitted and their time
+	attributed to the prior phase. The time to last byte, measured once the response body has been fully delivered,
+	is only available to the log record, as the `ttlb` field.
+	
+	Pass `metrics=True`, or a `Metrics` instance to share, to aggregate statistics per endpoint in-process; see the
+	`Metrics` class for details on serving them.
 	"""
 	
-	__slots__ = ('header', 'log')
+	__slots__ = ('header', 'timing', 'log', 'metrics')
 	
 	first = True  # We need this processing to happen as early as possible.
 	provides = ['analytics']  # Expose this symbol for other extensions to depend upon.
 	
-	def __init__(self, header='X-Generation-Time', level='debug'):
+	def __init__(self, header='X-Generation-Time', level='debug', timing='Server-Timing', metrics=None):
 		"""Executed to configure the extension."""
 		
 		super(AnalyticsExtension, self).__init__()
 		
 		# Record settings.
 		self.header = header
+		self.timing = timing
 		self.log = getattr(log, level) if level else None
+		self.metrics = Metrics() if metrics is True else (metrics or None)
+	
+	# ### Application-Level Callbacks
+	
+	def start(self, context):
+		"""Bracket the callbacks of other extensions to time the phases they surround.
+		
+		As a `first` extension our own callbacks execute at the start of `mutate` and the end of `transform` and
+		`after` processing. The boundaries around the endpoint and view are marked by the additional callbacks
+		attached here, prior to the request handler being compiled.
+		"""
+		
+		signal = context.extension.signal
+		
+		signal.mutate = signal.mutate + (self._endpoint, )
+		signal.transform = (self._transform, ) + signal.transform
+		signal.after = (self._after, ) + signal.after
 	
 	# ### Request-Local Callabacks
 	
@@ -46,25 +383,102 @@ class AnalyticsExtension(object):
 		"""Executed during request set-up."""
 		
 		context._start_time = None
+		context._timing = {'prepare': perf_counter_ns()}
 	
 	def before(self, context):
 		"""Executed after all extension prepare methods have been called, prior to dispatch."""
 		
-		context._start_time = time.time()
+		context._start_time = context._timing['dispatch'] = perf_counter_ns()
+	
+	def dispatch(self, context, consumed, handler, is_endpoint):
+		if is_endpoint:
+			context._endpoint = handler
+	
+	def mutate(self, context, handler, args, kw):
+		context._timing['mutate'] = perf_counter_ns()
+	
+	def _endpoint(self, context, handler, args, kw):
+		context._timing['endpoint'] = perf_counter_ns()
+	
+	def _transform(self, context, handler, result):
+		context._timing['transform'] = perf_counter_ns()
+		return result
+	
+	def transform(self, context, handler, result):
+		context._timing['view'] = perf_counter_ns()
+		return result
+	
+	def _after(self, context):
+		context._timing['after'] = perf_counter_ns()
 	
 	def after(self, context, exc=None):
 		"""Executed after dispatch has returned and the response populated, prior to anything being sent to the client."""
 		
-		duration = context._duration = round((time.time() - context._start_time) * 1000)  # Convert to ms.
-		delta = unicode(duration)
+		if '_timing' not in context.__dict__:  # The request was answered before our own preparation.
+			return
+		
+		now = perf_counter_ns()
+		
+		# Should an earlier extension have answered the request during preparation, `before` will not have run.
+		start = context._start_time or context._timing['prepare']
+		duration = context._duration = round((now - start) / 1000000)  # Convert to ms.
+		phases = context._phases = self.phases(context._timing, now)
 		
 		# Default response augmentation.
 		if self.header:
-			context.response.headers[self.header] = delta
+			context.response.headers[self.header] = unicode(duration)
+		
+		if self.timing:
+			context.response.headers[self.timing] = ', '.join(
+					'{};dur={:.3f}'.format(name, value) for name, value in phases.items())
+		
+		if self.metrics:
+			response = context.response
+			self.metrics.record(self.name(context.__dict__.get('_endpoint')), now - context._timing['prepare'],
+					response.status_code, response.content_length)
+	
+	def done(self, context):
+		"""Executed after the response has been delivered to the client."""
+		
+		if not self.log or getattr(context, '_phases', None) is None:
+			return
+		
+		ttlb = (perf_counter_ns() - context._timing['prepare']) / 1000000
+		
+		self.log("Response generated in " + unicode(context._duration) + " milliseconds.", extra=dict(
+				duration = context._duration,
+				phases = context._phases,
+				ttlb = ttlb,
+				request = id(context)
+			))
+	
+	# ### Utility Methods
+	
+	@staticmethod
+	def name(endpoint):
+		"""Determine the canonical name of an endpoint, for use as a metrics key."""
+		
+		if endpoint is None:
+			return '-'
+		
+		key = getattr(endpoint, '__func__', endpoint)
+		
+		try:
+			result = _names.get(key)
+		except TypeError:  # Unhashable endpoint.
+			return safe_name(endpoint)
+		
+		if result is None:
+			result = _names[key] = safe_name(endpoint)
+		
+		return result
+	
+	@staticmethod
+	def phases(timing, end):
+		"""Calculate the duration, in milliseconds, of each recorded phase given a dictionary of start times."""
+		
+		marks = [(name, timing[name]) for name in PHASES if name in timing]
+		ends = [mark for name, mark in marks[1:]] + [end]
 		
-		if self.log:
-			self.log("Response generated in " + delta + " seconds.", extra=dict(
-					duration = duration,
-					request = id(context)
-				))
+		return {name: (finish - begin) / 1000000 for (name, begin), finish in zip(marks, ends)}
 
@@ -6,9 +6,155 @@
 
 from __future__ import unicode_literals
 
-from inspect import ismethod, getfullargspec
+from typing import Any, Union, get_args, get_origin
 
-from web.core.compat import items
+from web.core.util import LRUCache
+from web.ext.args import plan
+
+try:
+	from typing import Annotated  # Python 3.9 and later.
+except ImportError:  # pragma: no cover
+	Annotated = None
+
+try:
+	from types import UnionType  # Python 3.10 and later; the `int | None` spelling of a union.
+except ImportError:  # pragma: no cover
+	UnionType = Union
+
+
+# ## Module Globals
+
+# Sequence types which may be populated from a repeated value, such as `?tag=a&tag=b`.
+SEQUENCES = {list, tuple, set, frozenset}
+
+# Compiled casting instructions, keyed by the argument plan of the endpoint they apply to.
+_casters = LRUCache(1024)
+
+
+# ## Casting Compilation
+
+def caster(annotation):
+	"""Produce a callable casting a value arriving from the web according to the given annotation.
+	
+	Plain callables, such as `int` or `','.split`, are used as-is. Generic aliases from the `typing` module, or their
+	built-in equivalents, are interpreted: `list[int]` casts each element of a repeated value (wrapping a single value
+	in a list), `Optional[int]` produces `None` from an empty value, and `Annotated[int, ...]` casts using `int`.
+	Returns `None` if no casting is to be performed.
+	"""
+	
+	if annotation is Any or annotation is None:
+		return None
+	
+	origin = get_origin(annotation)
+	
+	if origin is None:
+		return annotation if callable(annotation) else None
+	
+	args = get_args(annotation)
+	
+	if Annotated is not None and origin is Annotated:
+		return caster(args[0])
+	
+	if origin is Union or origin is UnionType:
+		members = [i for i in args if i is not type(None)]
+		cast = caster(members[0]) if len(members) == 1 else _union([caster(i) for i in members])
+		
+		if len(members) == len(args) or cast is None:
+			return cast
+		
+		def optional(value):
+			return None if value is None or value == '' else cast(value)
+		
+		return optional
+	
+	if origin in SEQUENCES:
+		if origin is tuple and args and args[-1] is not Ellipsis:  # A fixed-length tuple of heterogeneous values.
+			casts = [caster(i) or _identity for i in args]
+		else:
+			casts = None
+			element = caster(args[0]) if args else None
+		
+		def sequence(value):
+			if not isinstance(value, (list, tuple)):
+				value = [value]
+			
+			if casts is not None:
+				if len(value) != len(casts):
+					raise ValueError("expected {} values, got {}".format(len(casts), len(value)))
+				
+				return origin(cast(i) for cast, i in zip(casts, value))
+			
+			if element is None:
+				return origin(value)
+			
+			return origin(element(i) for i in value)
+		
+		return sequence
+	
+	return None  # Other generic types, e.g. `dict[str, int]`, are passed through unmodified.
+
+
+def _identity(value):
+	return value
+
+
+def _union(casts):
+	"""Attempt each cast in turn, returning the result of the first to succeed."""
+	
+	def union(value):
+		error = None
+		
+		for cast in casts:
+			if cast is None:
+				return value
+			
+			try:
+				return cast(value)
+			except (ValueError, TypeError) as e:
+				error = e
+		
+		raise error
+	
+	return union
+
+
+def casters(handler):
+	"""Determine the casting instructions for a given endpoint, computing them only once per endpoint.
+	
+	Returns a 3-tuple of positional casts (as `(index, name, cast)` triples), a mapping of argument names to casts,
+	and the return annotation, if any.
+	"""
+	
+	arguments = plan(handler)
+	result = _casters.get(arguments)
+	
+	if result is None:
+		annotations = getattr(handler.__func__ if hasattr(handler, '__func__') else handler, '__annotations__', None)
+		annotations = dict(annotations or ())
+		returns = annotations.pop('return', None)
+		
+		named = {name: caster(annotation) for name, annotation in annotations.items()}
+		named = {name: cast for name, cast in named.items() if cast is not None}
+		positional = tuple((i, name, named[name]) for i, name in enumerate(arguments.positional) if name in named)
+		
+		result = _casters[arguments] = (positional, named, returns)
+	
+	return result
+
+
+def apply(name, cast, value):
+	"""Cast an individual value, identifying the argument being processed should the attempt fail."""
+	
+	try:
+		return cast(value)
+	except (ValueError, TypeError) as e:
+		parts = list(e.args)
+		
+		if parts and isinstance(parts[0], str):
+			parts[0] = parts[0] + " processing argument '{}'".format(name)
+			e.args = tuple(parts)
+		
+		raise
 
 
 # ## Extension
@@ -27,6 +173,12 @@ class AnnotationExtension(object):
 		def multiply(a: int, b: int):
 			return str(a * b)
 	
+	Generic aliases are understood, permitting repeated values to be cast element-wise and empty values to be
+	omitted. The casting instructions for each endpoint are determined once, on first use, and reused thereafter.
+	
+		def tagged(tags: list[int], limit: Optional[int] = None):
+			...
+	
 	This extension also performs a utility wrapping of returned values in the form of a 2-tuple of the return
 	annotation itself and the value returned by the callable endpoint. This integrates well with the view registered
 	by the `web.template` package to define a template at the head of the function, returning data for the template
@@ -50,49 +202,29 @@ class AnnotationExtension(object):
 		
 		The args list and kw dictionary may be freely modified, though invalid arguments to the handler will fail.
 		"""
-		def cast(arg, val):
-			if arg not in annotations:
-				return
-			
-			cast = annotations[key]
-			
-			try:
-				val = cast(val)
-			except (ValueError, TypeError) as e:
-				parts = list(e.args)
-				parts[0] = parts[0] + " processing argument '{}'".format(arg)
-				e.args = tuple(parts)
-				raise
-			
-			return val
-			
-		annotations = getattr(handler.__func__ if hasattr(handler, '__func__') else handler, '__annotations__', None)
-		if not annotations:
-			return
 		
-		argspec = getfullargspec(handler)
-		arglist = list(argspec.args)
+		positional, named, _ = casters(handler)
 		
-		if ismethod(handler):
-			del arglist[0]
+		if not named:
+			return
 		
-		for i, value in enumerate(list(args)):
-			key = arglist[i]
-			if key in annotations:
-				args[i] = cast(key, value)
+		for i, name, fn in positional:
+			if i >= len(args):
+				break
+			
+			args[i] = apply(name, fn, args[i])
 		
-		# Convert keyword arguments
-		for key, value in list(items(kw)):
-			if key in annotations:
-				kw[key] = cast(key, value)
+		for name, value in kw.items():  # Only values are replaced; the dictionary does not change size.
+			if name in named:
+				kw[name] = apply(name, named[name], value)
 	
 	def transform(self, context, handler, result):
 		"""Transform the value returned by the controller endpoint.
 		
 		This extension transforms returned values if the endpoint has a return type annotation.
 		"""
-		handler = handler.__func__ if hasattr(handler, '__func__') else handler
-		annotation = getattr(handler, '__annotations__', {}).get('return', None)
+		
+		annotation = casters(handler)[2]
 		
 		if annotation:
 			return (annotation, result)
@@ -3,17 +3,105 @@
 """Argument handling extensions for WebCore applications.
 
 These allow you to customize the behaviour of the arguments passed to endpoints.
+
+The arguments an endpoint accepts are inspected once and cached as an `ArgumentPlan`. Endpoints which accept no
+keyword arguments at all (no named parameters beyond any bound `self`, and no `**kw`) will not have query string,
+form-encoded, or JSON body data processed for them; such data is ignored rather than resulting in a mismatch.
 """
 
-from inspect import isroutine, ismethod, getcallargs
+from inspect import Parameter, Signature, isclass, isroutine, ismethod, signature
 
 from webob.exc import HTTPNotFound
-from web.core.util import safe_name
+from web.core.util import LRUCache, safe_name
 
 
 # A standard Python logger object.
 log = __import__('logging').getLogger(__name__)
 
+# Content types WebOb will process as form submissions; an empty type is only processed for `POST` requests.
+FORM_TYPES = {'', 'application/x-www-form-urlencoded', 'multipart/form-data'}
+
+
+def _content_type(environ):
+	"""Retrieve the bare MIME type of the request body, without parameters, from the WSGI environment."""
+	return environ.get('CONTENT_TYPE', '').partition(';')[0].strip().lower()
+
+
+# ## Argument Plans
+
+POSITIONAL = {Parameter.POSITIONAL_ONLY, Parameter.POSITIONAL_OR_KEYWORD}  # Parameters assignable by position.
+NAMED = {Parameter.POSITIONAL_OR_KEYWORD, Parameter.KEYWORD_ONLY}  # Parameters assignable by name.
+UNKNOWN = Signature([Parameter('args', Parameter.VAR_POSITIONAL), Parameter('kw', Parameter.VAR_KEYWORD)])
+
+class ArgumentPlan(object):
+	"""A description of the arguments an endpoint is capable of accepting.
+	
+	Plans are determined once per underlying function (see `plan`) and shared by the argument extensions, allowing them
+	to skip the processing of sources the endpoint can not use, and to validate arguments without repeated inspection.
+	"""
+	
+	__slots__ = ('signature', 'positional', 'variadic', 'names', 'keywords')
+	
+	def __init__(self, signature):
+		parameters = signature.parameters.values()
+		kinds = {i.kind for i in parameters}
+		
+		self.signature = signature  # The `inspect.Signature`, excluding any bound `self` argument.
+		self.positional = tuple(i.name for i in parameters if i.kind in POSITIONAL)  # In order.
+		self.variadic = Parameter.VAR_POSITIONAL in kinds  # Accepts `*args`.
+		self.names = frozenset(i.name for i in parameters if i.kind in NAMED)
+		self.keywords = Parameter.VAR_KEYWORD in kinds  # Accepts `**kw`.
+	
+	def __repr__(self):
+		return "ArgumentPlan({})".format(self.signature)
+	
+	@property
+	def named(self):
+		"""Determine if the endpoint can accept any keyword arguments at all."""
+		return self.keywords or bool(self.names)
+	
+	def validate(self, args, kw):
+		"""Raise a `TypeError` if the endpoint could not be called with the given arguments."""
+		self.signature.bind(*args, **kw)
+
+
+_plans = LRUCache(1024)
+
+
+def plan(endpoint):
+	"""Retrieve the `ArgumentPlan` for the given endpoint, determining it on first use.
+	
+	Plans are cached by the function underlying the endpoint, thus shared amongst all bound methods of a class.
+	"""
+	
+	if ismethod(endpoint):  # Bound methods share the plan of their function, less `self`.
+		target, bound = endpoint.__func__, True
+	elif isroutine(endpoint) or isclass(endpoint):
+		target, bound = endpoint, False
+	else:  # Handle instances that are callable.
+		target, bound = type(endpoint).__call__, True
+	
+	try:
+		result = _plans.get(target)
+	except TypeError:  # Unhashable; we can't cache these.
+		result, target = None, None
+	
+	if result is None:
+		try:
+			sig = signature(target, follow_wrapped=False)
+		except ValueError:  # Some built-ins can not be inspected; assume they accept anything.
+			sig, bound = UNKNOWN, False
+		
+		if bound:
+			sig = sig.replace(parameters=list(sig.parameters.values())[1:])
+		
+		result = ArgumentPlan(sig)
+		
+		if target is not None:
+			_plans[target] = result
+	
+	return result
+
 
 class ArgumentExtension(object):
 	"""Not for direct use."""
@@ -118,16 +206,13 @@ class ValidateArgumentsExtension(object):
 	
 	def _mutate(self, context, endpoint, args, kw):
 		try:
-			if callable(endpoint) and not isroutine(endpoint):
-				endpoint = endpoint.__call__  # Handle instances that are callable.
-			
-			getcallargs(endpoint, *args, **kw)
+			plan(endpoint).validate(args, kw)
 		
 		except TypeError as e:
 			# If the argument specification doesn't match, the handler can't process this request.
 			# This is one policy. Another possibility is more computationally expensive and would pass only
 			# valid arguments, silently dropping invalid ones. This can be implemented as a mutate handler.
-			log.error(str(e).replace(endpoint.__name__, safe_name(endpoint)), extra=dict(
+			log.error(str(e), extra=dict(
 					request = id(context),
 					endpoint = safe_name(endpoint),
 					endpoint_args = args,
@@ -170,10 +255,14 @@ class RemainderArgsExtension(ArgumentExtension):
 	provides = {'args', 'args.remainder'}
 	
 	def mutate(self, context, endpoint, args, kw):
-		if not context.request.remainder:
-			return
+		request = context.__dict__.get('request')
+		
+		if request:  # An extension may have manipulated the remainder of an already constructed request.
+			remainder = request.remainder
+		else:  # Otherwise what remains of `PATH_INFO` following dispatch is the remainder.
+			remainder = context.environ['PATH_INFO'].split('/')
 		
-		args.extend(i for i in context.request.remainder if i)
+		args.extend(i for i in remainder if i)
 
 
 class QueryStringArgsExtension(ArgumentExtension):
@@ -184,6 +273,9 @@ class QueryStringArgsExtension(ArgumentExtension):
 	provides = {'kwargs', 'kwargs.get'}
 	
 	def mutate(self, context, endpoint, args, kw):
+		if not context.environ.get('QUERY_STRING') or not plan(endpoint).named:
+			return
+		
 		self._process_flat_kwargs(context.request.GET, kw)
 
 
@@ -196,6 +288,15 @@ class FormEncodedKwargsExtension(ArgumentExtension):
 	provides = {'kwargs', 'kwargs.post'}
 	
 	def mutate(self, context, endpoint, args, kw):
+		environ = context.environ
+		content_type = _content_type(environ)
+		
+		if content_type not in FORM_TYPES or (not content_type and environ['REQUEST_METHOD'] != 'POST'):
+			return
+		
+		if not plan(endpoint).named:
+			return
+		
 		self._process_flat_kwargs(context.request.POST, kw)
 
 
@@ -208,7 +309,7 @@ class JSONKwargsExtension(ArgumentExtension):
 	provides = {'kwargs', 'kwargs.json'}
 	
 	def mutate(self, context, endpoint, args, kw):
-		if not context.request.content_type == 'application/json':
+		if _content_type(context.environ) != 'application/json' or not plan(endpoint).named:
 			return
 		
 		if not context.request.body:
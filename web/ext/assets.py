@@ -0,0 +1,193 @@
+# encoding: utf-8
+
+"""Asset fingerprinting: content-hashed URLs for static files, permitting browsers to cache them indefinitely."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import os
+import re
+
+from hashlib import sha256
+from os.path import abspath, join as pathjoin, relpath
+from threading import Lock
+from time import time
+
+from webob.exc import HTTPException
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'  # One year, the conventional maximum; see RFC 8246.
+
+
+# ## Extension
+
+class WebAssetsExtension(object):
+	"""Rewrite the URLs of static assets to include a hash of their content, delivering them as immutable.
+	
+	The `directories` map URL path prefixes, relative to the application root, to the filesystem paths whose files are
+	served there, typically by a `web.app.static` endpoint attached at the same path:
+	
+		class Root:
+			public = static('/path/to/public')
+		
+		app = Application(Root, extensions=[WebAssetsExtension({'/public': '/path/to/public'})])
+	
+	Each file is hashed on startup. The URL of a file, with a truncated hash of its content inserted prior to the
+	filename extension, is available using `context.asset`, e.g. for use in templates:
+	
+		context.asset('/public/css/site.css')  # "/public/css/site.3f2a9c1e4b5d.css"
+	
+	URLs not identifying a known file are returned unmodified. Requests for fingerprinted URLs are dispatched as if
+	for the original, and successful responses marked as immutable, so that browsers never revalidate them. Requests
+	bearing an outdated hash, as may be made by pages rendered prior to a change, are delivered the current content
+	marked as requiring revalidation.
+	
+	Files are hashed again, if modified, on each call to `refresh`; if `poll` is given, requests made more than that
+	many seconds after the last refresh trigger another, within the requesting thread.
+	"""
+	
+	__slots__ = ('directories', 'length', 'poll', 'pattern', 'files', 'urls', 'originals', 'refreshed', 'lock')
+	
+	first = True  # Requests must be rewritten prior to any other examination of the path.
+	provides = {'assets'}
+	
+	def __init__(self, directories, length=12, poll=None):
+		"""Configure the extension."""
+		
+		self.directories = {prefix.rstrip('/'): abspath(path) for prefix, path in directories.items()}
+		self.length = length
+		self.poll = poll
+		self.pattern = re.compile(r'^(.*/[^/]+)\.([0-9a-f]{%d})(\.[^./]+)?$' % length)
+		self.files = {}  # Path to a (modification time, size, hash) tuple.
+		self.urls = {}  # Original URL to fingerprinted URL.
+		self.originals = {}  # Fingerprinted URL to original URL.
+		self.refreshed = 0
+		self.lock = Lock()
+		
+		self.refresh()
+	
+	def start(self, context):
+		"""Expose URL fingerprinting as `context.asset`."""
+		
+		context.asset = self.url
+	
+	# ### Request-Local Callbacks
+	
+	def prepare(self, context):
+		"""Rewrite requests for fingerprinted URLs to refer to the original."""
+		
+		if self.poll and time() - self.refreshed > self.poll and self.lock.acquire(False):
+			try:
+				self.refresh()
+			finally:
+				self.lock.release()
+		
+		environ = context.environ
+		path = environ.get('PATH_INFO', '')
+		original = self.originals.get(path)
+		current = original is not None
+		
+		if not current:  # Possibly an outdated fingerprint of a known file.
+			match = None if path in self.urls else self.pattern.match(path)
+			
+			if not match:
+				return
+			
+			original = match.group(1) + (match.group(3) or '')
+			
+			if original not in self.urls:
+				return
+		
+		if __debug__:
+			log.debug("Rewriting fingerprinted asset URL.", extra=dict(request=id(context), path=path,
+					original=original, current=current))
+		
+		environ['PATH_INFO'] = original
+		context._asset = current
+	
+	def after(self, context):
+		"""Mark successful responses to fingerprinted URLs as immutable."""
+		
+		current = context.__dict__.pop('_asset', None)
+		
+		if current is None:
+			return
+		
+		response = context.response
+		
+		if isinstance(response, HTTPException) or response.status_int not in (200, 206):
+			return
+		
+		response.headers['Cache-Control'] = IMMUTABLE if current else 'no-cache'
+	
+	# ### Asset Management
+	
+	def url(self, url):
+		"""Return the fingerprinted form of the given URL, retaining any query string or fragment."""
+		
+		path, separator, remainder = url.partition('?') if '?' in url else url.partition('#')
+		fingerprinted = self.urls.get(path)
+		
+		if fingerprinted is None:
+			return url
+		
+		return fingerprinted + separator + remainder
+	
+	def refresh(self):
+		"""Scan the asset directories, hashing any new or modified files."""
+		
+		previous = self.files
+		files, urls, originals = {}, {}, {}
+		hashed = 0
+		
+		for prefix, base in self.directories.items():
+			for root, directories, names in os.walk(base):
+				for name in names:
+					path = pathjoin(root, name)
+					
+					try:
+						stat = os.stat(path)
+					except OSError:  # Removed during the scan, or a dangling symbolic link.
+						continue
+					
+					known = previous.get(path)
+					
+					if known and known[:2] == (stat.st_mtime_ns, stat.st_size):
+						digest = known[2]
+					else:
+						digest = self._hash(path)
+						hashed += 1
+					
+					files[path] = stat.st_mtime_ns, stat.st_size, digest
+					
+					url = prefix + '/' + relpath(path, base).replace(os.sep, '/')
+					stem, dot, extension = url.rpartition('.')
+					
+					if '/' in extension or not stem.rpartition('/')[2]:  # No extension; append the hash.
+						fingerprinted = url + '.' + digest
+					else:
+						fingerprinted = stem + '.' + digest + dot + extension
+					
+					urls[url] = fingerprinted
+					originals[fingerprinted] = url
+		
+		# Replaced as a whole; concurrent requests see either the prior state or the new.
+		self.files, self.urls, self.originals = files, urls, originals
+		self.refreshed = time()
+		
+		if __debug__:
+			log.debug("Fingerprinted static assets.", extra=dict(files=len(files), hashed=hashed))
+	
+	def _hash(self, path):
+		digest = sha256()
+		
+		with open(path, 'rb') as fh:
+			for chunk in iter(lambda: fh.read(65536), b''):
+				digest.update(chunk)
+		
+		return digest.hexdigest()[:self.length]
@@ -6,7 +6,7 @@
 
 from __future__ import unicode_literals
 
-from io import IOBase
+from io import IOBase, SEEK_END
 try:
 	IOBase = (IOBase, file)
 except:
@@ -18,21 +18,27 @@ except ImportError:
 	def _tmp(): yield None  # pragma: no cover
 	Generator = type(_tmp())
 
-from os.path import getmtime
+import mimetypes
+
+from os import fstat
 from time import mktime, gmtime
 from datetime import datetime
 from mimetypes import init, add_type, guess_type
 from collections import namedtuple
+from uuid import uuid4
 from webob import Request, Response
+from webob.exc import HTTPException
 
 from web.core.compat import str, unicode, Path
-from web.core.util import safe_name
+from web.core.util import lazy, safe_name
 
 
 # ## Module Globals
 
 log = __import__('logging').getLogger(__name__)
 
+BLOCK = 256 * 1024  # The number of bytes of a file to deliver at a time.
+
 
 # ## Helper Classes
 
@@ -45,6 +51,191 @@ class Bread(list):
 		return self[-1].path
 
 
+class FileBody(object):
+	"""A WSGI response body delivering an open file in large blocks, closing the file once delivered.
+	
+	Delivery begins at the current position of the file, continuing to its end, or for `length` bytes if given. Used
+	where the server offers no `wsgi.file_wrapper`. Reading a block at least the size of the file's own buffer reads
+	directly into the chunk produced, without passing through that buffer.
+	
+	Bodies of limited length are themselves file-like, to be handed to a `wsgi.file_wrapper` in place of the file.
+	"""
+	
+	__slots__ = ('file', 'remaining', 'block')
+	
+	def __init__(self, file, length=None, block=BLOCK):
+		self.file = file
+		self.remaining = length
+		self.block = block
+	
+	def __iter__(self):
+		read, block = self.read, self.block
+		chunk = read(block)
+		
+		while chunk:
+			yield chunk
+			chunk = read(block)
+	
+	def read(self, size=-1):
+		remaining = self.remaining
+		
+		if remaining is None:
+			return self.file.read(size)
+		
+		chunk = self.file.read(remaining if size is None or size < 0 else min(size, remaining))
+		self.remaining -= len(chunk)
+		
+		return chunk
+	
+	def fileno(self):
+		return self.file.fileno()
+	
+	def close(self):
+		self.file.close()
+
+
+class ByteRanges(object):
+	"""A WSGI response body delivering several ranges of an open file as a `multipart/byteranges` document.
+	
+	The file is positioned at the start of each range in turn. The total length of the document is available as
+	`length`.
+	"""
+	
+	__slots__ = ('file', 'parts', 'end', 'block', 'length')
+	
+	def __init__(self, file, ranges, size, content_type, boundary, block=BLOCK):
+		self.file = file
+		self.parts = [(
+				"--{}\r\nContent-Type: {}\r\nContent-Range: bytes {}-{}/{}\r\n\r\n".format(
+						boundary, content_type, start, stop - 1, size).encode('ascii'),
+				start,
+				stop,
+			) for start, stop in ranges]
+		self.end = "--{}--\r\n".format(boundary).encode('ascii')
+		self.block = block
+		self.length = sum(len(header) + stop - start + 2 for header, start, stop in self.parts) + len(self.end)
+	
+	def __iter__(self):
+		for header, start, stop in self.parts:
+			yield header
+			
+			self.file.seek(start)
+			
+			for chunk in FileBody(self.file, stop - start, self.block):
+				yield chunk
+			
+			yield b"\r\n"
+		
+		yield self.end
+	
+	def close(self):
+		self.file.close()
+
+
+# ## Helper Functions
+
+def file_etag(stat, encoding=None):
+	"""The entity tag of a file, given the result of a `stat` call, and the content coding it represents, if any.
+	
+	Derived from the modification time, to the nanosecond, and size; encoded variants are distinct representations.
+	"""
+	
+	return '{:x}-{:x}'.format(stat.st_mtime_ns, stat.st_size) + ('-' + encoding if encoding else '')
+
+
+def _ranges(header, size):
+	"""Interpret the value of a `Range` header as a list of `(start, stop)` byte offsets within a representation.
+	
+	Overlapping and adjacent ranges are merged. Returns `None` if the header is malformed or uses a unit other than
+	bytes, in which case it must be ignored, or an empty list if no range is satisfiable.
+	"""
+	
+	unit, _, specifiers = header.partition('=')
+	
+	if unit.strip().lower() != 'bytes':
+		return None
+	
+	ranges = []
+	count = 0
+	
+	for specifier in specifiers.split(','):
+		first, dash, last = (i.strip() for i in specifier.partition('-'))
+		
+		if not first and not dash:  # Tolerate empty list elements.
+			continue
+		
+		count += 1
+		
+		if not dash or (first and not first.isdigit()) or (last and not last.isdigit()) or not (first or last):
+			return None
+		
+		if not first:  # A suffix range: the final bytes of the representation.
+			if int(last):
+				ranges.append((max(0, size - int(last)), size))
+			
+			continue
+		
+		start = int(first)
+		
+		if last and int(last) < start:
+			return None
+		
+		if start < size:
+			ranges.append((start, min(int(last) + 1, size) if last else size))
+	
+	if not count:
+		return None
+	
+	merged = []
+	
+	for start, stop in sorted(ranges):
+		if merged and start <= merged[-1][1]:
+			merged[-1] = merged[-1][0], max(stop, merged[-1][1])
+		else:
+			merged.append((start, stop))
+	
+	return merged
+
+
+def _remainder(environ):
+	"""Determine the unprocessed path elements from the current `PATH_INFO`."""
+	
+	remainder = environ.get('PATH_INFO', '').split('/')
+	
+	if remainder and not remainder[0]:
+		del remainder[0]
+	
+	return remainder
+
+
+def _peek(environ):
+	"""Return the next `PATH_INFO` element without consuming it; equivalent to `Request.path_info_peek`."""
+	
+	path = environ.get('PATH_INFO', '')
+	
+	if not path:
+		return None
+	
+	return path.lstrip('/').partition('/')[0]
+
+
+def _pop(environ):
+	"""Move the next `PATH_INFO` element to `SCRIPT_NAME`; equivalent to `Request.path_info_pop`."""
+	
+	path = environ.get('PATH_INFO', '')
+	
+	if not path:
+		return None
+	
+	stripped = path.lstrip('/')
+	element, _, _ = stripped.partition('/')
+	
+	environ['SCRIPT_NAME'] = environ.get('SCRIPT_NAME', '') + path[:len(path) - len(stripped)] + element
+	environ['PATH_INFO'] = stripped[len(element):]
+	
+	return element
+
+
 
 # ## Extension
 
@@ -68,42 +259,73 @@ class BaseExtension(object):
 		init()
 		add_type('text/x-yaml', 'yml')
 		add_type('text/x-yaml', 'yaml')
+		mimetypes.encodings_map.setdefault('.zst', 'zstd')  # Precompressed static variants; see `web.app.static`.
 		
 		# Register the core views supported by the base framework.
 		register = context.view.register
 		register(type(None), self.render_none)
 		register(Response, self.render_response)
+		register(HTTPException, self.render_exception)
 		register(str, self.render_binary)
+		register(memoryview, self.render_binary)
 		register(unicode, self.render_text)
 		register(IOBase, self.render_file)
 		register(Generator, self.render_generator)
+		
+		# Bridge in WebOb `Request` and `Response` objects, constructed only when first accessed.
+		# Extensions shouldn't rely on these, using `environ` where possible instead.
+		context.request = lazy(self._request, 'request')
+		context.response = lazy(self._response, 'response')
+		
+		# Track the "breadcrumb list" of dispatch through distinct controllers.
+		context.path = lazy(self._path, 'path')
+	
+	# ### Request-Local Attributes
+	
+	@staticmethod
+	def _request(context):
+		"""Construct the WebOb `Request` for the current request context.
+		
+		The `remainder` attribute tracks the remaining (unprocessed) path elements.
+		"""
+		
+		request = Request(context.environ)
+		request.remainder = _remainder(context.environ)
+		
+		return request
+	
+	@staticmethod
+	def _response(context):
+		"""Construct the WebOb `Response` for the current request context.
+		
+		Any raw body deferred by the binary or textual views is applied to the response.
+		"""
+		
+		response = Response(request=context.__dict__.get('request'))
+		body = context.__dict__.pop('_body', None)
+		
+		if body is not None:
+			response.body = body
+		
+		return response
+	
+	@staticmethod
+	def _path(context):
+		return Bread()
 	
 	# ### Request-Level Callbacks
 	
 	def prepare(self, context):
-		"""Add the usual suspects to the context.
+		"""Prepare the request context.
 		
-		This adds `request`, `response`, and `path` to the `RequestContext` instance.
+		This makes the `request`, `response`, and `path` attributes available; these are constructed on first access.
 		"""
 		
 		if __debug__:
 			log.debug("Preparing request context.", extra=dict(request=id(context)))
 		
-		# Bridge in WebOb `Request` and `Response` objects.
-		# Extensions shouldn't rely on these, using `environ` where possible instead.
-		context.request = Request(context.environ)
-		context.response = Response(request=context.request)
-		
 		# Record the initial path representing the point where a front-end web server bridged to us.
-		context.environ['web.base'] = context.request.script_name
-		
-		# Track the remaining (unprocessed) path elements.
-		context.request.remainder = context.request.path_info.split('/')
-		if context.request.remainder and not context.request.remainder[0]:
-			del context.request.remainder[0]
-		
-		# Track the "breadcrumb list" of dispatch through distinct controllers.
-		context.path = Bread()
+		context.environ['web.base'] = context.environ.get('SCRIPT_NAME', '')
 	
 	def dispatch(self, context, consumed, handler, is_endpoint):
 		"""Called as dispatch descends into a tier.
@@ -111,7 +333,7 @@ class BaseExtension(object):
 		The base extension uses this to maintain the "current url".
 		"""
 		
-		request = context.request
+		environ = context.environ
 		
 		if __debug__:
 			log.debug("Handling dispatch event.", extra=dict(
@@ -122,7 +344,7 @@ class BaseExtension(object):
 				))
 		
 		# The leading path element (leading slash) requires special treatment.
-		if not consumed and context.request.path_info_peek() == '':
+		if not consumed and _peek(environ) == '':
 			consumed = ['']
 		
 		nConsumed = 0
@@ -132,16 +354,18 @@ class BaseExtension(object):
 				consumed = consumed.split('/')
 			
 			for element in consumed:
-				if element == context.request.path_info_peek():
-					context.request.path_info_pop()
+				if element == _peek(environ):
+					_pop(environ)
 					nConsumed += 1
 				else:
 					break
 		
 		# Update the breadcrumb list.
-		context.path.append(Crumb(handler, Path(request.script_name)))
+		context.path.append(Crumb(handler, Path(environ.get('SCRIPT_NAME', ''))))
+		
+		request = context.__dict__.get('request')
 		
-		if consumed:  # Lastly, update the remaining path element list.
+		if consumed and request:  # Lastly, update the remaining path element list, if a request has been constructed.
 			request.remainder = request.remainder[nConsumed:]
 	
 	# ### Views
@@ -157,37 +381,110 @@ class BaseExtension(object):
 		context.response = result
 		return True
 	
+	def render_exception(self, context, result):
+		"""Apply the response of a bare `HTTPException`, one wrapping another response rather than itself being one."""
+		context.response = result.wsgi_response
+		return True
+	
 	def render_binary(self, context, result):
-		"""Return binary responses unmodified."""
+		"""Return binary responses unmodified.
+		
+		If the response has not been constructed yet the body is deferred, allowing the application to skip
+		construction of the response entirely if no other extension requires it.
+		"""
+		
+		if isinstance(result, memoryview):
+			result = result.tobytes()
+		
+		if 'response' not in context.__dict__:
+			context._body = result
+			return True
+		
 		context.response.app_iter = iter((result, ))  # This wraps the binary string in a WSGI body iterable.
 		return True
 	
 	def render_text(self, context, result):
-		"""Return textual responses, encoding as needed."""
+		"""Return textual responses, encoding as needed.
+		
+		As per binary responses, the encoded body is deferred if the response has not been constructed yet.
+		"""
+		
+		if 'response' not in context.__dict__:
+			context._body = result.encode('utf-8')
+			return True
+		
 		context.response.text = result
 		return True
 	
 	def render_file(self, context, result):
-		"""Perform appropriate metadata wrangling for returned open file handles."""
+		"""Perform appropriate metadata wrangling for returned open file handles.
+		
+		Range requests, including those for multiple ranges and those conditional upon `If-Range`, are answered by
+		positioning the file at the start of each range requested. Files lacking a file descriptor, such as `BytesIO`
+		instances, are measured by seeking to their end, and are delivered without `Last-Modified` or `ETag` headers.
+		"""
 		if __debug__:
 			log.debug("Processing file-like object.", extra=dict(request=id(context), result=repr(result)))
 		
+		environ = context.environ
 		response = context.response
 		response.conditional_response = True
 		
-		modified = mktime(gmtime(getmtime(result.name)))
+		try:
+			stat = fstat(result.fileno())  # One system call against the open handle, rather than by path.
+		except OSError:  # Such as a `BytesIO` instance, which has no descriptor and no modification time.
+			stat = None
+			result.seek(0, SEEK_END)
+			size = result.tell()
+		else:
+			size = stat.st_size
+			response.last_modified = datetime.fromtimestamp(mktime(gmtime(stat.st_mtime)))
 		
-		response.last_modified = datetime.fromtimestamp(modified)
-		ct, ce = guess_type(result.name)
+		name = getattr(result, 'name', None)
+		ct, ce = guess_type(name) if isinstance(name, unicode) else (None, None)
 		if not ct: ct = 'application/octet-stream'
 		response.content_type, response.content_encoding = ct, ce
-		response.etag = unicode(modified)
+		if stat: response.etag = file_etag(stat, ce)
+		response.accept_ranges = 'bytes'
+		
+		ranges = None
+		
+		if 'HTTP_RANGE' in environ and environ['REQUEST_METHOD'] in ('GET', 'HEAD') and response.status_int == 200 \
+				and response in context.request.if_range:
+			ranges = _ranges(environ['HTTP_RANGE'], size)
+		
+		# Permit the server to deliver the file itself, such as by using `sendfile`, if it is able to.
+		wrapper = environ.get('wsgi.file_wrapper')
+		
+		if ranges is None:  # Deliver the whole file.
+			result.seek(0)
+			response.app_iter = wrapper(result, BLOCK) if wrapper else FileBody(result)
+			response.content_length = size  # Assigned after the body, which would otherwise clear it.
+			return True
+		
+		if not ranges:
+			result.close()
+			response.status_int = 416
+			response.body = b''
+			response.headers['Content-Range'] = 'bytes */{}'.format(size)
+			return True
+		
+		response.status_int = 206
 		
-		result.seek(0, 2)  # Seek to the end of the file.
-		response.content_length = result.tell()
+		if len(ranges) == 1:
+			start, stop = ranges[0]
+			result.seek(start)
+			body = FileBody(result, stop - start)
+			response.app_iter = wrapper(body, BLOCK) if wrapper else body
+			response.content_length = stop - start
+			response.headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop - 1, size)
+			return True
 		
-		result.seek(0)  # Seek back to the start of the file.
-		response.body_file = result
+		boundary = uuid4().hex
+		body = ByteRanges(result, ranges, size, response.headers['Content-Type'], boundary)
+		response.app_iter = body
+		response.content_length = body.length
+		response.headers['Content-Type'] = 'multipart/byteranges; boundary=' + boundary
 		
 		return True
 	
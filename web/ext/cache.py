@@ -0,0 +1,223 @@
+# encoding: utf-8
+
+"""Response caching: serve rendered responses to anonymous, idempotent requests without processing them again."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+from time import time
+
+from marrow.package.loader import load
+from webob import Response
+from webob.exc import HTTPException
+
+from web.cache.memory import MemoryCache
+from web.core.compat import unicode
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+# Statuses cacheable by default, per RFC 9111 § 4.2.2, excluding those which are rarely useful to cache.
+CACHEABLE = {200, 203, 204, 300, 301, 308, 404, 410}
+
+# Response headers which are specific to an individual delivery of a response, or used only by this extension.
+EXCLUDED = {'age', 'connection', 'date', 'keep-alive', 'cache-tag', 'transfer-encoding'}
+
+
+# ## Extension
+
+class CacheExtension(object):
+	"""Store rendered responses, delivering them again to matching requests without dispatch or endpoint execution.
+	
+	Only anonymous `GET` and `HEAD` requests, those lacking both `Authorization` and `Cookie` headers, are served from
+	the cache, and only responses to such `GET` requests are recorded. Cached responses are identified by scheme, host,
+	path, and query string (normalized to ignore argument order), along with the values of any request headers the
+	response declares it varies upon. Additional headers to vary upon for all responses may be given as `vary`.
+	
+	The `Cache-Control` header of the response is honoured; responses marked `no-store`, `no-cache`, or `private` are
+	not recorded, and `s-maxage` or `max-age` directives, if present, determine the duration responses are retained
+	for. Lacking either, responses are retained for `ttl` seconds. Responses setting cookies, varying on `*`, larger
+	than `limit` bytes, streamed without a declared length, or which are unrendered HTTP exceptions, are not recorded.
+	
+	Responses may be tagged by endpoints using a `Cache-Tag` header of comma-separated tags, which is removed prior to
+	delivery. All responses with a given tag can then be discarded using `context.cache.invalidate(tag)`.
+	
+	The `cache` storage may be a storage instance, or the name of a `web.cache` backend (such as `memory`, `mmap`, or
+	`sqlite`) to construct using any additional keyword arguments. It defaults to an in-process `MemoryCache` of 64 MiB.
+	For cache storage shared between the worker processes of a host:
+	
+		app = Application(Root, extensions=[CacheExtension('mmap', path='/run/myapp/cache')])
+	
+	If a `header` is named, it will be set to `HIT` or `MISS` to indicate the source of each response.
+	"""
+	
+	__slots__ = ('cache', 'ttl', 'vary', 'limit', 'header')
+	
+	first = True  # A cache hit short-circuits all further preparation.
+	uses = {'analytics'}  # Permit timing to include cache hits.
+	provides = {'cache'}
+	
+	def __init__(self, cache=None, ttl=60, vary=(), limit=1024 * 1024, header='X-Cache', **options):
+		"""Configure the extension."""
+		
+		if cache is None:
+			cache = MemoryCache(**options)
+		
+		elif isinstance(cache, unicode):
+			cache = load(cache, 'web.cache')(**options)
+		
+		self.cache = cache
+		self.ttl = ttl
+		self.vary = tuple(sorted({self._name(header) for header in vary}))
+		self.limit = limit
+		self.header = header
+	
+	def start(self, context):
+		"""Expose the cache storage as `context.cache`, and record responses prior to other `after` callbacks.
+		
+		Responses are recorded as rendered; per-delivery headers added by other extensions are not retained.
+		"""
+		
+		context.cache = self.cache
+		
+		signal = context.extension.signal
+		signal.after = (self._store, ) + signal.after
+	
+	# ### Request-Local Callbacks
+	
+	def prepare(self, context):
+		"""Deliver a cached response if one is available."""
+		
+		environ = context.environ
+		
+		if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+			return
+		
+		if 'HTTP_AUTHORIZATION' in environ or 'HTTP_COOKIE' in environ:  # Responses may be personalized.
+			return
+		
+		primary = self._primary(environ)
+		vary = self.cache.get('vary ' + primary)
+		entry = self.cache.get(self._key(primary, self.vary if vary is None else vary, environ))
+		
+		if entry is None:
+			context._cache = primary
+			return
+		
+		if __debug__:
+			log.debug("Delivering cached response.", extra=dict(request=id(context), key=primary))
+		
+		status, headers, body, stored = entry
+		headers = list(headers)
+		headers.append(('Age', str(max(0, int(time() - stored)))))
+		
+		if self.header:
+			headers.append((self.header, 'HIT'))
+		
+		raise HTTPException(status, Response(status=status, headerlist=headers, body=body, conditional_response=True))
+	
+	def _store(self, context):
+		"""Record the rendered response, if cacheable."""
+		
+		primary = context.__dict__.pop('_cache', None)
+		
+		if primary is None:
+			return
+		
+		response = context.response
+		
+		if self.header:
+			response.headers[self.header] = 'MISS'
+		
+		tags = response.headers.pop('Cache-Tag', '')
+		
+		if context.environ['REQUEST_METHOD'] != 'GET' or isinstance(response, HTTPException):
+			return
+		
+		if response.status_int not in CACHEABLE or 'Set-Cookie' in response.headers:
+			return
+		
+		ttl = self._ttl(response)
+		vary = response.vary or ()
+		
+		if not ttl or '*' in vary:
+			return
+		
+		length = response.content_length
+		
+		# Streamed bodies of unknown length are not buffered to find out; they are delivered as they are produced.
+		if length is None and not isinstance(response.app_iter, (list, tuple)):
+			return
+		
+		if self.limit and (length or 0) > self.limit:
+			return
+		
+		body = response.body
+		
+		if self.limit and len(body) > self.limit:
+			return
+		
+		tags = tuple(tag.strip() for tag in tags.split(',') if tag.strip())
+		vary = tuple(sorted(set(self.vary).union(self._name(header) for header in vary)))
+		headers = tuple((name, value) for name, value in response.headerlist
+				if name.lower() not in EXCLUDED and name != self.header)
+		size = len(body) + sum(len(name) + len(value) for name, value in headers)
+		
+		entry = (response.status, headers, body, time())
+		
+		self.cache.set('vary ' + primary, vary, ttl)
+		self.cache.set(self._key(primary, vary, context.environ), entry, ttl, tags, size)
+	
+	# ### Utility Methods
+	
+	@staticmethod
+	def _name(header):
+		"""Translate a header name into its WSGI environment key."""
+		
+		name = header.upper().replace('-', '_')
+		return name if name in ('CONTENT_TYPE', 'CONTENT_LENGTH') else 'HTTP_' + name
+	
+	@staticmethod
+	def _primary(environ):
+		"""Identify the resource requested: the scheme, host, path, and normalized query string."""
+		
+		query = environ.get('QUERY_STRING', '')
+		
+		if '&' in query:
+			query = '&'.join(sorted(i for i in query.split('&') if i))
+		
+		return ''.join((
+				environ['wsgi.url_scheme'], '://',
+				environ.get('HTTP_HOST') or environ.get('SERVER_NAME', ''),
+				environ.get('SCRIPT_NAME', ''),
+				environ.get('PATH_INFO', ''),
+				'?', query,
+			))
+	
+	@staticmethod
+	def _key(primary, vary, environ):
+		"""Identify the specific variant of a resource requested."""
+		
+		return '\n'.join(('response ' + primary, ) + tuple(environ.get(name, '') for name in vary))
+	
+	def _ttl(self, response):
+		"""Determine the duration a response may be retained for, in seconds."""
+		
+		if 'Cache-Control' not in response.headers:
+			return self.ttl
+		
+		control = response.cache_control
+		
+		if control.no_store or control.no_cache or control.private:
+			return 0
+		
+		if control.s_max_age is not None:
+			return control.s_max_age
+		
+		if control.max_age is not None:
+			return control.max_age
+		
+		return self.ttl
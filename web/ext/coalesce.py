@@ -0,0 +1,198 @@
+# encoding: utf-8
+
+"""Request coalescing: a single execution of an endpoint serves all identical requests arriving concurrently."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import threading
+
+from asyncio import get_running_loop
+from inspect import isclass, isroutine
+from webob.exc import HTTPException
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+
+# ## Helper Classes
+
+class Flight(object):
+	"""An execution of an endpoint in progress, awaited by any number of identical requests."""
+	
+	__slots__ = ('event', 'response', 'waiting')
+	
+	def __init__(self):
+		# Looked up on each use, permitting greenlet servers to monkey-patch the threading module after our import.
+		self.event = threading.Event()
+		self.response = None
+		self.waiting = 0
+	
+	def __repr__(self):
+		return "{0.__class__.__name__}(waiting={0.waiting}, landed={1})".format(self, self.event.is_set())
+
+
+# ## Extension
+
+class CoalesceExtension(object):
+	"""Collapse concurrent identical requests into a single execution of their endpoint.
+	
+	The first request for a given endpoint, path, and set of arguments (as produced by the `mutate` chain) executes
+	the endpoint as normal. Identical requests arriving while it is in progress wait, for no more than `timeout`
+	seconds, then each receive a copy of the rendered response, without executing the endpoint themselves. Once the
+	first request has been rendered the next identical request begins anew; nothing is cached.
+	
+	Only requests using one of the given `methods` are coalesced, and only if the endpoint arguments are hashable.
+	Endpoints whose responses depend on request state other than their path and arguments, such as the user's session,
+	must not be coalesced; supply a `key` callable accepting `(context, endpoint, args, kwargs)` and returning a
+	hashable key, or `None` to execute the request independently.
+	
+	Should the first request fail, time out, result in an HTTP exception, or produce a response setting cookies, those
+	waiting execute the endpoint themselves.
+	
+	Waiting blocks the current thread; under greenlet-based servers the standard library must be monkey-patched, as it
+	must be for any other blocking code. Under ASGI waiting is performed off the event loop.
+	"""
+	
+	__slots__ = ('methods', 'timeout', 'key', 'flights', 'lock')
+	
+	provides = {'coalesce'}
+	uses = {'analytics'}  # Analytics brackets the mutate chain; we must attach to it afterwards.
+	
+	def __init__(self, methods=('GET', 'HEAD'), timeout=30, key=None):
+		"""Configure the extension."""
+		
+		self.methods = set(methods)
+		self.timeout = timeout
+		self.key = key or self._key
+		self.flights = {}
+		self.lock = threading.Lock()
+	
+	def start(self, context):
+		"""Attach to the end of the mutate chain, once all arguments have been collected, and start of after processing.
+		
+		The response is captured as rendered, prior to the `after` callbacks of other extensions; each waiting request
+		executes these for itself.
+		"""
+		
+		signal = context.extension.signal
+		
+		signal.mutate = signal.mutate + (self._mutate, )
+		signal.after = (self._after, ) + signal.after
+	
+	# ### Request-Local Callbacks
+	
+	def _mutate(self, context, handler, args, kw):
+		"""Join a flight already in progress for this request, or depart on a new one."""
+		
+		if context.environ['REQUEST_METHOD'] not in self.methods:
+			return
+		
+		try:
+			key = self.key(context, handler, args, kw)
+			
+			if key is None:
+				return
+			
+			with self.lock:
+				flight = self.flights.get(key)
+				
+				if flight is None:  # We're first; execute the endpoint as normal.
+					context._flight = key, self.flights.setdefault(key, Flight())
+					return
+				
+				flight.waiting += 1
+		
+		except TypeError:  # Unhashable arguments can not be coalesced.
+			return
+		
+		if __debug__:
+			log.debug("Awaiting identical request in progress.", extra=dict(request=id(context), flight=repr(flight)))
+		
+		if 'asgi.scope' in context.environ:  # Don't block the event loop.
+			return self._await(flight)
+		
+		self._land(flight, flight.event.wait(self.timeout))
+	
+	def _after(self, context):
+		"""Share the rendered response with any identical requests waiting upon it."""
+		
+		if '_flight' in context.__dict__:
+			self._depart(context, context.response)
+	
+	def done(self, context):
+		"""Release any waiting requests should this one have failed prior to rendering."""
+		
+		if '_flight' in context.__dict__:
+			self._depart(context, None)
+	
+	# ### Utility Methods
+	
+	@staticmethod
+	def _key(context, handler, args, kw):
+		"""The default key: the requested path and query string, endpoint function, and endpoint arguments.
+		
+		The function is used in place of a bound method, and the class in place of a callable instance, as controllers
+		are instantiated per request. The context, passed as an argument to some endpoints, is omitted, and the lists
+		produced by repeated query string arguments are used as tuples.
+		"""
+		
+		environ = context.environ
+		endpoint = getattr(handler, '__func__', handler)
+		
+		if not isroutine(endpoint) and not isclass(endpoint):
+			endpoint = type(endpoint)
+		
+		return (
+				environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '') + '?' + environ.get('QUERY_STRING', ''),
+				endpoint,
+				tuple(tuple(i) if isinstance(i, list) else i for i in args if i is not context),
+				frozenset((name, tuple(value) if isinstance(value, list) else value) for name, value in kw.items()),
+			)
+	
+	def _depart(self, context, response):
+		"""Complete the flight of the given request, sharing the response with any requests waiting upon it.
+		
+		The response is only copied, which requires reading its body in full, if anything is waiting; otherwise
+		streamed and file bodies are delivered as normal.
+		"""
+		
+		key, flight = context.__dict__.pop('_flight')
+		
+		with self.lock:  # Later requests begin a new flight; none may join this one once removed.
+			if self.flights.get(key) is flight:
+				del self.flights[key]
+		
+		if flight.waiting and response is not None and self._shareable(response):
+			flight.response = response.copy()
+		
+		flight.event.set()
+	
+	@staticmethod
+	def _shareable(response):
+		"""Determine if a response may be shared with other requests.
+		
+		Exceptions render their bodies per request, cookies are personal, and partial content answers a specific range
+		request; none are shared.
+		"""
+		
+		if isinstance(response, HTTPException):
+			return False
+		
+		return 'Set-Cookie' not in response.headers and response.status_int != 206
+	
+	async def _await(self, flight):
+		self._land(flight, await get_running_loop().run_in_executor(None, flight.event.wait, self.timeout))
+	
+	def _land(self, flight, completed):
+		"""Adopt the response of a completed flight as the result of the waiting request."""
+		
+		response = flight.response if completed else None
+		
+		if response is None:  # The flight failed or timed out; execute the endpoint ourselves.
+			return
+		
+		raise HTTPException(response.status, response.copy())
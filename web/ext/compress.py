@@ -0,0 +1,255 @@
+# encoding: utf-8
+
+"""Response compression: negotiate a content coding with the client and apply it, streaming if required."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+from functools import partial
+from zlib import DEFLATED, MAX_WBITS, Z_DEFAULT_COMPRESSION, Z_SYNC_FLUSH, compressobj
+
+try:
+	from compression import zstd
+except ImportError:
+	zstd = None  # Zstandard requires Python 3.14 or later.
+
+from webob.exc import HTTPException
+
+from web.core.util import LRUCache
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+# Content types whose representations are already compressed, gaining nothing from further compression.
+INCOMPRESSIBLE = ('image/', 'audio/', 'video/', 'font/woff', 'application/zip', 'application/gzip',
+		'application/x-gzip', 'application/zstd', 'application/x-bzip2', 'application/x-xz', 'application/x-7z',
+		'application/x-rar', 'application/pdf', 'application/octet-stream')
+
+# Exceptions to the above, being textual.
+COMPRESSIBLE = ('image/svg+xml', 'image/x-icon', 'image/bmp')
+
+# Statuses which carry no body.
+EMPTY = {204, 304}
+
+
+# ## Encoders
+# Each produces, for a given compression level, a callable to compress a chunk, one to flush all pending output, and
+# one to complete the stream; each returns the bytes produced.
+
+def _zlib(wbits, level):
+	compressor = compressobj(Z_DEFAULT_COMPRESSION if level is None else level, DEFLATED, wbits)
+	return compressor.compress, partial(compressor.flush, Z_SYNC_FLUSH), compressor.flush
+
+
+def _zstd(level):  # pragma: no cover - Python 3.14 and later.
+	compressor = zstd.ZstdCompressor(level)
+	return compressor.compress, partial(compressor.flush, compressor.FLUSH_BLOCK), compressor.flush
+
+
+ENCODERS = {
+		'gzip': partial(_zlib, MAX_WBITS | 16),  # The zlib library offsets the window size to select the gzip format.
+		'deflate': partial(_zlib, MAX_WBITS),  # HTTP's "deflate" coding is the zlib format, per RFC 9110 § 8.4.1.2.
+	}
+
+if zstd is not None:  # pragma: no cover
+	ENCODERS['zstd'] = _zstd
+
+
+# ## Utility Functions
+
+def compressible(content_type):
+	"""Determine if content of the given type is worth compressing."""
+	
+	if not content_type:
+		return False
+	
+	return content_type.startswith(COMPRESSIBLE) or not content_type.startswith(INCOMPRESSIBLE)
+
+
+def negotiate(header, offered):
+	"""Select a content coding from those offered, in order of preference, given an `Accept-Encoding` header value.
+	
+	The client's preference, by quality value, takes precedence. Returns `None` if no offered coding is acceptable.
+	"""
+	
+	accepted = {}
+	
+	for part in header.lower().split(','):
+		name, _, parameters = part.partition(';')
+		quality = 1.0
+		
+		for parameter in parameters.split(';'):
+			key, _, value = parameter.partition('=')
+			
+			if key.strip() == 'q':
+				try:
+					quality = float(value)
+				except ValueError:
+					quality = 0.0
+		
+		accepted[name.strip()] = quality
+	
+	default = accepted.get('*', 0.0)
+	best, encoding = 0.0, None
+	
+	for name in offered:  # Ties are won by the earliest offered.
+		quality = accepted.get(name, default)
+		
+		if quality > best:
+			best, encoding = quality, name
+	
+	return encoding
+
+
+# ## Helper Classes
+
+class Compressed(object):
+	"""A WSGI response body incrementally compressing another.
+	
+	Closing this body closes the underlying one, even if iteration never began, as is the case for `HEAD` requests.
+	"""
+	
+	__slots__ = ('body', 'compress', 'flush', 'finish')
+	
+	def __init__(self, body, compress, flush, finish):
+		self.body = body
+		self.compress = compress
+		self.flush = flush
+		self.finish = finish
+	
+	def __iter__(self):
+		compress, flush = self.compress, self.flush
+		
+		for chunk in self.body:
+			if not chunk:
+				continue
+			
+			chunk = compress(chunk)
+			
+			if flush:
+				chunk += flush()
+			
+			if chunk:
+				yield chunk
+		
+		yield self.finish()
+	
+	def close(self):
+		if hasattr(self.body, 'close'):
+			self.body.close()
+
+
+# ## Extension
+
+class CompressionExtension(object):
+	"""Compress responses using the best content coding acceptable to the client.
+	
+	Codings are offered in the order of preference given as `encodings`, defaulting to `zstd` (where the interpreter
+	provides `compression.zstd`), then `gzip`, then `deflate`; the client's preference, by quality value, takes
+	precedence. A compression `level` may be given per coding.
+	
+	Bodies smaller than `minimum` bytes, responses already bearing a `Content-Encoding`, range requests, and content
+	types which are typically already compressed (images, media, and archives) are delivered unmodified.
+	
+	Bodies already rendered in full are compressed at once. Others, such as those of streamed generators and files, are
+	compressed incrementally as they are delivered. If `flush` is enabled, any output pending within the compressor is
+	flushed each time the underlying body produces a chunk, so each chunk reaches the client as soon as it would have
+	uncompressed, at some cost in compression ratio; this is desirable for progressively rendered pages and event
+	streams.
+	"""
+	
+	__slots__ = ('encodings', 'levels', 'minimum', 'flush', '_negotiated')
+	
+	provides = {'compression'}
+	
+	def __init__(self, encodings=None, level=None, minimum=512, flush=True):
+		"""Configure the extension."""
+		
+		if encodings is None:
+			encodings = [i for i in ('zstd', 'gzip', 'deflate') if i in ENCODERS]
+		
+		self.encodings = tuple(i for i in encodings if i in ENCODERS)
+		self.levels = level if isinstance(level, dict) else {i: level for i in self.encodings}
+		self.minimum = minimum
+		self.flush = flush
+		
+		self._negotiated = LRUCache(128)  # Clients tend to send a small number of distinct headers.
+	
+	# ### Request-Local Callbacks
+	
+	def after(self, context):
+		"""Compress the response, if acceptable to the client and worth doing."""
+		
+		environ = context.environ
+		
+		if 'response' not in context.__dict__:  # Only a raw body is present; avoid constructing the response if small.
+			body = context.__dict__.get('_body')
+			
+			if body is None or len(body) < self.minimum:
+				return
+		
+		response = context.response
+		
+		if isinstance(response, HTTPException) or response.status_int in EMPTY or response.content_encoding:
+			return
+		
+		if not compressible(response.content_type):
+			return
+		
+		vary = response.vary or ()
+		
+		if 'Accept-Encoding' not in vary:
+			response.vary = tuple(vary) + ('Accept-Encoding', )
+		
+		length = response.content_length
+		
+		if length is not None and length < self.minimum or 'HTTP_RANGE' in environ:
+			return
+		
+		encoding = self._negotiate(environ.get('HTTP_ACCEPT_ENCODING', ''))
+		
+		if encoding is None:
+			return
+		
+		compress, flush, finish = ENCODERS[encoding](self.levels.get(encoding))
+		
+		if isinstance(response.app_iter, (list, tuple)):  # Already rendered; compress as a whole.
+			body = response.body
+			
+			if len(body) < self.minimum:
+				return
+			
+			response.body = compress(body) + finish()
+		
+		else:
+			response.app_iter = Compressed(response.app_iter, compress, flush if self.flush else None, finish)
+		
+		response.content_encoding = encoding
+		
+		etag = response.headers.get('ETag')
+		
+		if etag and not etag.startswith('W/'):  # The representation differs, but is semantically equivalent.
+			response.headers['ETag'] = 'W/' + etag
+		
+		if __debug__:
+			log.debug("Compressing response.", extra=dict(request=id(context), encoding=encoding))
+	
+	# ### Utility Methods
+	
+	def _negotiate(self, header):
+		"""Select the content coding to use given the value of an `Accept-Encoding` header, if any."""
+		
+		if not header:
+			return None
+		
+		encoding = self._negotiated.get(header, False)
+		
+		if encoding is not False:
+			return encoding
+		
+		encoding = self._negotiated[header] = negotiate(header, self.encodings)
+		
+		return encoding
@@ -4,10 +4,10 @@
 
 from __future__ import unicode_literals
 
-from threading import local
-
 from marrow.package.loader import traverse
 
+from web.core.util import ContextLocal
+
 
 # ## Module Globals
 
@@ -23,6 +23,10 @@ class ThreadLocalExtension(object):
 	This provides a convienent "superglobal" variable where you can store per-thread data.
 	
 	While the context itself is cleaned up after each call, any data you add won't be.  These are not request-locals.
+	
+	When served via ASGI the storage is local to each request's task rather than to a thread, and is visible within
+	synchronous endpoints executed in worker threads. Assignments made within such an endpoint are not visible to
+	extension callbacks afterwards.
 	"""
 	
 	first = True
@@ -31,7 +35,7 @@ class ThreadLocalExtension(object):
 	def __init__(self, where='web.core:local'):
 		"""Initialize thread local storage for the context.
 		
-		By default the `local` object in the `web.core` package will be populated as a `threading.local` pool. The
+		By default the `local` object in the `web.core` package will be populated as a `ContextLocal` pool. The
 		context, during a request, can then be accessed as `web.core.local.context`. Your own extensions can add
 		additional arbitrary data to this pool.
 		"""
@@ -61,7 +65,7 @@ class ThreadLocalExtension(object):
 			self.local = getattr(module, name)
 			self.preserve = True
 		else:
-			self.local = local()
+			self.local = ContextLocal()
 			setattr(module, name, self.local)
 		
 		self.local.context = context  # Main thread application context.
@@ -88,5 +92,8 @@ class ThreadLocalExtension(object):
 		if __debug__:
 			log.debug("Cleaning up thread local request context.")
 		
-		del self.local.context
+		try:
+			del self.local.context
+		except AttributeError:  # Preparation may have been cut short, e.g. by a cache hit.
+			pass
 
@@ -0,0 +1,241 @@
+# encoding: utf-8
+
+"""A pre-forking multi-process server adapter, wrapping another adapter within each worker process."""
+
+# ## Imports
+
+from __future__ import unicode_literals
+
+import gc
+import os
+import signal
+import socket
+
+from time import sleep, time
+
+from marrow.package.loader import load
+
+
+# ## Module Globals
+
+log = __import__('logging').getLogger(__name__)
+
+# Workers exiting sooner than this many seconds after being spawned are assumed to be failing on startup.
+BACKOFF = 1
+
+
+# ## Helper Functions
+
+def listen(host, port, backlog=1024, reuse_port=False):
+	"""Construct a listening TCP socket, optionally permitting other sockets to bind to the same address."""
+	
+	family = socket.AF_INET6 if ':' in host else socket.AF_INET
+	return socket.create_server((host, int(port)), family=family, backlog=backlog, reuse_port=reuse_port)
+
+
+def _interrupt(signum, frame):
+	"""Translate termination requests into the exception `Application.serve` expects to end service."""
+	
+	raise KeyboardInterrupt()
+
+
+def _ignore(signum, frame):
+	"""Signals are processed by the supervisor's main loop, which is awoken by their delivery."""
+	
+	pass
+
+
+def _worker(server, application, host, port, sock, backlog, options):
+	"""Execute the inner server adapter within a freshly forked worker process. Never returns."""
+	
+	signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+	signal.signal(signal.SIGHUP, signal.SIG_IGN)  # Reloading is managed by the supervisor, which replaces us.
+	signal.signal(signal.SIGTERM, _interrupt)
+	signal.signal(signal.SIGINT, signal.default_int_handler)
+	
+	code = 0
+	
+	try:
+		try:
+			if sock is None:  # Each worker binds its own socket and the kernel balances connections between them.
+				sock = listen(host, port, backlog, True)
+			
+			server(application, host, port, socket=sock, **options)
+		
+		except KeyboardInterrupt:
+			pass
+		
+		# Permit requests in progress to complete; only the supervisor executes `stop` callbacks.
+		if hasattr(application, 'drain') and not application.drain():
+			log.warning("Worker shutdown deadline exceeded with requests in progress.", extra=dict(pid=os.getpid()))
+	
+	except KeyboardInterrupt:  # Interrupted again, while draining.
+		pass
+	
+	except BaseException:
+		log.exception("Worker process failed.", extra=dict(pid=os.getpid()))
+		code = 1
+	
+	finally:
+		os._exit(code)  # Never return into the supervisor's stack, or execute its cleanup.
+
+
+# ## Server Adapter
+
+def serve(application, host='127.0.0.1', port=8080, workers=None, server='waitress', reuse_port=None, backlog=1024,
+		**options):
+	"""A pre-forking supervisor, running the given inner server adapter within each of a number of worker processes.
+	
+	The application is constructed once in the parent, which then freezes the garbage collector's view of existing
+	objects (see `gc.freeze`) so they remain shared, copy-on-write, by the forked workers. The number of `workers`
+	defaults to the number of processors available.
+	
+	Where the platform supports `SO_REUSEPORT` each worker binds its own listening socket to the address, with the
+	kernel distributing connections between them; otherwise, or if `reuse_port` is falsy, one socket is bound by the
+	parent and shared. The inner `server` adapter must accept the listening socket to use as a `socket` keyword
+	argument; of the bundled adapters `waitress` and `wsgiref` do. Any additional options are passed through to it.
+	
+	Workers which exit are replaced. Workers asked to exit stop accepting connections then wait for requests in
+	progress to complete, up to the application's `drain` deadline, if configured; as the signal interrupts the main
+	thread, only multi-threaded inner servers (such as `waitress`) are able to complete requests this way. Upon
+	`SIGHUP` the application is reloaded within the parent, executing `graceful` extension callbacks, then each worker
+	is replaced in turn: a new worker is started from the reloaded parent prior to the old one being asked to exit, and
+	the old worker must finish before the next is replaced. On interrupt (^C) or `SIGTERM` the workers are terminated
+	and this function returns, permitting `Application.serve` to execute `stop` extension callbacks once, in the parent
+	process.
+	"""
+	
+	if not hasattr(os, 'fork'):  # pragma: no cover
+		raise NotImplementedError("The pre-forking server requires a platform supporting fork().")
+	
+	if isinstance(server, str):
+		server = load(server, 'web.server')
+	
+	workers = int(workers or os.cpu_count() or 1)
+	
+	if reuse_port is None:
+		reuse_port = hasattr(socket, 'SO_REUSEPORT')
+	
+	if reuse_port:  # Verify the address is available before forking, but do not accept connections on it here.
+		listen(host, port, backlog, True).close()
+		shared = None
+	else:
+		shared = listen(host, port, backlog)
+	
+	children = {}  # Mapping of worker process ID to the time it was spawned.
+	
+	def spawn():
+		pid = os.fork()
+		
+		if not pid:
+			signal.set_wakeup_fd(-1)
+			os.close(wake)
+			os.close(alarm)
+			_worker(server, application, host, port, shared, backlog, options)
+		
+		children[pid] = time()
+	
+	def retire(pid):
+		"""Ask a worker to exit, waiting for it to do so."""
+		
+		children.pop(pid, None)
+		
+		try:
+			os.kill(pid, signal.SIGTERM)
+			os.waitpid(pid, 0)
+		except (ProcessLookupError, ChildProcessError):  # pragma: no cover
+			pass
+	
+	def reap():
+		"""Collect the status of exited workers, replacing them."""
+		
+		while children:
+			try:
+				pid, status = os.waitpid(-1, os.WNOHANG)
+			except ChildProcessError:  # pragma: no cover
+				return
+			
+			if not pid:
+				return
+			
+			started = children.pop(pid, None)
+			
+			if started is None:  # pragma: no cover
+				continue
+			
+			log.warning("Worker process exited; replacing.", extra=dict(pid=pid, status=status))
+			
+			if time() - started < BACKOFF:  # Avoid rapidly cycling workers which immediately fail.
+				sleep(BACKOFF)
+			
+			spawn()
+	
+	def reload():
+		log.info("Reloading; replacing worker processes.", extra=dict(workers=len(children)))
+		
+		if hasattr(application, 'reload'):
+			application.reload()
+		
+		for pid in list(children):
+			spawn()
+			retire(pid)
+	
+	print("serving on http://{0}:{1} with {2} workers".format(host, port, workers))
+	
+	# Move everything allocated thus far, i.e. the application, out of reach of collection; this prevents the
+	# collector from touching, thus copying, memory pages shared with the workers.
+	gc.collect()
+	gc.freeze()
+	
+	# Signals are delivered through a pipe to be handled by our main loop, not arbitrarily within our own code.
+	wake, alarm = os.pipe()
+	os.set_blocking(alarm, False)
+	
+	handled = (signal.SIGCHLD, signal.SIGHUP, signal.SIGTERM, signal.SIGINT)
+	previous = {signum: signal.signal(signum, _ignore) for signum in handled}
+	previous_wakeup = signal.set_wakeup_fd(alarm)
+	
+	try:
+		for i in range(workers):
+			spawn()
+		
+		while True:
+			received = set(os.read(wake, 512))
+			
+			if received & {signal.SIGTERM, signal.SIGINT}:
+				break
+			
+			if signal.SIGCHLD in received:
+				reap()
+			
+			if signal.SIGHUP in received:
+				reload()
+	
+	finally:
+		signal.set_wakeup_fd(previous_wakeup)
+		signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+		
+		for pid in children:
+			try:
+				os.kill(pid, signal.SIGTERM)
+			except ProcessLookupError:  # pragma: no cover
+				pass
+		
+		for pid in children:
+			try:
+				os.waitpid(pid, 0)
+			except ChildProcessError:  # pragma: no cover
+				pass
+		
+		children.clear()
+		
+		for signum, handler in previous.items():
+			signal.signal(signum, handler)
+		
+		os.close(wake)
+		os.close(alarm)
+		
+		if shared is not None:
+			shared.close()
+		
+		gc.unfreeze()
@@ -7,7 +7,7 @@
 from __future__ import unicode_literals, print_function
 
 from wsgiref.handlers import CGIHandler
-from wsgiref.simple_server import make_server
+from wsgiref.simple_server import make_server, WSGIServer, WSGIRequestHandler
 
 
 # ## Production Warning
@@ -20,14 +20,25 @@ if not __debug__:
 
 # ## Server Adapters
 
-def simple(application, host='127.0.0.1', port=8080):
+def simple(application, host='127.0.0.1', port=8080, socket=None):
 	"""Python-standard WSGI-HTTP server for testing purposes.
 	
-	The additional work performed here is to match the default startup output of "waitress".
+	The additional work performed here is to match the default startup output of "waitress". If an already listening
+	`socket` is given, it is used in preference to binding the host and port.
 	
 	This is not a production quality interface and will be have badly under load.
 	"""
 	
+	if socket is not None:
+		server = WSGIServer(socket.getsockname()[:2], WSGIRequestHandler, bind_and_activate=False)
+		server.socket.close()
+		server.socket = socket
+		server.server_name, server.server_port = host, socket.getsockname()[1]
+		server.setup_environ()
+		server.set_app(application)
+		server.serve_forever()
+		return
+	
 	# Try to be handy as many terminals allow clicking links.
 	print("serving on http://{0}:{1}".format(host, port))
 	
@@ -0,0 +1,31 @@
+# encoding: utf-8
+
+"""Uvicorn-based ASGI server adapter."""
+
+# ## Imports
+
+from __future__ import unicode_literals, print_function
+
+try:
+	import uvicorn
+except ImportError:
+	print("You must install the 'uvicorn' package.")
+	raise
+
+
+# ## Server Adapter
+
+def serve(application, host='127.0.0.1', port=8080, **options):
+	"""Uvicorn's asynchronous HTTP server, serving the native ASGI interface of the application.
+	
+	Endpoints and extension callbacks may be coroutine functions; synchronous endpoints are executed within a pool of
+	worker threads. WSGI middleware provided by extensions is not applied. For the available options, please visit:
+	
+		https://www.uvicorn.org/settings/
+	"""
+	
+	# The `stop` extension callbacks are executed by `Application.serve` once we return.
+	options.setdefault('lifespan', 'off')
+	
+	# Bind and start the server; this is a blocking process.
+	uvicorn.run(application.asgi, host=host, port=int(port), **options)
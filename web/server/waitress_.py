@@ -15,12 +15,17 @@ except ImportError:
 
 # ## Server Adapter
 
-def serve(application, host='127.0.0.1', port=8080, threads=4, **kw):
+def serve(application, host='127.0.0.1', port=8080, threads=4, socket=None, **kw):
 	"""The recommended development HTTP server.
 	
-	Note that this server performs additional buffering and will not honour chunked encoding breaks.
+	Note that this server performs additional buffering and will not honour chunked encoding breaks. If an already
+	listening `socket` is given, it is used in preference to binding the host and port.
 	"""
 	
+	if socket is not None:
+		serve_(application, sockets=[socket], threads=int(threads), **kw)
+		return
+	
 	# Bind and start the server; this is a blocking process.
 	serve_(application, host=host, port=int(port), threads=int(threads), **kw)
 